@@ -0,0 +1,72 @@
+"""Retention job for package_audit_log.
+
+Entries older than AUDIT_RETENTION_DAYS are exported in id order to gzip'd
+NDJSON files under AUDIT_ARCHIVE_DIR, then deleted.  Each batch is written to a
+temp file and renamed before its rows are removed, so a crash can at worst
+re-export a batch (file names are derived from the id range and overwritten).
+"""
+import gzip
+import json
+import logging
+import os
+
+from sqlalchemy import text
+
+from app.background import AUDIT_ARCHIVE_LOCK_KEY, advisory_lock, run_periodically
+
+logger = logging.getLogger("dashboard.audit_archive")
+
+AUDIT_RETENTION_DAYS = int(os.getenv("AUDIT_RETENTION_DAYS", "365"))
+AUDIT_ARCHIVE_DIR = os.getenv("AUDIT_ARCHIVE_DIR", "/data/audit-archive")
+AUDIT_ARCHIVE_INTERVAL = int(os.getenv("AUDIT_ARCHIVE_INTERVAL", "3600"))
+AUDIT_ARCHIVE_BATCH = 10000
+
+
+def _export_batch(rows) -> str:
+    os.makedirs(AUDIT_ARCHIVE_DIR, exist_ok=True)
+    name = f"package_audit_log-{rows[0]['id']:010d}-{rows[-1]['id']:010d}.ndjson.gz"
+    path = os.path.join(AUDIT_ARCHIVE_DIR, name)
+    tmp = path + ".tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps({**row, "created_at": row["created_at"].isoformat()}, ensure_ascii=False))
+            f.write("\n")
+    with open(tmp, "rb") as f:
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def archive_audit_log(engine) -> int:
+    """Export and delete audit entries past retention. Returns the number archived."""
+    if AUDIT_RETENTION_DAYS <= 0:
+        return 0
+    archived = 0
+    with advisory_lock(engine, AUDIT_ARCHIVE_LOCK_KEY) as conn:
+        if conn is None:
+            return 0
+        while True:
+            rows = conn.execute(text("""
+                SELECT id, package_id, package_name, action, performed_by, detail, created_at
+                FROM package_audit_log
+                WHERE created_at < NOW() - make_interval(days => :days)
+                ORDER BY id
+                LIMIT :batch
+            """), {"days": AUDIT_RETENTION_DAYS, "batch": AUDIT_ARCHIVE_BATCH}).mappings().all()
+            if not rows:
+                break
+            path = _export_batch([dict(r) for r in rows])
+            conn.execute(
+                text("DELETE FROM package_audit_log WHERE id = ANY(:ids)"),
+                {"ids": [r["id"] for r in rows]},
+            )
+            conn.commit()
+            archived += len(rows)
+            logger.info("Archived %d audit entries to %s", len(rows), path)
+    return archived
+
+
+def start_audit_archiver(engine):
+    if AUDIT_RETENTION_DAYS <= 0:
+        return
+    run_periodically("audit-archiver", AUDIT_ARCHIVE_INTERVAL, lambda: archive_audit_log(engine))
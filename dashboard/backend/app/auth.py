@@ -0,0 +1,186 @@
+"""Keycloak OIDC token validation and admin lookup for AUTH_MODE=sso.
+
+Everything on the request path is served from memory: the realm JWKS and the
+admin group membership are refreshed by background jobs, and validated tokens
+are kept in a small LRU keyed by their SHA-256 until they expire.
+
+Keycloak access tokens carry `aud: account` unless the client has an audience
+mapper, so a token is accepted when KEYCLOAK_CLIENT_ID is either its
+authorized party (`azp`, the client that requested it) or one of its audiences.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from app.background import run_periodically
+
+logger = logging.getLogger("dashboard.auth")
+
+KEYCLOAK_URL = os.getenv("KEYCLOAK_URL", "").rstrip("/")
+KEYCLOAK_REALM = os.getenv("KEYCLOAK_REALM", "")
+KEYCLOAK_CLIENT_ID = os.getenv("KEYCLOAK_CLIENT_ID", "")
+KEYCLOAK_ISSUER = f"{KEYCLOAK_URL}/realms/{KEYCLOAK_REALM}"
+JWKS_REFRESH_INTERVAL = int(os.getenv("JWKS_REFRESH_INTERVAL", "3600"))
+
+# Open WebUI group (synced from SSO claims) whose members are dashboard admins
+ADMIN_GROUP = os.getenv("ADMIN_GROUP", "")
+ADMIN_GROUP_REFRESH_INTERVAL = int(os.getenv("ADMIN_GROUP_REFRESH_INTERVAL", "60"))
+
+ALLOWED_EMAIL_DOMAIN = "samsung.com"
+TOKEN_CACHE_SIZE = 1024
+# Unknown `kid` triggers an out-of-band JWKS refresh at most this often
+JWKS_MIN_REFRESH_GAP = 60
+
+# PyJWT (and cryptography) are imported inside the functions below, so mock
+# mode never loads them
+_jwks: dict = {}
+_jwks_fetched_at = 0.0
+_jwks_lock = threading.Lock()
+
+_token_cache: OrderedDict[str, tuple[str, float]] = OrderedDict()
+_token_lock = threading.Lock()
+
+_admin_group_members: frozenset[str] = frozenset()
+
+
+def check_sso_settings():
+    """Fail startup in sso mode when the Keycloak realm is not fully configured."""
+    missing = [
+        name for name, value in (
+            ("KEYCLOAK_URL", KEYCLOAK_URL), ("KEYCLOAK_REALM", KEYCLOAK_REALM), ("KEYCLOAK_CLIENT_ID", KEYCLOAK_CLIENT_ID),
+        ) if not value
+    ]
+    if missing:
+        raise RuntimeError(f"AUTH_MODE=sso requires {', '.join(missing)}")
+    if not KEYCLOAK_URL.startswith(("https://", "http://")):
+        raise RuntimeError(f"KEYCLOAK_URL must be an http(s) URL, got {KEYCLOAK_URL!r}")
+
+
+def username_from_email(email: str) -> str:
+    """Map `name@samsung.com` to `name`, rejecting other domains."""
+    local, at, domain = email.partition("@")
+    if at and domain != ALLOWED_EMAIL_DOMAIN:
+        raise HTTPException(status_code=403, detail=f"Only @{ALLOWED_EMAIL_DOMAIN} emails are allowed")
+    return local
+
+
+def refresh_jwks():
+    import jwt
+
+    global _jwks, _jwks_fetched_at
+    url = f"{KEYCLOAK_ISSUER}/protocol/openid-connect/certs"
+    with urllib.request.urlopen(url, timeout=10) as resp:
+        data = json.load(resp)
+    keys = {}
+    for jwk in data.get("keys", []):
+        if jwk.get("use", "sig") != "sig" or "kid" not in jwk:
+            continue
+        try:
+            keys[jwk["kid"]] = jwt.PyJWK(jwk)
+        except jwt.PyJWKError:
+            logger.warning("Skipping unsupported JWK kid=%s", jwk.get("kid"))
+    with _jwks_lock:
+        _jwks = keys
+        _jwks_fetched_at = time.monotonic()
+    logger.info("Loaded %d signing keys from %s", len(keys), url)
+
+
+def _refresh_jwks_soon():
+    """Kick off a refresh for a rotated key without blocking the request."""
+    global _jwks_fetched_at
+    with _jwks_lock:
+        if time.monotonic() - _jwks_fetched_at < JWKS_MIN_REFRESH_GAP:
+            return
+        _jwks_fetched_at = time.monotonic()
+    threading.Thread(target=refresh_jwks, name="jwks-refresh", daemon=True).start()
+
+
+def validate_token(token: str) -> str:
+    """Return the username for a Keycloak access token, or raise 401/403."""
+    import jwt
+
+    digest = hashlib.sha256(token.encode()).hexdigest()
+    now = time.time()
+    with _token_lock:
+        cached = _token_cache.get(digest)
+        if cached and cached[1] > now:
+            _token_cache.move_to_end(digest)
+            return cached[0]
+
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    key = _jwks.get(kid)
+    if key is None:
+        if not _jwks:
+            raise HTTPException(status_code=503, detail="Identity provider keys not loaded yet")
+        _refresh_jwks_soon()
+        raise HTTPException(status_code=401, detail="Unknown signing key")
+    try:
+        payload = jwt.decode(
+            token,
+            key=key.key,
+            algorithms=[key.algorithm_name],
+            issuer=KEYCLOAK_ISSUER,
+            # Checked below against azp as well
+            options={"require": ["exp"], "verify_aud": False},
+        )
+    except jwt.ExpiredSignatureError:
+        raise HTTPException(status_code=401, detail="Token expired")
+    except jwt.InvalidTokenError:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    audience = payload.get("aud") or []
+    if isinstance(audience, str):
+        audience = [audience]
+    if payload.get("azp") != KEYCLOAK_CLIENT_ID and KEYCLOAK_CLIENT_ID not in audience:
+        raise HTTPException(status_code=401, detail="Token was not issued for this dashboard")
+
+    email = payload.get("email", "")
+    if not email:
+        raise HTTPException(status_code=403, detail="Token has no email claim")
+    user = username_from_email(email)
+    with _token_lock:
+        _token_cache[digest] = (user, float(payload["exp"]))
+        _token_cache.move_to_end(digest)
+        while len(_token_cache) > TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+    return user
+
+
+def refresh_admin_group(engine):
+    """Load ADMIN_GROUP's members as usernames, keeping only emails that could
+    sign in (see username_from_email), so `name@elsewhere` never grants `name`."""
+    global _admin_group_members
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT DISTINCT split_part(u.email, '@', 1) AS username
+            FROM "group" g
+            JOIN group_member gm ON gm.group_id = g.id
+            JOIN "user" u ON u.id = gm.user_id
+            WHERE g.name = :group AND split_part(u.email, '@', 2) = :domain
+        """), {"group": ADMIN_GROUP, "domain": ALLOWED_EMAIL_DOMAIN}).scalars().all()
+    _admin_group_members = frozenset(rows)
+
+
+def admin_group_members() -> frozenset[str]:
+    return _admin_group_members
+
+
+def start_auth_refresh(auth_mode: str):
+    if auth_mode == "sso":
+        run_periodically("jwks-refresh", JWKS_REFRESH_INTERVAL, refresh_jwks)
+
+
+def start_admin_group_refresh(engine):
+    """Started once the database is ready; reads Open WebUI's group tables."""
+    if ADMIN_GROUP:
+        run_periodically("admin-group-refresh", ADMIN_GROUP_REFRESH_INTERVAL, lambda: refresh_admin_group(engine))
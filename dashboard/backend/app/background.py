@@ -0,0 +1,48 @@
+"""Shared helpers for the backend's periodic background jobs."""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+logger = logging.getLogger("dashboard.background")
+
+# pg advisory lock keys; one per job so each runs on a single worker at a time
+MIGRATION_LOCK_KEY = 7260000
+INSTALL_LOCK_KEY = 7260001
+AUDIT_ARCHIVE_LOCK_KEY = 7260002
+ROLLUP_LOCK_KEY = 7260003
+MESSAGE_USAGE_LOCK_KEY = 7260004
+FEEDBACK_LOCK_KEY = 7260005
+CHAT_MODEL_LOCK_KEY = 7260006
+
+
+@contextmanager
+def advisory_lock(engine, key: int):
+    """Yield a connection holding session advisory lock `key`, or None if another worker holds it."""
+    with engine.connect() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": key}).scalar():
+            conn.rollback()
+            yield None
+            return
+        try:
+            yield conn
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": key})
+            conn.commit()
+
+
+def run_periodically(name: str, interval: float, fn):
+    """Call `fn()` every `interval` seconds on a daemon thread, logging failures."""
+    def loop():
+        while True:
+            try:
+                fn()
+            except Exception:
+                logger.exception("Background job %s failed", name)
+            time.sleep(interval)
+
+    threading.Thread(target=loop, name=name, daemon=True).start()
+    logger.info("Background job %s started (every %ss)", name, interval)
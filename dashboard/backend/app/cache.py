@@ -0,0 +1,294 @@
+"""Caches for computed stats responses.
+
+Every cache keeps an in-process LRU of Python objects.  With
+CACHE_BACKEND=redis, results are also written to a shared Redis-protocol
+server (Redis, Valkey, or fakeredis in tests) as orjson, so replicas and
+workers fill each other's misses instead of each running the query.
+
+Caches belong to a namespace.  `invalidate(namespace)` drops that namespace's
+entries from the shared tier and broadcasts it over pub/sub so every process
+clears its local copies too; writes call it for the data they changed.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+from typing import Optional
+
+logger = logging.getLogger("dashboard.cache")
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL") or "redis://localhost:6379/0"
+
+# Stale results are kept this long in the shared tier so an outage can still be bridged
+SHARED_STALE_RETENTION = 86400
+
+_KEY_PREFIX = "dashboard:cache:"
+_INVALIDATE_CHANNEL = "dashboard:cache:invalidate"
+
+
+def _encode(value):
+    # Values are response bodies; these are what FastAPI's encoder would turn into numbers
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def _dumps(value) -> bytes:
+    import orjson
+    return orjson.dumps(value, default=_encode, option=orjson.OPT_NON_STR_KEYS)
+
+
+def _normalize(value):
+    """`value` as the shared tier hands it back (lists for tuples, ISO strings
+    for dates, floats for Decimals), so local and shared hits look the same.
+    Values orjson can't encode are kept as they are (and never shared)."""
+    import orjson
+    try:
+        return orjson.loads(_dumps(value))
+    except TypeError:
+        return value
+
+
+class RedisBackend:
+    """Shared cache tier on a Redis-protocol server.
+
+    Errors are logged and treated as misses: the shared tier is an
+    optimisation, never a reason to fail a request.
+    """
+
+    def __init__(self, client):
+        import redis
+        self._client = client
+        self._errors = (redis.RedisError, OSError)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisBackend":
+        import redis
+        return cls(redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1))
+
+    def get(self, key: str) -> Optional[tuple[object, float]]:
+        import orjson
+        try:
+            data = self._client.get(_KEY_PREFIX + key)
+        except self._errors as exc:
+            logger.warning("Shared cache read failed: %s", exc)
+            return None
+        if data is None:
+            return None
+        try:
+            payload = orjson.loads(data)
+            return payload["v"], float(payload["t"])
+        except (ValueError, TypeError, KeyError) as exc:
+            logger.warning("Ignoring undecodable shared cache entry %s: %s", key, exc)
+            return None
+
+    def set(self, key: str, value, stored_at: float, ttl: float):
+        try:
+            data = _dumps({"v": value, "t": stored_at})
+            self._client.set(_KEY_PREFIX + key, data, ex=max(1, int(ttl)))
+        except (TypeError, *self._errors) as exc:
+            logger.warning("Shared cache write failed: %s", exc)
+
+    def try_lock(self, key: str, ttl: float) -> bool:
+        """Claim `key` across processes for `ttl` seconds; True if this caller got it."""
+        try:
+            return bool(self._client.set(_KEY_PREFIX + "lock:" + key, b"1", nx=True, ex=max(1, int(ttl))))
+        except self._errors:
+            return True
+
+    def invalidate(self, namespace: str):
+        try:
+            keys = list(self._client.scan_iter(match=f"{_KEY_PREFIX}{namespace}:*", count=500))
+            if keys:
+                self._client.unlink(*keys)
+            self._client.publish(_INVALIDATE_CHANNEL, namespace)
+        except self._errors as exc:
+            logger.warning("Shared cache invalidation of %s failed: %s", namespace, exc)
+
+    def listen(self, on_invalidate):
+        """Call `on_invalidate(namespace)` for every broadcast; blocks, reconnecting on errors."""
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(_INVALIDATE_CHANNEL)
+                for message in pubsub.listen():
+                    if message["type"] == "message":
+                        on_invalidate(message["data"].decode())
+            except self._errors as exc:
+                logger.warning("Cache invalidation listener lost its connection: %s", exc)
+                time.sleep(5)
+
+
+_backend: Optional[RedisBackend] = None
+_backend_lock = threading.Lock()
+_registry: dict[str, list] = {}
+
+
+def shared_backend() -> Optional[RedisBackend]:
+    """The shared tier, created (with its invalidation listener) on first use; None for memory."""
+    global _backend
+    if CACHE_BACKEND != "redis":
+        return None
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend = RedisBackend.from_url(CACHE_REDIS_URL)
+                threading.Thread(
+                    target=backend.listen, args=(_clear_local,), name="cache-invalidation", daemon=True,
+                ).start()
+                _backend = backend
+    return _backend
+
+
+def _clear_local(namespace: str):
+    for cache in _registry.get(namespace, []):
+        cache.clear()
+
+
+def invalidate(namespace: str):
+    """Drop every cached result in `namespace`, in this process and (if shared) everywhere."""
+    _clear_local(namespace)
+    backend = shared_backend()
+    if backend is not None:
+        backend.invalidate(namespace)
+
+
+def _shared_key(namespace: str, key) -> str:
+    return f"{namespace}:" + ":".join(str(part) for part in key)
+
+
+class TTLCache:
+    """Thread-safe LRU whose entries expire `ttl` seconds after being set."""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60, namespace: str = "stats"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.namespace = namespace
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        _registry.setdefault(namespace, []).append(self)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > time.time():
+                    self._data.move_to_end(key)
+                    return value
+                del self._data[key]
+        backend = shared_backend()
+        shared = backend.get(_shared_key(self.namespace, key)) if backend else None
+        if shared is None or shared[1] + self.ttl <= time.time():
+            return None
+        self._store_local(key, *shared)
+        return shared[0]
+
+    def set(self, key, value):
+        value = _normalize(value)
+        stored_at = time.time()
+        self._store_local(key, value, stored_at)
+        backend = shared_backend()
+        if backend is not None:
+            backend.set(_shared_key(self.namespace, key), value, stored_at, self.ttl)
+
+    def _store_local(self, key, value, stored_at: float):
+        with self._lock:
+            self._data[key] = (value, stored_at + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class StaleWhileRevalidateCache:
+    """Thread-safe LRU of last good results that never hands out an error it can avoid.
+
+    Entries younger than `ttl` are served as-is.  Older ones are still served
+    immediately while one background thread per key recomputes them; if that
+    fails (DB down or timing out) the old value stays, so callers keep getting
+    the last known numbers with a growing age.  Only a key that was never
+    computed makes the caller wait on, or fail with, the query.  With a shared
+    tier, a fresher result from another process is picked up and only one
+    process refreshes a given key.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 60, namespace: str = "stats"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.namespace = namespace
+        self._data: OrderedDict = OrderedDict()
+        self._refreshing: set = set()
+        self._lock = threading.Lock()
+        _registry.setdefault(namespace, []).append(self)
+
+    def get(self, key, compute, refresh) -> tuple[object, float, str]:
+        """Return (value, age in seconds, "hit" | "stale" | "miss").
+
+        `compute()` runs inline on a miss; `refresh()` runs on a background
+        thread for stale entries and must not depend on the current request.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+        backend = shared_backend()
+        if backend is not None and (entry is None or time.time() - entry[1] >= self.ttl):
+            shared = backend.get(_shared_key(self.namespace, key))
+            if shared is not None and (entry is None or shared[1] > entry[1]):
+                entry = shared
+                self._store_local(key, *shared)
+
+        if entry is None:
+            return self._store(key, compute()), 0.0, "miss"
+        value, stored_at = entry
+        age = max(0.0, time.time() - stored_at)
+        if age < self.ttl:
+            return value, age, "hit"
+        with self._lock:
+            start_refresh = key not in self._refreshing
+            if start_refresh:
+                self._refreshing.add(key)
+        if start_refresh and backend is not None and not backend.try_lock(_shared_key(self.namespace, key), self.ttl):
+            # Another process is refreshing it and will write the result to the shared tier
+            with self._lock:
+                self._refreshing.discard(key)
+            start_refresh = False
+        if start_refresh:
+            threading.Thread(target=self._refresh, args=(key, refresh), name="cache-refresh", daemon=True).start()
+        return value, age, "stale"
+
+    def _refresh(self, key, refresh):
+        try:
+            self._store(key, refresh())
+        except Exception as exc:
+            logger.warning("Background refresh of %r failed, serving the stale value: %s", key, exc)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key, value):
+        value = _normalize(value)
+        stored_at = time.time()
+        self._store_local(key, value, stored_at)
+        backend = shared_backend()
+        if backend is not None:
+            backend.set(_shared_key(self.namespace, key), value, stored_at, SHARED_STALE_RETENTION)
+        return value
+
+    def _store_local(self, key, value, stored_at: float):
+        with self._lock:
+            self._data[key] = (value, stored_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
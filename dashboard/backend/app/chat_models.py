@@ -0,0 +1,37 @@
+"""Incremental chat/model junction table.
+
+chat_model holds one row per (chat, model) from `chat->'models'`, with the
+chat's created_at, so model counts are index reads instead of expanding every
+chat's JSON.  Updated chats are re-extracted
+by app.incremental, as for message usage.
+"""
+import os
+
+from app.background import CHAT_MODEL_LOCK_KEY, run_periodically
+from app.incremental import Extractor, run
+
+CHAT_MODEL_INTERVAL = int(os.getenv("CHAT_MODEL_INTERVAL", "300"))
+
+EXTRACTOR = Extractor(
+    name="chat_model",
+    lock_key=CHAT_MODEL_LOCK_KEY,
+    source="chat",
+    target="chat_model",
+    source_id="chat_id",
+    extract="""
+        INSERT INTO chat_model (chat_id, model_id, created_at)
+        SELECT c.id, m.value, c.created_at
+        FROM chat c, json_array_elements_text(c.chat->'models') AS m(value)
+        WHERE c.id = ANY(:ids) AND m.value <> ''
+        ON CONFLICT (chat_id, model_id) DO NOTHING
+    """,
+)
+
+
+def sync_chat_models(engine) -> int:
+    """Re-extract chats updated since the watermark. Returns the number of chats processed."""
+    return run(engine, EXTRACTOR)
+
+
+def start_chat_model_sync(engine):
+    run_periodically("chat-model-sync", CHAT_MODEL_INTERVAL, lambda: sync_chat_models(engine))
@@ -0,0 +1,36 @@
+"""Database engine and session factory, created on first use.
+
+Importing the app never touches Postgres (or loads the driver); the engine is
+built by the first caller of get_engine().
+"""
+import os
+import threading
+
+from sqlalchemy.orm import sessionmaker
+
+DB_USER = os.getenv("POSTGRES_USER", "webui_user")
+DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "password")
+DB_HOST = os.getenv("POSTGRES_HOST", "webui-db")
+DB_PORT = os.getenv("POSTGRES_PORT", "5432")
+DB_NAME = os.getenv("POSTGRES_DB", "webui")
+
+DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                from sqlalchemy import create_engine
+                _engine = create_engine(DATABASE_URL)
+    return _engine
+
+
+def new_session():
+    return SessionLocal(bind=get_engine())
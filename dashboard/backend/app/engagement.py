@@ -0,0 +1,132 @@
+"""Engagement analytics: rolling DAU/WAU/MAU and weekly signup-cohort retention.
+
+Each day's active users (from the stats_user_hourly rollup, re-bucketed into
+the requested zone's days) become a bitmap, a Python int with one bit per
+user, so a rolling window is an OR of its days and a cohort's return rate is a
+popcount of cohort AND week.  The KST snapshot is recomputed on a schedule;
+other zones are computed on first request and kept for one refresh interval.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+
+from app.background import run_periodically
+
+logger = logging.getLogger("dashboard.engagement")
+
+ENGAGEMENT_DAYS = 90
+COHORT_WEEKS = 12
+ENGAGEMENT_REFRESH_INTERVAL = int(os.getenv("ENGAGEMENT_REFRESH_INTERVAL", "300"))
+
+SCHEDULED_TZ = ZoneInfo("Asia/Seoul")
+
+# Zone name -> (monotonic time computed, snapshot); bounded by the zones Postgres knows
+_snapshots: dict[str, tuple[float, dict]] = {}
+_lock = threading.Lock()
+
+
+def _bitmap(bits: list[int], size: int) -> int:
+    buf = bytearray((size + 7) // 8)
+    for bit in bits:
+        buf[bit >> 3] |= 1 << (bit & 7)
+    return int.from_bytes(buf, "little")
+
+
+def _union(bitmaps: dict[date, int], start: date, end: date) -> int:
+    result = 0
+    day = start
+    while day <= end:
+        result |= bitmaps.get(day, 0)
+        day += timedelta(days=1)
+    return result
+
+
+def compute(engine, tz: ZoneInfo) -> dict:
+    today = datetime.now(tz).date()
+    series_start = today - timedelta(days=ENGAGEMENT_DAYS - 1)
+    first_cohort = today - timedelta(days=today.weekday()) - timedelta(weeks=COHORT_WEEKS - 1)
+    since = min(series_start - timedelta(days=29), first_cohort)
+
+    with engine.connect() as conn:
+        users = conn.execute(text("""
+            SELECT id, (to_timestamp(created_at) AT TIME ZONE :tz)::date AS signup_day
+            FROM "user"
+        """), {"tz": tz.key}).all()
+        active = conn.execute(text("""
+            SELECT DISTINCT user_id, (hour AT TIME ZONE :tz)::date AS day
+            FROM stats_user_hourly WHERE hour >= :since
+        """), {"tz": tz.key, "since": datetime(since.year, since.month, since.day, tzinfo=tz)}).all()
+
+    index: dict[str, int] = {}
+    cohort_bits: dict[date, list[int]] = {}
+    for user_id, signup_day in users:
+        bit = index.setdefault(user_id, len(index))
+        if signup_day and signup_day >= first_cohort:
+            week = signup_day - timedelta(days=signup_day.weekday())
+            cohort_bits.setdefault(week, []).append(bit)
+    day_bits: dict[date, list[int]] = {}
+    for user_id, day in active:
+        day_bits.setdefault(day, []).append(index.setdefault(user_id, len(index)))
+
+    size = len(index)
+    days = {day: _bitmap(bits, size) for day, bits in day_bits.items()}
+
+    series = []
+    day = series_start
+    while day <= today:
+        dau = days.get(day, 0).bit_count()
+        mau = _union(days, day - timedelta(days=29), day).bit_count()
+        series.append({
+            "date": str(day),
+            "dau": dau,
+            "wau": _union(days, day - timedelta(days=6), day).bit_count(),
+            "mau": mau,
+            "stickiness": round(dau / mau, 3) if mau else 0.0,
+        })
+        day += timedelta(days=1)
+
+    cohorts = []
+    for k in range(COHORT_WEEKS):
+        week = first_cohort + timedelta(weeks=k)
+        members = _bitmap(cohort_bits.get(week, []), size)
+        cohort_size = members.bit_count()
+        retention = []
+        offset = week
+        while offset <= today:
+            returned = (members & _union(days, offset, offset + timedelta(days=6))).bit_count()
+            retention.append(round(returned / cohort_size, 3) if cohort_size else 0.0)
+            offset += timedelta(weeks=1)
+        cohorts.append({"week": str(week), "size": cohort_size, "retention": retention})
+
+    return {
+        "as_of": datetime.now(tz).isoformat(timespec="seconds"),
+        "series": series,
+        "cohorts": cohorts,
+    }
+
+
+def refresh(engine, tz: ZoneInfo = SCHEDULED_TZ) -> dict:
+    started = time.monotonic()
+    result = compute(engine, tz)
+    with _lock:
+        _snapshots[tz.key] = (time.monotonic(), result)
+    logger.info("Engagement snapshot for %s refreshed in %.2fs", tz.key, time.monotonic() - started)
+    return result
+
+
+def snapshot(engine, tz: ZoneInfo) -> dict:
+    """Latest snapshot for `tz`, computed inline when the schedule hasn't produced
+    one yet (SCHEDULED_TZ) or the cached one is older than a refresh interval."""
+    entry = _snapshots.get(tz.key)
+    if entry is None or (tz.key != SCHEDULED_TZ.key and time.monotonic() - entry[0] > ENGAGEMENT_REFRESH_INTERVAL):
+        return refresh(engine, tz)
+    return entry[1]
+
+
+def start_engagement_refresh(engine):
+    run_periodically("engagement-refresh", ENGAGEMENT_REFRESH_INTERVAL, lambda: refresh(engine))
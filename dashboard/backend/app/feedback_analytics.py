@@ -0,0 +1,62 @@
+"""Open WebUI feedback extracted into a typed table.
+
+feedback.data is json holding rating/model_id/reason/comment.  Updated
+feedback is re-extracted (see app.incremental) into feedback_ratings, which
+/stats/feedback/negative-comments reads; the rating counts come from the
+stats_feedback_hourly rollup.  Only rows with a model and a numeric rating extract, so feedback edited
+to anything else loses its feedback_ratings row.
+"""
+import math
+import os
+
+from app.background import FEEDBACK_LOCK_KEY, run_periodically
+from app.incremental import Extractor, run
+
+FEEDBACK_INTERVAL = int(os.getenv("FEEDBACK_INTERVAL", "300"))
+
+# z for a 95% Wilson score interval
+WILSON_Z = 1.96
+
+EXTRACTOR = Extractor(
+    name="feedback_ratings",
+    lock_key=FEEDBACK_LOCK_KEY,
+    source="feedback",
+    target="feedback_ratings",
+    source_id="id",
+    extract="""
+        INSERT INTO feedback_ratings (id, model_id, user_id, chat_id, rating, reason, comment, created_at)
+        SELECT
+            f.id,
+            f.data->>'model_id',
+            f.user_id,
+            f.meta->>'chat_id',
+            sign((f.data->>'rating')::numeric)::smallint,
+            nullif(f.data->>'reason', ''),
+            nullif(f.data->>'comment', ''),
+            f.created_at
+        FROM feedback f
+        WHERE f.id = ANY(:ids)
+          AND f.data->>'model_id' IS NOT NULL
+          AND f.data->>'rating' ~ '^-?[0-9]+(\\.[0-9]+)?$'
+    """,
+)
+
+
+def extract_feedback(engine) -> int:
+    """Re-extract feedback updated since the watermark. Returns the number of feedback rows processed."""
+    return run(engine, EXTRACTOR)
+
+
+def wilson_interval(positive: int, total: int) -> tuple[float, float]:
+    """95% Wilson score interval for the share of positive ratings."""
+    if total == 0:
+        return 0.0, 0.0
+    z2 = WILSON_Z * WILSON_Z
+    p = positive / total
+    center = (p + z2 / (2 * total)) / (1 + z2 / total)
+    margin = WILSON_Z * math.sqrt(p * (1 - p) / total + z2 / (4 * total * total)) / (1 + z2 / total)
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+
+def start_feedback_extractor(engine):
+    run_periodically("feedback-extract", FEEDBACK_INTERVAL, lambda: extract_feedback(engine))
@@ -0,0 +1,66 @@
+"""Idempotency-Key support for POST endpoints.
+
+The first response for a (user, key) pair is stored in the same transaction
+as the write it describes; retries with the same key get that response back
+instead of repeating the insert.
+"""
+import hashlib
+import json
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy import text
+
+IDEMPOTENCY_TTL_HOURS = 24
+
+
+def request_hash(body) -> str:
+    return hashlib.sha256(json.dumps(body.model_dump(), sort_keys=True).encode()).hexdigest()
+
+
+def replay(db, user: str, key: Optional[str], route: str, req_hash: str) -> Optional[JSONResponse]:
+    """Return the stored response for this key, or None if it has not been used."""
+    if not key:
+        return None
+    row = db.execute(text("""
+        SELECT route, request_hash, status_code, response
+        FROM idempotency_keys
+        WHERE username = :user AND key = :key
+          AND created_at > NOW() - make_interval(hours => :ttl)
+    """), {"user": user, "key": key, "ttl": IDEMPOTENCY_TTL_HOURS}).mappings().first()
+    if not row:
+        return None
+    if row["route"] != route or row["request_hash"] != req_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    return JSONResponse(content=row["response"], status_code=row["status_code"], headers={"Idempotent-Replayed": "true"})
+
+
+def store(db, user: str, key: Optional[str], route: str, req_hash: str, status_code: int, response: dict):
+    """Record `response` for this key; call before committing the write.
+
+    A concurrent request with the same key fails here with a unique violation,
+    so only one of them commits its write; the caller should roll back and
+    `replay()`.
+    """
+    if not key:
+        return
+    db.execute(text("""
+        DELETE FROM idempotency_keys
+        WHERE username = :user AND key = :key AND created_at <= NOW() - make_interval(hours => :ttl)
+    """), {"user": user, "key": key, "ttl": IDEMPOTENCY_TTL_HOURS})
+    db.execute(text("""
+        INSERT INTO idempotency_keys (username, key, route, request_hash, status_code, response)
+        VALUES (:user, :key, :route, :hash, :status, CAST(:response AS jsonb))
+    """), {
+        "user": user, "key": key, "route": route, "hash": req_hash,
+        "status": status_code, "response": json.dumps(response),
+    })
+
+
+def prune(engine):
+    with engine.begin() as conn:
+        conn.execute(
+            text("DELETE FROM idempotency_keys WHERE created_at < NOW() - make_interval(hours => :ttl)"),
+            {"ttl": IDEMPOTENCY_TTL_HOURS},
+        )
@@ -0,0 +1,86 @@
+"""Watermark-driven re-extraction of Open WebUI rows into typed tables.
+
+chat_message_usage, chat_model and feedback_ratings are each derived from one
+Open WebUI table (`chat` or `feedback`) by a single INSERT ... SELECT over the
+source ids in `:ids`.  A pass takes the source rows updated since the stored
+watermark in id-ordered batches, deletes their derived rows and runs the
+extract again, so an edited row that no longer extracts loses its rows.
+Open WebUI's updated_at is whole epoch seconds, and a row can commit after a
+pass has read past its timestamp (later in the same second, or from a long
+transaction), so each pass also re-reads the EXTRACT_OVERLAP seconds before
+the watermark; delete-then-extract makes that repeat harmless.
+Deleted source rows don't bump updated_at, so what they leave behind is swept
+by an anti-join once every ORPHAN_SWEEP_INTERVAL, the cadence of the rollups'
+full rebuild.
+"""
+import logging
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from app.background import advisory_lock
+
+logger = logging.getLogger("dashboard.incremental")
+
+EXTRACT_BATCH = 500
+EXTRACT_OVERLAP = 300
+ORPHAN_SWEEP_INTERVAL = 86400
+
+
+@dataclass(frozen=True)
+class Extractor:
+    name: str       # stats_rollup_state row holding the watermark
+    lock_key: int
+    source: str     # Open WebUI table with `id` and `updated_at`
+    target: str
+    source_id: str  # column of `target` holding the source row's id
+    extract: str    # INSERT INTO `target` ... for the source rows in :ids
+
+
+def run(engine, extractor: Extractor) -> int:
+    """Re-extract source rows updated since the watermark. Returns the number of rows processed."""
+    source, target, source_id = extractor.source, extractor.target, extractor.source_id
+    processed = 0
+    with advisory_lock(engine, extractor.lock_key) as conn:
+        if conn is None:
+            return 0
+        started = time.monotonic()
+        state = conn.execute(
+            text("SELECT watermark, extract(epoch FROM NOW() - rebuilt_at) AS age FROM stats_rollup_state WHERE name = :n"),
+            {"n": extractor.name},
+        ).mappings().first()
+        watermark = state["watermark"] if state else 0
+        sweep = state is None or state["age"] >= ORPHAN_SWEEP_INTERVAL
+        new_watermark = conn.execute(text(f"SELECT coalesce(max(updated_at), 0) FROM {source}")).scalar()
+
+        last_id = ""
+        while True:
+            ids = conn.execute(text(f"""
+                SELECT id FROM {source}
+                WHERE updated_at > :wm AND updated_at <= :new_wm AND id > :last_id
+                ORDER BY id
+                LIMIT :batch
+            """), {"wm": watermark - EXTRACT_OVERLAP, "new_wm": new_watermark, "last_id": last_id, "batch": EXTRACT_BATCH}).scalars().all()
+            if not ids:
+                break
+            conn.execute(text(f"DELETE FROM {target} WHERE {source_id} = ANY(:ids)"), {"ids": ids})
+            conn.execute(text(extractor.extract), {"ids": ids})
+            conn.commit()
+            processed += len(ids)
+            last_id = ids[-1]
+
+        if sweep:
+            swept = conn.execute(text(f"""
+                DELETE FROM {target} t
+                WHERE NOT EXISTS (SELECT 1 FROM {source} s WHERE s.id = t.{source_id})
+            """)).rowcount
+            logger.info("Swept %d row(s) of deleted %s from %s", swept, source, target)
+        conn.execute(text(f"""
+            INSERT INTO stats_rollup_state (name, watermark, rebuilt_at) VALUES (:n, :wm, NOW())
+            ON CONFLICT (name) DO UPDATE SET watermark = :wm{", rebuilt_at = NOW()" if sweep else ""}
+        """), {"n": extractor.name, "wm": new_watermark})
+        conn.commit()
+        if processed:
+            logger.info("Re-extracted %d %s row(s) into %s in %.2fs", processed, source, target, time.monotonic() - started)
+    return processed
@@ -0,0 +1,238 @@
+"""Precomputed top-K leaderboards for the ranking endpoints.
+
+The rankings' expensive part is aggregating `chat` and `feedback` JSON; the
+rollups already hold those aggregates.  After each rollup refresh that changed
+rows, and at least every LEADERBOARD_MAX_AGE seconds so renamed workspaces and
+changed group memberships show up on a quiet instance, the first
+LEADERBOARD_SIZE entries of every ranking are rebuilt from the rollups
+(Postgres picks them with a bounded top-N sort) and stored as one JSON row per
+ranking in stats_leaderboards.  Pages that fall inside those entries
+are sliced from it; deeper pages run the same query with an OFFSET, so every
+page reads the same rollups and agrees on keys, order, tie-breaks and totals.
+All of them lag the live tables by at most one rollup interval.
+"""
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import text
+
+logger = logging.getLogger("dashboard.leaderboards")
+
+LEADERBOARD_SIZE = 100
+LEADERBOARD_MAX_AGE = 900
+
+_WORKSPACE_METRICS = """
+    SELECT model_id as workspace,
+           sum(chat_count) as chat_count,
+           sum(message_count) as message_count,
+           count(DISTINCT user_id) as user_count
+    FROM stats_model_user_daily
+    GROUP BY model_id
+"""
+
+_WORKSPACE_FEEDBACK = """
+    SELECT model_id as workspace, sum(positive) as positive, sum(negative) as negative
+    FROM stats_feedback_hourly
+    GROUP BY model_id
+"""
+
+# Each query selects :k entries after the first :offset as `ranked`, with `rn`
+# and the full-set `total`
+_LEADERBOARDS = {
+    "workspace": (f"""
+        WITH workspace_chats AS ({_WORKSPACE_METRICS}),
+        workspace_feedback AS ({_WORKSPACE_FEEDBACK}),
+        workspace_info AS (
+            SELECT m.id, m.name, u.email as developer_email
+            FROM model m
+            LEFT JOIN "user" u ON m.user_id = u.id
+        ),
+        ranked AS (
+            SELECT
+                wc.workspace as id,
+                coalesce(wi.name, wc.workspace) as name,
+                coalesce(wi.developer_email, '') as developer_email,
+                wc.user_count,
+                wc.chat_count,
+                wc.message_count,
+                coalesce(wf.positive, 0) as positive,
+                coalesce(wf.negative, 0) as negative,
+                count(*) OVER() as total,
+                row_number() OVER (ORDER BY wc.chat_count DESC, wc.workspace) as rn
+            FROM workspace_chats wc
+            JOIN workspace_info wi ON wc.workspace = wi.id
+            LEFT JOIN workspace_feedback wf ON wc.workspace = wf.workspace
+            ORDER BY rn
+            LIMIT :k OFFSET :offset
+        )
+    """, "id, name, developer_email, user_count, chat_count, message_count, positive, negative"),
+    "developer": (f"""
+        WITH developer_workspaces AS (
+            SELECT m.user_id, m.id as workspace_id
+            FROM model m
+        ),
+        workspace_metrics AS ({_WORKSPACE_METRICS}),
+        workspace_fb AS ({_WORKSPACE_FEEDBACK}),
+        ranked AS (
+            SELECT
+                u.id as user_id,
+                u.name as user_name,
+                u.email,
+                count(DISTINCT dw.workspace_id) as workspace_count,
+                coalesce(sum(wm.user_count), 0) as total_users,
+                coalesce(sum(wm.chat_count), 0) as total_chats,
+                coalesce(sum(wm.message_count), 0) as total_messages,
+                coalesce(sum(wfb.positive), 0) as total_positive,
+                coalesce(sum(wfb.negative), 0) as total_negative,
+                count(*) OVER() as total,
+                row_number() OVER (ORDER BY coalesce(sum(wm.chat_count), 0) DESC, u.id) as rn
+            FROM developer_workspaces dw
+            JOIN "user" u ON dw.user_id = u.id
+            LEFT JOIN workspace_metrics wm ON dw.workspace_id = wm.workspace
+            LEFT JOIN workspace_fb wfb ON dw.workspace_id = wfb.workspace
+            GROUP BY u.id, u.name, u.email
+            ORDER BY rn
+            LIMIT :k OFFSET :offset
+        )
+    """, "user_id, user_name, email, workspace_count, total_users, total_chats, total_messages, "
+         "total_positive, total_negative"),
+    "user": ("""
+        WITH user_chats AS (
+            SELECT user_id,
+                   sum(chat_count) as chat_count,
+                   sum(message_count) as message_count,
+                   count(DISTINCT model_id) as workspace_count
+            FROM stats_model_user_daily
+            GROUP BY user_id
+        ),
+        user_fb AS (
+            SELECT user_id, sum(positive + negative) as total_feedbacks
+            FROM stats_feedback_hourly
+            GROUP BY user_id
+        ),
+        ranked AS (
+            SELECT
+                u.id as user_id,
+                u.name as user_name,
+                u.email,
+                uc.chat_count,
+                uc.message_count,
+                uc.workspace_count,
+                coalesce(ufb.total_feedbacks, 0) as total_feedbacks,
+                count(*) OVER() as total,
+                row_number() OVER (ORDER BY uc.chat_count DESC, u.id) as rn
+            FROM "user" u
+            JOIN user_chats uc ON u.id = uc.user_id
+            LEFT JOIN user_fb ufb ON u.id = ufb.user_id
+            WHERE uc.chat_count > 0
+            ORDER BY rn
+            LIMIT :k OFFSET :offset
+        )
+    """, "user_id, user_name, email, chat_count, message_count, workspace_count, total_feedbacks"),
+    "group": ("""
+        WITH group_members AS (
+            SELECT
+                g.id as group_id,
+                g.name as group_name,
+                gm.user_id,
+                count(*) OVER (PARTITION BY g.id) as member_count
+            FROM "group" g
+            JOIN group_member gm ON g.id = gm.group_id
+        ),
+        user_usage AS (
+            SELECT user_id, model_id as workspace,
+                   sum(chat_count) as chat_count,
+                   sum(message_count) as message_count
+            FROM stats_model_user_daily
+            GROUP BY user_id, model_id
+        ),
+        user_fb AS (
+            SELECT user_id, sum(positive + negative) as total_feedbacks
+            FROM stats_feedback_hourly
+            WHERE model_id IN (SELECT id FROM model)
+            GROUP BY user_id
+        ),
+        ranked AS (
+            SELECT
+                gm.group_id,
+                gm.group_name,
+                gm.member_count,
+                coalesce(sum(uu.chat_count), 0) as total_chats,
+                coalesce(sum(uu.message_count), 0) as total_messages,
+                coalesce(sum(ufb.total_feedbacks), 0) as total_feedbacks,
+                coalesce(round(coalesce(sum(uu.chat_count), 0)::numeric
+                    / NULLIF(gm.member_count, 0), 1), 0)::float8 as chats_per_member,
+                coalesce(round(coalesce(sum(uu.message_count), 0)::numeric
+                    / NULLIF(gm.member_count, 0), 1), 0)::float8 as messages_per_member,
+                count(*) OVER() as total,
+                row_number() OVER (
+                    ORDER BY round(coalesce(sum(uu.chat_count), 0)::numeric
+                        / NULLIF(gm.member_count, 0), 1) DESC NULLS LAST, gm.group_id
+                ) as rn
+            FROM group_members gm
+            LEFT JOIN user_usage uu ON gm.user_id = uu.user_id
+            LEFT JOIN user_fb ufb ON gm.user_id = ufb.user_id
+            GROUP BY gm.group_id, gm.group_name, gm.member_count
+            ORDER BY rn
+            LIMIT :k OFFSET :offset
+        )
+    """, "group_id, group_name, member_count, total_chats, total_messages, total_feedbacks, "
+         "chats_per_member, messages_per_member"),
+}
+
+
+def _json_object(columns: str) -> str:
+    # json (not jsonb) keeps the key order the endpoints' `format=columns` relies on
+    return "json_build_object(" + ", ".join(f"'{c.strip()}', {c.strip()}" for c in columns.split(",")) + ")"
+
+
+def rebuild(conn):
+    """Recompute every leaderboard from the rollups on `conn` (caller commits)."""
+    started = time.monotonic()
+    for name, (query, columns) in _LEADERBOARDS.items():
+        conn.execute(text(f"""
+            {query}
+            INSERT INTO stats_leaderboards (ranking, total, items, built_at)
+            SELECT :name,
+                   coalesce(max(total), 0),
+                   coalesce(json_agg({_json_object(columns)} ORDER BY rn), '[]'::json),
+                   NOW()
+            FROM ranked
+            ON CONFLICT (ranking) DO UPDATE
+                SET total = EXCLUDED.total, items = EXCLUDED.items, built_at = EXCLUDED.built_at
+        """), {"name": name, "k": LEADERBOARD_SIZE, "offset": 0})
+    logger.info("Rebuilt %d leaderboards in %.2fs", len(_LEADERBOARDS), time.monotonic() - started)
+
+
+def ranking(db, name: str, offset: int, limit: int) -> tuple[int, list[dict]]:
+    """(total, items) for any page of a ranking, computed from the rollups like the leaderboard."""
+    query, columns = _LEADERBOARDS[name]
+    row = db.execute(text(f"""
+        {query}
+        SELECT coalesce(max(total), 0) AS total,
+               coalesce(json_agg({_json_object(columns)} ORDER BY rn), '[]'::json) AS items
+        FROM ranked
+    """), {"k": limit, "offset": offset}).mappings().first()
+    return row["total"], row["items"]
+
+
+def stale(conn) -> bool:
+    """True when a leaderboard is missing or older than LEADERBOARD_MAX_AGE."""
+    row = conn.execute(text(
+        "SELECT count(*) AS n, extract(epoch FROM NOW() - min(built_at)) AS age FROM stats_leaderboards"
+    )).mappings().first()
+    return row["n"] < len(_LEADERBOARDS) or row["age"] >= LEADERBOARD_MAX_AGE
+
+
+def page(db, name: str, offset: int, limit: int) -> Optional[tuple[int, list[dict], float]]:
+    """(total, items, age in seconds) for a page inside the top LEADERBOARD_SIZE, else None."""
+    if offset + limit > LEADERBOARD_SIZE:
+        return None
+    row = db.execute(text("""
+        SELECT total, items, extract(epoch FROM NOW() - built_at) AS age
+        FROM stats_leaderboards WHERE ranking = :name
+    """), {"name": name}).mappings().first()
+    if row is None:
+        return None
+    return row["total"], row["items"][offset:offset + limit], float(row["age"])
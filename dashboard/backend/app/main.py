@@ -1,15 +1,39 @@
-from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, APIRouter
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, Request, Response, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker, Session
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from brotli_asgi import BrotliMiddleware
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
-import os, re, logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from time import monotonic, sleep
+import os, re, logging, asyncio, threading, hashlib
 from dotenv import load_dotenv
-from datetime import datetime, date, timedelta, timezone, time
+from datetime import datetime, date, timedelta, timezone, time, tzinfo
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 load_dotenv()
 
+from app.package_installer import RESOLVE_INDEX_URL, RESOLVE_TIMEOUT, start_install_worker, resolve_preview
+from app.audit_archive import start_audit_archiver
+from app.auth import (
+    check_sso_settings, validate_token, username_from_email, admin_group_members, start_admin_group_refresh,
+    start_auth_refresh,
+)
+from app.background import run_periodically
+from app.migrations import run_migrations
+from app.db import get_engine, new_session
+from app.ratelimit import limiter
+from app import (
+    chat_models, engagement, feedback_analytics, idempotency, leaderboards, message_usage, report_attachments, rollups,
+    system_health,
+)
+from app.cache import StaleWhileRevalidateCache, TTLCache, invalidate as invalidate_cache
+
 logging.basicConfig(
     level=logging.INFO,
     format="%(asctime)s %(levelname)s %(name)s: %(message)s",
@@ -17,9 +41,27 @@ logging.basicConfig(
 logger = logging.getLogger("dashboard")
 
 app = FastAPI(title="SbioChat Dashboard API")
-v1 = APIRouter(prefix="/api/v1")
+
+# Set once migrations have run; /ready reports it, /health does not wait for it
+startup_state = {"ready": False, "error": None}
+NOT_READY_RETRY_AFTER = 5
+
+
+def require_ready():
+    """503 with Retry-After for API routes until /ready would pass (migrations applied)."""
+    if not startup_state["ready"]:
+        raise HTTPException(
+            status_code=503,
+            detail="Dashboard database is starting; try again shortly",
+            headers={"Retry-After": str(NOT_READY_RETRY_AFTER)},
+        )
+
+
+v1 = APIRouter(prefix="/api/v1", dependencies=[Depends(require_ready)])
 
 KST = timezone(timedelta(hours=9))
+# Zone stats days are bucketed in when a request doesn't pass `tz`
+DEFAULT_TZ = "Asia/Seoul"
 
 # CORS Configuration
 origins = [
@@ -34,46 +76,134 @@ app.add_middleware(
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PATCH", "DELETE", "OPTIONS"],
-    allow_headers=["Content-Type", "X-Auth-User", "Authorization"],
+    allow_headers=["Content-Type", "X-Auth-User", "Authorization", "Idempotency-Key"],
+    expose_headers=["Retry-After", "Idempotent-Replayed", "Age", "X-Cache"],
 )
 
-# Database Setup
-DB_USER = os.getenv("POSTGRES_USER", "webui_user")
-DB_PASSWORD = os.getenv("POSTGRES_PASSWORD", "password")
-DB_HOST = os.getenv("POSTGRES_HOST", "webui-db")
-DB_PORT = os.getenv("POSTGRES_PORT", "5432")
-DB_NAME = os.getenv("POSTGRES_DB", "webui")
+@app.exception_handler(OperationalError)
+async def query_timeout_handler(request: Request, exc: OperationalError):
+    # 57014 = query_canceled (statement_timeout or client-disconnect cancel)
+    if getattr(exc.orig, "pgcode", None) != "57014":
+        raise exc
+    logger.warning("Query cancelled for %s: %s", request.url.path, exc.orig)
+    return JSONResponse(
+        status_code=503,
+        content={
+            "detail": "Query took too long; try again shortly or narrow the date range",
+            "code": "query_timeout",
+            "retry_after": QUERY_TIMEOUT_RETRY_AFTER,
+        },
+        headers={"Retry-After": str(QUERY_TIMEOUT_RETRY_AFTER)},
+    )
+
 
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# Brotli for browsers that accept it, gzip otherwise; small bodies aren't worth the CPU
+app.add_middleware(BrotliMiddleware, quality=5, minimum_size=1024, gzip_fallback=True)
 
 AUTH_MODE = os.getenv("AUTH_MODE", "mock")
 ADMIN_USERS = [u.strip() for u in os.getenv("ADMIN_USERS", "jisung.jang").split(",") if u.strip()]
 
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
 def get_db():
-    db = SessionLocal()
+    db = new_session()
     try:
         yield db
     finally:
         db.close()
 
 
+# Stay well under nginx's 60s proxy_read_timeout
+STATS_STATEMENT_TIMEOUT_MS = int(os.getenv("STATS_STATEMENT_TIMEOUT_MS", "30000"))
+FAST_STATS_STATEMENT_TIMEOUT_MS = 5000
+QUERY_TIMEOUT_RETRY_AFTER = 30
+
+
+def guarded_db(timeout_ms: int):
+    """Session dependency for read-only stats routes.
+
+    Each transaction runs with `SET LOCAL statement_timeout`, and the running
+    query is cancelled if the client disconnects first (e.g. nginx gave up).
+    """
+    async def dependency(request: Request):
+        db = new_session()
+        dbapi_connections = []
+
+        @event.listens_for(db, "after_begin")
+        def set_timeout(session, transaction, connection):
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {timeout_ms}")
+            dbapi_connections.append(connection.connection.dbapi_connection)
+
+        async def cancel_on_disconnect():
+            while not await request.is_disconnected():
+                await asyncio.sleep(1)
+            for conn in dbapi_connections:
+                await run_in_threadpool(conn.cancel)
+            logger.info("Client disconnected, cancelled query for %s", request.url.path)
+
+        watcher = asyncio.create_task(cancel_on_disconnect())
+        try:
+            yield db
+        finally:
+            watcher.cancel()
+            # Wait out an in-flight cancel so it can't hit the next user of this connection
+            with suppress(asyncio.CancelledError):
+                await watcher
+            await run_in_threadpool(db.close)
+    return dependency
+
+
+get_fast_stats_db = guarded_db(FAST_STATS_STATEMENT_TIMEOUT_MS)
+
+# Last good result of each whole-table stats query; see StaleWhileRevalidateCache
+stats_cache = StaleWhileRevalidateCache(maxsize=256, ttl=60)
+
+
+def background_stats_query(query):
+    """Run `query(db)` on its own session with the stats statement timeout."""
+    db = new_session()
+    try:
+        db.execute(text(f"SET LOCAL statement_timeout = {STATS_STATEMENT_TIMEOUT_MS}"))
+        return query(db)
+    finally:
+        db.close()
+
+
+def cached_stats(response: Response, key: tuple, db: Session, query):
+    """Serve `query(db)` through stats_cache, reporting its age in `Age` and `X-Cache`."""
+    value, age, status = stats_cache.get(key, lambda: query(db), lambda: background_stats_query(query))
+    response.headers["Age"] = str(int(age))
+    response.headers["X-Cache"] = status
+    return value
+
+
 def get_current_user(request: Request) -> str:
     if AUTH_MODE == "mock":
         user = request.headers.get("X-Auth-User", "").strip()
         if not user:
             raise HTTPException(status_code=401, detail="X-Auth-User header required in mock mode")
-        if "@" in user:
-            parts = user.split("@")
-            if parts[1] != "samsung.com":
-                raise HTTPException(status_code=403, detail="Only @samsung.com emails are allowed")
-            return parts[0]
-        return user
+        return username_from_email(user)
     else:
-        # SSO mode: Keycloak OIDC token validation (to be implemented)
-        raise HTTPException(status_code=501, detail="SSO auth not yet implemented")
+        # SSO mode: Keycloak OIDC Bearer token (JWKS and validated tokens cached in app.auth)
+        auth_header = request.headers.get("Authorization", "")
+        if not auth_header.startswith("Bearer "):
+            raise HTTPException(status_code=401, detail="Bearer token required")
+        return validate_token(auth_header[len("Bearer "):])
+
+
+def is_admin(user: str) -> bool:
+    return user in ADMIN_USERS or user in admin_group_members()
+
+
+def rate_limit(route: str):
+    """Dependency enforcing the per-user token bucket for `route`."""
+    def check(current_user: str = Depends(get_current_user)):
+        allowed, retry_after = limiter.hit(f"{current_user}:{route}", get_engine())
+        if not allowed:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests, slow down",
+                headers={"Retry-After": str(max(1, round(retry_after)))},
+            )
+    return check
 
 
 class PackageCreate(BaseModel):
@@ -94,50 +224,55 @@ class ReportStatusUpdate(BaseModel):
     admin_note: Optional[str] = None
 
 
+DB_INIT_MAX_BACKOFF = 30
+
+
+def migrate_schema():
+    """Apply pending schema migrations."""
+    applied = run_migrations(get_engine())
+    if applied:
+        logger.info("Applied %d schema migration(s)", applied)
+
+
+def init_database():
+    """Migrate (retrying until Postgres is reachable), then start the DB-backed workers."""
+    backoff = 1
+    while True:
+        try:
+            migrate_schema()
+            break
+        except Exception as e:
+            startup_state["error"] = str(e).splitlines()[0]
+            logger.warning("Database not ready (%s), retrying in %ss", startup_state["error"], backoff)
+            sleep(backoff)
+            backoff = min(backoff * 2, DB_INIT_MAX_BACKOFF)
+    startup_state.update(ready=True, error=None)
+    logger.info("Database ready")
+
+    engine = get_engine()
+    start_admin_group_refresh(engine)
+    start_install_worker(engine, log_audit)
+    start_audit_archiver(engine)
+    run_periodically("write-guard-prune", 3600, prune_write_guards)
+    rollups.start_rollup_refresh(engine)
+    engagement.start_engagement_refresh(engine)
+    message_usage.start_message_usage_extractor(engine)
+    feedback_analytics.start_feedback_extractor(engine)
+    chat_models.start_chat_model_sync(engine)
+
+
 @app.on_event("startup")
-def create_tables():
-    """Create application tables if they don't exist."""
+def start_background_workers():
     logger.info("Starting dashboard API, AUTH_MODE=%s, ADMIN_USERS=%s", AUTH_MODE, ADMIN_USERS)
-    with engine.connect() as conn:
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS python_packages (
-                id SERIAL PRIMARY KEY,
-                package_name VARCHAR(255) NOT NULL UNIQUE,
-                added_by VARCHAR(255) NOT NULL,
-                added_at TIMESTAMPTZ DEFAULT NOW(),
-                status VARCHAR(20) DEFAULT 'pending',
-                status_note TEXT,
-                status_updated_by VARCHAR(255),
-                status_updated_at TIMESTAMPTZ
-            )
-        """))
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS package_audit_log (
-                id SERIAL PRIMARY KEY,
-                package_id INTEGER,
-                package_name VARCHAR(255) NOT NULL,
-                action VARCHAR(50) NOT NULL,
-                performed_by VARCHAR(255) NOT NULL,
-                detail TEXT,
-                created_at TIMESTAMPTZ DEFAULT NOW()
-            )
-        """))
-        conn.execute(text("""
-            CREATE TABLE IF NOT EXISTS issue_reports (
-                id SERIAL PRIMARY KEY,
-                title VARCHAR(255) NOT NULL,
-                description TEXT NOT NULL,
-                category VARCHAR(50) DEFAULT 'bug',
-                reported_by VARCHAR(255),
-                is_anonymous BOOLEAN DEFAULT false,
-                status VARCHAR(20) DEFAULT 'open',
-                admin_note TEXT,
-                status_updated_by VARCHAR(255),
-                created_at TIMESTAMPTZ DEFAULT NOW(),
-                updated_at TIMESTAMPTZ DEFAULT NOW()
-            )
-        """))
-        conn.commit()
+    if AUTH_MODE not in ("mock", "sso"):
+        raise RuntimeError(f"AUTH_MODE must be 'mock' or 'sso', got {AUTH_MODE!r}")
+    if AUTH_MODE == "sso":
+        check_sso_settings()
+    problem = report_attachments.storage_problem()
+    if problem:
+        logger.error("Report attachment uploads are unavailable: %s", problem)
+    start_auth_refresh(AUTH_MODE)
+    threading.Thread(target=init_database, name="db-init", daemon=True).start()
 
 
 def log_audit(db: Session, package_id: int, package_name: str, action: str, user: str, detail: str = None):
@@ -149,6 +284,104 @@ def log_audit(db: Session, package_id: int, package_name: str, action: str, user
     )
 
 
+def parse_search_cursor(cursor: Optional[str]) -> Optional[tuple[float, int]]:
+    """Decode a `rank:id` keyset cursor returned as `next_cursor` by search endpoints."""
+    if not cursor:
+        return None
+    try:
+        rank, row_id = cursor.split(":")
+        return float(rank), int(row_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def search_page(db: Session, sql: str, params: dict, cursor: Optional[str], limit: int) -> dict:
+    """Run a ranked full-text query with keyset pagination on (rank, id).
+
+    `sql` must select `rank` and `id`; the keyset filter, ordering and LIMIT
+    are applied around it. Returns `total` (all matches, counted before the
+    cursor filter), `limit`, `next_cursor` and the page's `rows`.
+    """
+    after = parse_search_cursor(cursor)
+    keyset = "AND (rank, id) < (:c_rank, :c_id)" if after else ""
+    if after:
+        params = {**params, "c_rank": after[0], "c_id": after[1]}
+    rows = db.execute(text(f"""
+        SELECT * FROM (SELECT m.*, count(*) OVER() AS _total FROM ({sql}) m) s
+        WHERE true {keyset} ORDER BY rank DESC, id DESC LIMIT :limit
+    """), {**params, "limit": limit + 1}).mappings().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1]['rank']!r}:{rows[-1]['id']}"
+    total = rows[0]["_total"] if rows else 0
+    return {"total": total, "limit": limit, "next_cursor": next_cursor, "rows": rows}
+
+
+# List pages keyed by their resource's write generation (bumped by trigger, see migrations)
+list_caches = {
+    "packages": TTLCache(maxsize=256, ttl=300, namespace="packages"),
+    "audit_log": TTLCache(maxsize=256, ttl=300, namespace="packages"),
+    "reports": TTLCache(maxsize=512, ttl=300, namespace="reports"),
+}
+
+
+def generation_cached(request: Request, response: Response, db: Session, resource: str, key: tuple, query):
+    """Serve `query()` cached under `resource`'s current write generation, with a matching ETag.
+
+    Every write bumps the generation in its own transaction, so the cache key
+    and ETag change the moment it commits. A request whose `If-None-Match`
+    holds the current ETag gets a bodiless 304.
+    """
+    generation = db.execute(
+        text("SELECT generation FROM cache_generations WHERE resource = :r"), {"r": resource}
+    ).scalar() or 0
+    etag = f'W/"{resource}-{generation}-{hashlib.sha1(repr(key).encode()).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    cache = list_caches[resource]
+    value = cache.get((generation, *key))
+    if value is None:
+        value = query()
+        cache.set((generation, *key), value)
+    return value
+
+
+def leaderboard_page(response: Response, name: str, db: Session, offset: int, limit: int, fmt: str) -> Optional[dict]:
+    """Ranking page sliced from the precomputed top-K leaderboard, or None if it lies deeper."""
+    hit = leaderboards.page(db, name, offset, limit)
+    if hit is None:
+        return None
+    total, items, age = hit
+    response.headers["Age"] = str(int(age))
+    response.headers["X-Cache"] = "leaderboard"
+    return ranking_page(total, offset, limit, items, fmt)
+
+
+def ranking_page(total: int, offset: int, limit: int, items: list[dict], fmt: str) -> dict:
+    """Paginated ranking response. `format=columns` sends the keys once plus one value array per item."""
+    page = {"total": total, "offset": offset, "limit": limit}
+    if fmt == "columns":
+        page["columns"] = list(items[0]) if items else []
+        page["rows"] = [list(item.values()) for item in items]
+    else:
+        page["items"] = items
+    return page
+
+
+def rollup_ranking(db: Session, name: str, offset: int, limit: int, fmt: str) -> dict:
+    """Ranking page below the leaderboard, from the same rollup query the leaderboard is built with."""
+    total, items = leaderboards.ranking(db, name, offset, limit)
+    return ranking_page(total, offset, limit, items, fmt)
+
+
+def prune_write_guards():
+    limiter.prune(get_engine())
+    idempotency.prune(get_engine())
+
+
 # ─── Root & Health ────────────────────────────────────────────────────
 
 @app.get("/")
@@ -157,113 +390,225 @@ def read_root():
 
 
 @app.get("/health")
-def health_check(db: Session = Depends(get_db)):
+def health_check():
+    """Liveness: answers as soon as the process is up, without touching the DB."""
+    return {"status": "ok", "ready": startup_state["ready"]}
+
+
+@app.get("/ready")
+def readiness_check():
+    """Readiness: migrations applied and the database answering."""
+    if not startup_state["ready"]:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "starting", "database": "unavailable", "detail": startup_state["error"]},
+        )
+    db = new_session()
     try:
         db.execute(text("SELECT 1"))
-        return {"status": "ok", "database": "connected"}
-    except Exception as e:
-        logger.exception("Health check failed")
-        raise HTTPException(status_code=500, detail="Database connection failed")
+        # Reported, not failed on: only attachment uploads need the directory
+        return {"status": "ready", "database": "connected", "attachments": report_attachments.storage_problem() or "writable"}
+    except Exception:
+        logger.exception("Readiness check failed")
+        return JSONResponse(status_code=503, content={"status": "degraded", "database": "unavailable"})
+    finally:
+        db.close()
+
+
+system_health_cache = TTLCache(maxsize=1, ttl=60, namespace="system")
+
+
+@v1.get("/admin/system-health")
+def get_system_health(
+    response: Response,
+    db: Session = Depends(get_fast_stats_db),
+    current_user: str = Depends(get_current_user),
+):
+    """Table, TOAST and index sizes, dead tuples, index usage and top statements (admin only)."""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    response.headers["Cache-Control"] = "private, max-age=60"
+    result = system_health_cache.get(("system-health",))
+    if result is None:
+        result = {"as_of": datetime.now(KST).isoformat(timespec="seconds"), **system_health.collect(db)}
+        system_health_cache.set(("system-health",), result)
+    return result
 
 
 # ─── Statistics ───────────────────────────────────────────────────────
 
+# Overview cards: (query, cache TTL in seconds). Each runs on its own pooled
+# connection and is cached on its own, so the cheap registry counts never
+# wait on the chat scan; tools/functions/skills change rarely.
+OVERVIEW_PARTS = {
+    "chats": ("""
+        SELECT count(*) as total_chats,
+               coalesce(sum(json_array_length(chat->'messages')), 0) as total_messages
+        FROM chat
+    """, 60),
+    "models": ("SELECT count(DISTINCT model_id) as total_models FROM chat_model", 60),
+    "feedbacks": ("SELECT count(*) as total_feedbacks FROM feedback", 60),
+    "tools": ("SELECT count(*) as total_tools FROM tool", 600),
+    "functions": ("SELECT count(*) as total_functions FROM function", 600),
+    "skills": ("SELECT count(*) as total_skills FROM skill", 600),
+}
+overview_caches = {name: StaleWhileRevalidateCache(maxsize=1, ttl=ttl) for name, (_, ttl) in OVERVIEW_PARTS.items()}
+overview_pool = ThreadPoolExecutor(max_workers=len(OVERVIEW_PARTS), thread_name_prefix="overview")
+
+
+def overview_part(name: str) -> tuple[dict, float, str]:
+    """(fields, age, cache status) for one overview card, each query on its own session."""
+    def query(db: Session) -> dict:
+        return dict(db.execute(text(OVERVIEW_PARTS[name][0])).mappings().first())
+    return overview_caches[name].get(
+        ("overview", name), lambda: background_stats_query(query), lambda: background_stats_query(query),
+    )
+
+
 @v1.get("/stats/overview")
-def get_overview(response: Response, db: Session = Depends(get_db)):
-    """Return aggregate stats across all chats, models, and feedback."""
-    response.headers["Cache-Control"] = "public, max-age=60"
-    result = db.execute(text("""
-        WITH
-            chat_stats AS (
-                SELECT count(*) as total_chats,
-                       sum(json_array_length(chat->'messages')) as total_messages
-                FROM chat
-            ),
-            model_stats AS (
-                SELECT count(DISTINCT m.value) as total_models
-                FROM chat, json_array_elements_text(chat->'models') AS m(value)
-            ),
-            feedback_stats AS (
-                SELECT count(*) as total_feedbacks FROM feedback
-            ),
-            tool_stats AS (
-                SELECT count(*) as total_tools FROM tool
-            ),
-            function_stats AS (
-                SELECT count(*) as total_functions FROM function
-            ),
-            skill_stats AS (
-                SELECT count(*) as total_skills FROM skill
-            )
-        SELECT cs.total_chats, cs.total_messages, ms.total_models, fs.total_feedbacks,
-               ts.total_tools, fns.total_functions, ss.total_skills
-        FROM chat_stats cs, model_stats ms, feedback_stats fs, tool_stats ts, function_stats fns, skill_stats ss
-    """)).mappings().first()
+async def get_overview(response: Response):
+    """Return aggregate stats across all chats, models, and feedback.
+
+    The parts run concurrently on overview_pool while the event loop waits, so
+    no request thread is held. A part that fails is left out and named in
+    `unavailable`; only when every part fails does the request fail.
+    """
+    loop = asyncio.get_running_loop()
+    outcomes = await asyncio.gather(
+        *(loop.run_in_executor(overview_pool, overview_part, name) for name in OVERVIEW_PARTS),
+        return_exceptions=True,
+    )
+    result, ages, statuses, unavailable = {}, [], set(), []
+    for name, outcome in zip(OVERVIEW_PARTS, outcomes):
+        if isinstance(outcome, Exception):
+            logger.warning("Overview part %s failed: %s", name, outcome)
+            unavailable.append(name)
+            continue
+        fields, age, status = outcome
+        result.update(fields)
+        ages.append(age)
+        statuses.add(status)
+    if not ages:
+        raise outcomes[0]
+    if unavailable:
+        result["unavailable"] = unavailable
+    else:
+        response.headers["Cache-Control"] = "public, max-age=60"
+    response.headers["Age"] = str(int(max(ages)))
+    response.headers["X-Cache"] = next(s for s in ("miss", "stale", "hit") if s in statuses)
+    return result
+
+
+@v1.get("/stats/overview/{part}")
+def get_overview_part(part: str, response: Response):
+    """One overview card (`chats`, `models`, `feedbacks`, `tools`, `functions` or `skills`)."""
+    if part not in OVERVIEW_PARTS:
+        raise HTTPException(status_code=404, detail=f"Unknown overview part; use one of: {', '.join(OVERVIEW_PARTS)}")
+    response.headers["Cache-Control"] = f"public, max-age={OVERVIEW_PARTS[part][1]}"
+    fields, age, status = overview_part(part)
+    response.headers["Age"] = str(int(age))
+    response.headers["X-Cache"] = status
+    return fields
+
+
+_pg_timezones: Optional[frozenset[str]] = None
+
+
+def pg_timezones() -> frozenset[str]:
+    """Zone names Postgres knows; read once, as its tz database only changes with the server."""
+    global _pg_timezones
+    if _pg_timezones is None:
+        with get_engine().connect() as conn:
+            _pg_timezones = frozenset(conn.execute(text("SELECT name FROM pg_timezone_names")).scalars())
+    return _pg_timezones
+
+
+def report_timezone(tz: str = Query(DEFAULT_TZ, max_length=64)) -> ZoneInfo:
+    """The IANA zone (e.g. `Europe/Berlin`) whose calendar days a stats response is bucketed by.
+
+    Must be known to both Python's and Postgres' tz databases, since bounds are
+    computed here and rows are bucketed `AT TIME ZONE` in SQL.
+    """
+    try:
+        zone = ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        zone = None
+    if zone is None or tz not in pg_timezones():
+        raise HTTPException(status_code=400, detail=f"Unknown time zone '{tz}'")
+    return zone
+
+
+def default_date_range(date_from: Optional[date], date_to: Optional[date], tz: tzinfo = KST) -> tuple[date, date]:
+    """Fill in the default last-30-days window (days in `tz`) and reject inverted ranges."""
+    if date_to is None:
+        date_to = datetime.now(tz).date()
+    if date_from is None:
+        date_from = date_to - timedelta(days=29)
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    return date_from, date_to
+
+
+def local_day_bounds(date_from: date, date_to: date, tz: ZoneInfo) -> dict:
+    """Parameters for reading hourly rollups by local day: the range's first and
+    past-the-end instants, and the zone `(hour AT TIME ZONE :tz)::date` buckets in.
+
+    Bounds are computed here once per request rather than per row in SQL.  In
+    zones offset by a fraction of an hour, each UTC hour counts toward the
+    local day it starts in.
+    """
     return {
-        "total_chats": result["total_chats"],
-        "total_messages": result["total_messages"] or 0,
-        "total_models": result["total_models"],
-        "total_feedbacks": result["total_feedbacks"],
-        "total_tools": result["total_tools"],
-        "total_functions": result["total_functions"],
-        "total_skills": result["total_skills"],
+        "start": datetime.combine(date_from, time.min, tzinfo=tz),
+        "end": datetime.combine(date_to + timedelta(days=1), time.min, tzinfo=tz),
+        "tz": tz.key,
     }
 
 
+def local_epoch_bounds(date_from: date, date_to: date, tz: ZoneInfo) -> dict:
+    """local_day_bounds as epoch seconds, for tables keeping Open WebUI's integer timestamps."""
+    bounds = local_day_bounds(date_from, date_to, tz)
+    return {**bounds, "start": int(bounds["start"].timestamp()), "end": int(bounds["end"].timestamp())}
+
+
+def daily_series(date_from: date, date_to: date, rows, fields: list[str]) -> list[dict]:
+    """One entry per day in the range, zero-filled where `rows` (keyed by `day`) has none."""
+    by_day = {row["day"]: row for row in rows}
+    series = []
+    current = date_from
+    while current <= date_to:
+        row = by_day.get(current)
+        series.append({"date": str(current), **{f: int(row[f]) if row else 0 for f in fields}})
+        current += timedelta(days=1)
+    return series
+
+
 @v1.get("/stats/daily")
 def get_daily_stats(
     response: Response,
     date_from: date = Query(alias="from", default=None),
     date_to: date = Query(alias="to", default=None),
-    db: Session = Depends(get_db),
+    tz: ZoneInfo = Depends(report_timezone),
+    db: Session = Depends(get_fast_stats_db),
 ):
     response.headers["Cache-Control"] = "public, max-age=60"
-    # Default: last 30 days in KST
-    if date_to is None:
-        date_to = datetime.now(KST).date()
-    if date_from is None:
-        date_from = date_to - timedelta(days=29)
+    date_from, date_to = default_date_range(date_from, date_to, tz)
+    return cached_stats(
+        response, ("daily", tz.key, date_from, date_to), db, lambda db: _daily_stats(db, date_from, date_to, tz),
+    )
 
-    # Convert KST date range to UTC epoch range
-    from_utc = datetime.combine(date_from, time.min, tzinfo=KST).timestamp()
-    to_utc = datetime.combine(date_to + timedelta(days=1), time.min, tzinfo=KST).timestamp()
 
+def _daily_stats(db: Session, date_from: date, date_to: date, tz: ZoneInfo) -> list[dict]:
     rows = db.execute(text("""
         SELECT
-            (to_timestamp(created_at) AT TIME ZONE 'Asia/Seoul')::date as date,
-            count(*) as chat_count,
-            sum(json_array_length(chat->'messages')) as message_count,
+            (hour AT TIME ZONE :tz)::date as day,
+            sum(chat_count) as chat_count,
+            sum(message_count) as message_count,
             count(DISTINCT user_id) as user_count
-        FROM chat
-        WHERE created_at >= :from_ts AND created_at < :to_ts
-        GROUP BY date
-        ORDER BY date
-    """), {"from_ts": from_utc, "to_ts": to_utc}).mappings().all()
-
-    # Fill missing dates with zeros
-    data_by_date = {str(row["date"]): row for row in rows}
-    result = []
-    current = date_from
-    while current <= date_to:
-        key = str(current)
-        if key in data_by_date:
-            row = data_by_date[key]
-            result.append({
-                "date": key,
-                "chat_count": row["chat_count"],
-                "message_count": row["message_count"] or 0,
-                "user_count": row["user_count"],
-            })
-        else:
-            result.append({
-                "date": key,
-                "chat_count": 0,
-                "message_count": 0,
-                "user_count": 0,
-            })
-        current += timedelta(days=1)
-
-    return result
+        FROM stats_user_hourly
+        WHERE hour >= :start AND hour < :end
+        GROUP BY 1
+    """), local_day_bounds(date_from, date_to, tz)).mappings().all()
+    return daily_series(date_from, date_to, rows, ["chat_count", "message_count", "user_count"])
 
 
 @v1.get("/stats/workspace-ranking")
@@ -271,140 +616,114 @@ def get_workspace_ranking(
     response: Response,
     offset: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    fmt: str = Query("items", alias="format", pattern="^(items|columns)$"),
+    db: Session = Depends(get_fast_stats_db),
 ):
     response.headers["Cache-Control"] = "public, max-age=60"
-    rows = db.execute(text("""
-        WITH workspace_chats AS (
-            SELECT
-                m.value as workspace,
-                count(*) as chat_count,
-                sum(json_array_length(c.chat->'messages')) as message_count,
-                count(DISTINCT c.user_id) as user_count
-            FROM chat c, json_array_elements_text(c.chat->'models') AS m(value)
-            GROUP BY m.value
-        ),
-        workspace_feedback AS (
-            SELECT
-                f.data->>'model_id' as workspace,
-                count(*) FILTER (WHERE (f.data->>'rating')::int > 0) as positive,
-                count(*) FILTER (WHERE (f.data->>'rating')::int < 0) as negative
-            FROM feedback f
-            GROUP BY f.data->>'model_id'
-        ),
-        workspace_info AS (
-            SELECT m.id, m.name, u.email as developer_email
-            FROM model m
-            LEFT JOIN "user" u ON m.user_id = u.id
-        )
-        SELECT
-            wc.workspace as id,
-            coalesce(wi.name, wc.workspace) as name,
-            wi.developer_email,
-            wc.chat_count,
-            wc.message_count,
-            wc.user_count,
-            coalesce(wf.positive, 0) as positive,
-            coalesce(wf.negative, 0) as negative,
-            count(*) OVER() as _total
-        FROM workspace_chats wc
-        JOIN workspace_info wi ON wc.workspace = wi.id
-        LEFT JOIN workspace_feedback wf ON wc.workspace = wf.workspace
-        ORDER BY wc.chat_count DESC
-        LIMIT :limit OFFSET :offset
-    """), {"limit": limit, "offset": offset}).mappings().all()
+    return leaderboard_page(response, "workspace", db, offset, limit, fmt) or cached_stats(
+        response, ("workspace-ranking", offset, limit, fmt), db, lambda db: rollup_ranking(db, "workspace", offset, limit, fmt),
+    )
 
-    total = rows[0]["_total"] if rows else 0
-    return {
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "items": [
-            {
-                "id": row["id"],
-                "name": row["name"],
-                "developer_email": row["developer_email"] or "",
-                "user_count": row["user_count"],
-                "chat_count": row["chat_count"],
-                "message_count": row["message_count"] or 0,
-                "positive": row["positive"],
-                "negative": row["negative"],
-            }
-            for row in rows
-        ],
-    }
 
+workspace_detail_cache = TTLCache(maxsize=256, ttl=60)
 
-@v1.get("/stats/developer-ranking")
-def get_developer_ranking(
+
+@v1.get("/stats/workspaces/{workspace_id}")
+def get_workspace_detail(
+    workspace_id: str,
     response: Response,
-    offset: int = Query(0, ge=0),
-    limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    date_from: date = Query(alias="from", default=None),
+    date_to: date = Query(alias="to", default=None),
+    top: int = Query(10, ge=1, le=50),
+    tz: ZoneInfo = Depends(report_timezone),
+    db: Session = Depends(get_fast_stats_db),
 ):
+    """Daily usage, feedback trend and top users for one workspace, read from the hourly rollups."""
     response.headers["Cache-Control"] = "public, max-age=60"
-    rows = db.execute(text("""
-        WITH developer_workspaces AS (
-            SELECT m.user_id, m.id as workspace_id
-            FROM model m
-        ),
-        workspace_metrics AS (
-            SELECT
-                mv.value as workspace,
-                count(*) as chat_count,
-                sum(json_array_length(c.chat->'messages')) as message_count,
-                count(DISTINCT c.user_id) as user_count
-            FROM chat c, json_array_elements_text(c.chat->'models') AS mv(value)
-            GROUP BY mv.value
-        ),
-        workspace_fb AS (
-            SELECT
-                f.data->>'model_id' as workspace,
-                count(*) FILTER (WHERE (f.data->>'rating')::int > 0) as positive,
-                count(*) FILTER (WHERE (f.data->>'rating')::int < 0) as negative
-            FROM feedback f
-            GROUP BY f.data->>'model_id'
-        )
+    date_from, date_to = default_date_range(date_from, date_to, tz)
+    cache_key = ("workspace", workspace_id, tz.key, date_from, date_to, top, rollups.version())
+    cached = workspace_detail_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    info = db.execute(text("""
+        SELECT m.id, m.name, u.email as developer_email
+        FROM model m
+        LEFT JOIN "user" u ON m.user_id = u.id
+        WHERE m.id = :id
+    """), {"id": workspace_id}).mappings().first()
+    if not info:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+
+    params = {"id": workspace_id, **local_day_bounds(date_from, date_to, tz)}
+    usage = db.execute(text("""
         SELECT
-            u.id as user_id,
+            (hour AT TIME ZONE :tz)::date as day,
+            sum(chat_count) as chat_count,
+            sum(message_count) as message_count,
+            count(DISTINCT user_id) as user_count
+        FROM stats_model_user_hourly
+        WHERE model_id = :id AND hour >= :start AND hour < :end
+        GROUP BY 1
+    """), params).mappings().all()
+    feedback = db.execute(text("""
+        SELECT (hour AT TIME ZONE :tz)::date as day, sum(positive) as positive, sum(negative) as negative
+        FROM stats_feedback_hourly
+        WHERE model_id = :id AND hour >= :start AND hour < :end
+        GROUP BY 1
+    """), params).mappings().all()
+    top_users = db.execute(text("""
+        SELECT
+            d.user_id,
             u.name as user_name,
             u.email,
-            count(DISTINCT dw.workspace_id) as workspace_count,
-            coalesce(sum(wm.user_count), 0) as total_users,
-            coalesce(sum(wm.chat_count), 0) as total_chats,
-            coalesce(sum(wm.message_count), 0) as total_messages,
-            coalesce(sum(wfb.positive), 0) as total_positive,
-            coalesce(sum(wfb.negative), 0) as total_negative,
+            sum(d.chat_count) as chat_count,
+            sum(d.message_count) as message_count,
             count(*) OVER() as _total
-        FROM developer_workspaces dw
-        JOIN "user" u ON dw.user_id = u.id
-        LEFT JOIN workspace_metrics wm ON dw.workspace_id = wm.workspace
-        LEFT JOIN workspace_fb wfb ON dw.workspace_id = wfb.workspace
-        GROUP BY u.id, u.name, u.email
-        ORDER BY total_chats DESC
-        LIMIT :limit OFFSET :offset
-    """), {"limit": limit, "offset": offset}).mappings().all()
-
-    total = rows[0]["_total"] if rows else 0
-    return {
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "items": [
+        FROM stats_model_user_hourly d
+        LEFT JOIN "user" u ON d.user_id = u.id
+        WHERE d.model_id = :id AND d.hour >= :start AND d.hour < :end
+        GROUP BY d.user_id, u.name, u.email
+        ORDER BY chat_count DESC, d.user_id
+        LIMIT :top
+    """), {**params, "top": top}).mappings().all()
+
+    result = {
+        "id": info["id"],
+        "name": info["name"] or info["id"],
+        "developer_email": info["developer_email"] or "",
+        "from": str(date_from),
+        "to": str(date_to),
+        "user_count": top_users[0]["_total"] if top_users else 0,
+        "daily": daily_series(date_from, date_to, usage, ["chat_count", "message_count", "user_count"]),
+        "feedback": daily_series(date_from, date_to, feedback, ["positive", "negative"]),
+        "top_users": [
             {
                 "user_id": row["user_id"],
-                "user_name": row["user_name"],
-                "email": row["email"],
-                "workspace_count": row["workspace_count"],
-                "total_users": int(row["total_users"]),
-                "total_chats": int(row["total_chats"]),
-                "total_messages": int(row["total_messages"]),
-                "total_positive": int(row["total_positive"]),
-                "total_negative": int(row["total_negative"]),
+                "user_name": row["user_name"] or "",
+                "email": row["email"] or "",
+                "chat_count": int(row["chat_count"]),
+                "message_count": int(row["message_count"]),
             }
-            for row in rows
+            for row in top_users
         ],
     }
+    workspace_detail_cache.set(cache_key, result)
+    return result
+
+
+@v1.get("/stats/developer-ranking")
+def get_developer_ranking(
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    fmt: str = Query("items", alias="format", pattern="^(items|columns)$"),
+    db: Session = Depends(get_fast_stats_db),
+):
+    response.headers["Cache-Control"] = "public, max-age=60"
+    return leaderboard_page(response, "developer", db, offset, limit, fmt) or cached_stats(
+        response, ("developer-ranking", offset, limit, fmt), db, lambda db: rollup_ranking(db, "developer", offset, limit, fmt),
+    )
 
 
 @v1.get("/stats/user-ranking")
@@ -412,143 +731,416 @@ def get_user_ranking(
     response: Response,
     offset: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    fmt: str = Query("items", alias="format", pattern="^(items|columns)$"),
+    db: Session = Depends(get_fast_stats_db),
 ):
     """Rank individual users by their personal chat activity."""
     response.headers["Cache-Control"] = "public, max-age=60"
+    return leaderboard_page(response, "user", db, offset, limit, fmt) or cached_stats(
+        response, ("user-ranking", offset, limit, fmt), db, lambda db: rollup_ranking(db, "user", offset, limit, fmt),
+    )
+
+
+@v1.get("/stats/tokens")
+def get_token_usage(
+    response: Response,
+    date_from: date = Query(alias="from", default=None),
+    date_to: date = Query(alias="to", default=None),
+    tz: ZoneInfo = Depends(report_timezone),
+    db: Session = Depends(get_fast_stats_db),
+):
+    """Prompt/completion tokens per workspace and day in `tz`, from extracted message usage."""
+    response.headers["Cache-Control"] = "public, max-age=60"
+    date_from, date_to = default_date_range(date_from, date_to, tz)
+    # Summed per UTC hour first (integer arithmetic), so only those buckets
+    # are converted to local days, as with the hourly rollups
     rows = db.execute(text("""
-        WITH user_chats AS (
-            SELECT
-                c.user_id,
-                count(*) as chat_count,
-                sum(json_array_length(c.chat->'messages')) as message_count,
-                count(DISTINCT m.value) as workspace_count
-            FROM chat c, json_array_elements_text(c.chat->'models') AS m(value)
-            GROUP BY c.user_id
-        ),
-        user_fb AS (
-            SELECT
-                f.user_id,
-                count(*) as total_feedbacks
-            FROM feedback f
-            GROUP BY f.user_id
-        )
         SELECT
-            u.id as user_id,
-            u.name as user_name,
-            u.email,
-            coalesce(uc.chat_count, 0) as chat_count,
-            coalesce(uc.message_count, 0) as message_count,
-            coalesce(uc.workspace_count, 0) as workspace_count,
-            coalesce(ufb.total_feedbacks, 0) as total_feedbacks,
-            count(*) OVER() as _total
-        FROM "user" u
-        LEFT JOIN user_chats uc ON u.id = uc.user_id
-        LEFT JOIN user_fb ufb ON u.id = ufb.user_id
-        WHERE coalesce(uc.chat_count, 0) > 0
-        ORDER BY chat_count DESC
-        LIMIT :limit OFFSET :offset
-    """), {"limit": limit, "offset": offset}).mappings().all()
+            h.model_id,
+            coalesce(m.name, h.model_id) as name,
+            (to_timestamp(h.hour) AT TIME ZONE :tz)::date as day,
+            sum(h.message_count) as message_count,
+            sum(h.prompt_tokens) as prompt_tokens,
+            sum(h.completion_tokens) as completion_tokens
+        FROM (
+            SELECT model_id, created_at - created_at % 3600 as hour,
+                   count(*) as message_count,
+                   coalesce(sum(prompt_tokens), 0) as prompt_tokens,
+                   coalesce(sum(completion_tokens), 0) as completion_tokens
+            FROM chat_message_usage
+            WHERE created_at >= :start AND created_at < :end
+            GROUP BY 1, 2
+        ) h
+        LEFT JOIN model m ON h.model_id = m.id
+        GROUP BY h.model_id, m.name, 3
+    """), local_epoch_bounds(date_from, date_to, tz)).mappings().all()
+
+    by_workspace: dict[str, dict] = {}
+    for row in rows:
+        ws = by_workspace.setdefault(row["model_id"], {"id": row["model_id"], "name": row["name"], "rows": []})
+        ws["rows"].append(row)
+    fields = ["message_count", "prompt_tokens", "completion_tokens"]
+    workspaces = [
+        {
+            "id": ws["id"],
+            "name": ws["name"],
+            **{f: sum(int(r[f]) for r in ws["rows"]) for f in fields},
+            "daily": daily_series(date_from, date_to, ws["rows"], fields),
+        }
+        for ws in by_workspace.values()
+    ]
+    workspaces.sort(key=lambda w: w["prompt_tokens"] + w["completion_tokens"], reverse=True)
+    return {"from": str(date_from), "to": str(date_to), "workspaces": workspaces}
 
-    total = rows[0]["_total"] if rows else 0
+
+@v1.get("/stats/models/share")
+def get_model_share(
+    response: Response,
+    date_from: date = Query(alias="from", default=None),
+    date_to: date = Query(alias="to", default=None),
+    tz: ZoneInfo = Depends(report_timezone),
+    db: Session = Depends(get_fast_stats_db),
+):
+    """Daily chats per model and their share of that day's chats, from the hourly rollups."""
+    response.headers["Cache-Control"] = "public, max-age=60"
+    date_from, date_to = default_date_range(date_from, date_to, tz)
+    params = local_day_bounds(date_from, date_to, tz)
+    rows = db.execute(text("""
+        SELECT h.model_id, coalesce(m.name, h.model_id) as name, (h.hour AT TIME ZONE :tz)::date as day,
+               sum(h.chat_count) as chats
+        FROM stats_model_user_hourly h
+        LEFT JOIN model m ON h.model_id = m.id
+        WHERE h.hour >= :start AND h.hour < :end
+        GROUP BY h.model_id, m.name, 3
+    """), params).mappings().all()
+    # A chat using two models counts toward both, so shares can sum past 1;
+    # the per-user rollup counts every chat once
+    totals = dict(db.execute(text("""
+        SELECT (hour AT TIME ZONE :tz)::date, sum(chat_count) FROM stats_user_hourly
+        WHERE hour >= :start AND hour < :end
+        GROUP BY 1
+    """), params).all())
+
+    by_model: dict[str, dict] = {}
+    for row in rows:
+        model = by_model.setdefault(row["model_id"], {"id": row["model_id"], "name": row["name"], "rows": []})
+        model["rows"].append(row)
+    models = []
+    for model in by_model.values():
+        daily = daily_series(date_from, date_to, model["rows"], ["chats"])
+        for point in daily:
+            total = totals.get(date.fromisoformat(point["date"]), 0)
+            point["share"] = round(point["chats"] / total, 4) if total else 0.0
+        models.append({
+            "id": model["id"],
+            "name": model["name"],
+            "chats": sum(point["chats"] for point in daily),
+            "daily": daily,
+        })
+    models.sort(key=lambda m: m["chats"], reverse=True)
     return {
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "items": [
+        "from": str(date_from),
+        "to": str(date_to),
+        "daily_totals": daily_series(date_from, date_to, [{"day": d, "chats": n} for d, n in totals.items()], ["chats"]),
+        "models": models,
+    }
+
+
+@v1.get("/stats/latency")
+def get_latency(
+    response: Response,
+    date_from: date = Query(alias="from", default=None),
+    date_to: date = Query(alias="to", default=None),
+    tz: ZoneInfo = Depends(report_timezone),
+    db: Session = Depends(get_fast_stats_db),
+):
+    """p50/p95 response latency per model over days in `tz`, from extracted message usage."""
+    response.headers["Cache-Control"] = "public, max-age=60"
+    date_from, date_to = default_date_range(date_from, date_to, tz)
+    rows = db.execute(text("""
+        SELECT
+            u.model_id,
+            coalesce(m.name, u.model_id) as name,
+            count(*) as message_count,
+            percentile_cont(0.5) WITHIN GROUP (ORDER BY u.latency_ms) as p50,
+            percentile_cont(0.95) WITHIN GROUP (ORDER BY u.latency_ms) as p95
+        FROM chat_message_usage u
+        LEFT JOIN model m ON u.model_id = m.id
+        WHERE u.created_at >= :start AND u.created_at < :end AND u.latency_ms IS NOT NULL
+        GROUP BY u.model_id, m.name
+        ORDER BY message_count DESC
+    """), local_epoch_bounds(date_from, date_to, tz)).mappings().all()
+    return {
+        "from": str(date_from),
+        "to": str(date_to),
+        "models": [
             {
-                "user_id": row["user_id"],
-                "user_name": row["user_name"],
-                "email": row["email"],
-                "chat_count": int(row["chat_count"]),
-                "message_count": int(row["message_count"]),
-                "workspace_count": int(row["workspace_count"]),
-                "total_feedbacks": int(row["total_feedbacks"]),
+                "id": row["model_id"],
+                "name": row["name"],
+                "message_count": row["message_count"],
+                "p50_ms": round(row["p50"]),
+                "p95_ms": round(row["p95"]),
             }
             for row in rows
         ],
     }
 
 
-@v1.get("/stats/group-ranking")
-def get_group_ranking(
+@v1.get("/stats/feedback/trends")
+def get_feedback_trends(
     response: Response,
-    offset: int = Query(0, ge=0),
-    limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    date_from: date = Query(alias="from", default=None),
+    date_to: date = Query(alias="to", default=None),
+    workspace: Optional[str] = None,
+    tz: ZoneInfo = Depends(report_timezone),
+    db: Session = Depends(get_fast_stats_db),
 ):
+    """Daily positive/negative ratings per workspace, from the hourly feedback rollup."""
     response.headers["Cache-Control"] = "public, max-age=60"
-    rows = db.execute(text("""
-        WITH group_members AS (
-            SELECT
-                g.id as group_id,
-                g.name as group_name,
-                gm.user_id,
-                count(*) OVER (PARTITION BY g.id) as member_count
-            FROM "group" g
-            JOIN group_member gm ON g.id = gm.group_id
-        ),
-        workspace_ids AS (
-            SELECT id FROM model
-        ),
-        user_usage AS (
-            SELECT
-                c.user_id,
-                m.value as workspace,
-                count(*) as chat_count,
-                sum(json_array_length(c.chat->'messages')) as message_count
-            FROM chat c, json_array_elements_text(c.chat->'models') AS m(value)
-            GROUP BY c.user_id, m.value
-        ),
-        user_fb AS (
-            SELECT
-                f.user_id,
-                count(*) as total_feedbacks
-            FROM feedback f
-            WHERE f.data->>'model_id' IN (SELECT id FROM workspace_ids)
-            GROUP BY f.user_id
-        )
+    date_from, date_to = default_date_range(date_from, date_to, tz)
+    workspace_filter = "AND h.model_id = :workspace" if workspace else ""
+    rows = db.execute(text(f"""
         SELECT
-            gm.group_id,
-            gm.group_name,
-            gm.member_count,
-            coalesce(sum(uu.chat_count), 0) as total_chats,
-            coalesce(sum(uu.message_count), 0) as total_messages,
-            coalesce(sum(ufb.total_feedbacks), 0) as total_feedbacks,
-            round(coalesce(sum(uu.chat_count), 0)::numeric
-                / NULLIF(gm.member_count, 0), 1) as chats_per_member,
-            round(coalesce(sum(uu.message_count), 0)::numeric
-                / NULLIF(gm.member_count, 0), 1) as messages_per_member,
-            count(*) OVER() as _total
-        FROM group_members gm
-        LEFT JOIN user_usage uu ON gm.user_id = uu.user_id
-        LEFT JOIN user_fb ufb ON gm.user_id = ufb.user_id
-        GROUP BY gm.group_id, gm.group_name, gm.member_count
-        ORDER BY chats_per_member DESC NULLS LAST
-        LIMIT :limit OFFSET :offset
-    """), {"limit": limit, "offset": offset}).mappings().all()
+            h.model_id,
+            coalesce(m.name, h.model_id) as name,
+            (h.hour AT TIME ZONE :tz)::date as day,
+            sum(h.positive) as positive,
+            sum(h.negative) as negative
+        FROM stats_feedback_hourly h
+        LEFT JOIN model m ON h.model_id = m.id
+        WHERE h.hour >= :start AND h.hour < :end {workspace_filter}
+        GROUP BY h.model_id, m.name, 3
+    """), {**local_day_bounds(date_from, date_to, tz), "workspace": workspace}).mappings().all()
+
+    by_workspace: dict[str, dict] = {}
+    for row in rows:
+        ws = by_workspace.setdefault(row["model_id"], {"id": row["model_id"], "name": row["name"], "rows": []})
+        ws["rows"].append(row)
+    fields = ["positive", "negative"]
+    workspaces = [
+        {
+            "id": ws["id"],
+            "name": ws["name"],
+            **{f: sum(int(r[f]) for r in ws["rows"]) for f in fields},
+            "daily": daily_series(date_from, date_to, ws["rows"], fields),
+        }
+        for ws in by_workspace.values()
+    ]
+    workspaces.sort(key=lambda w: w["positive"] + w["negative"], reverse=True)
+    return {"from": str(date_from), "to": str(date_to), "workspaces": workspaces}
 
-    total = rows[0]["_total"] if rows else 0
+
+@v1.get("/stats/feedback/satisfaction")
+def get_feedback_satisfaction(
+    response: Response,
+    date_from: date = Query(alias="from", default=None),
+    date_to: date = Query(alias="to", default=None),
+    tz: ZoneInfo = Depends(report_timezone),
+    db: Session = Depends(get_fast_stats_db),
+):
+    """Share of positive ratings per workspace with a 95% Wilson confidence interval."""
+    response.headers["Cache-Control"] = "public, max-age=60"
+    date_from, date_to = default_date_range(date_from, date_to, tz)
+    rows = db.execute(text("""
+        SELECT
+            h.model_id,
+            coalesce(m.name, h.model_id) as name,
+            sum(h.positive)::int as positive,
+            sum(h.negative)::int as negative
+        FROM stats_feedback_hourly h
+        LEFT JOIN model m ON h.model_id = m.id
+        WHERE h.hour >= :start AND h.hour < :end
+        GROUP BY h.model_id, m.name
+    """), local_day_bounds(date_from, date_to, tz)).mappings().all()
+
+    workspaces = []
+    for row in rows:
+        rated = row["positive"] + row["negative"]
+        low, high = feedback_analytics.wilson_interval(row["positive"], rated)
+        workspaces.append({
+            "id": row["model_id"],
+            "name": row["name"],
+            "positive": row["positive"],
+            "negative": row["negative"],
+            "satisfaction": round(row["positive"] / rated, 3) if rated else None,
+            "ci_low": round(low, 3),
+            "ci_high": round(high, 3),
+        })
+    # Lower bound first: a 3/3 workspace shouldn't outrank a 95/100 one
+    workspaces.sort(key=lambda w: w["ci_low"], reverse=True)
+    return {"from": str(date_from), "to": str(date_to), "workspaces": workspaces}
+
+
+@v1.get("/stats/feedback/negative-comments")
+def get_negative_comments(
+    workspace: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_fast_stats_db),
+    current_user: str = Depends(get_current_user),
+):
+    """Most recent negative ratings that carry a comment (admin only), newest first."""
+    if not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="Admin access required")
+    params = {"limit": limit + 1, "workspace": workspace}
+    keyset = ""
+    if cursor:
+        try:
+            created, _, last_id = cursor.partition(":")
+            params.update(c_created=int(created), c_id=last_id)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        keyset = "AND (r.created_at, r.id) < (:c_created, :c_id)"
+    workspace_filter = "AND r.model_id = :workspace" if workspace else ""
+    rows = db.execute(text(f"""
+        SELECT
+            r.id,
+            r.model_id,
+            coalesce(m.name, r.model_id) as name,
+            r.reason,
+            r.comment,
+            r.created_at,
+            to_timestamp(r.created_at) AT TIME ZONE 'Asia/Seoul' as created_at_kst
+        FROM feedback_ratings r
+        LEFT JOIN model m ON r.model_id = m.id
+        WHERE r.rating < 0 AND r.comment IS NOT NULL {workspace_filter} {keyset}
+        ORDER BY r.created_at DESC, r.id DESC
+        LIMIT :limit
+    """), params).mappings().all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1]['created_at']}:{rows[-1]['id']}"
     return {
-        "total": total,
-        "offset": offset,
         "limit": limit,
+        "next_cursor": next_cursor,
         "items": [
             {
-                "group_id": row["group_id"],
-                "group_name": row["group_name"],
-                "member_count": row["member_count"],
-                "total_chats": int(row["total_chats"]),
-                "total_messages": int(row["total_messages"]),
-                "total_feedbacks": int(row["total_feedbacks"]),
-                "chats_per_member": float(row["chats_per_member"] or 0),
-                "messages_per_member": float(row["messages_per_member"] or 0),
+                "id": row["id"],
+                "workspace_id": row["model_id"],
+                "workspace_name": row["name"],
+                "reason": row["reason"] or "",
+                "comment": row["comment"],
+                "created_at": str(row["created_at_kst"]),
             }
             for row in rows
         ],
     }
 
 
+@v1.get("/stats/engagement")
+def get_engagement(response: Response, tz: ZoneInfo = Depends(report_timezone)):
+    """Rolling DAU/WAU/MAU and DAU/MAU stickiness for the last 90 days in `tz`."""
+    response.headers["Cache-Control"] = "public, max-age=60"
+    snap = engagement.snapshot(get_engine(), tz)
+    return {"as_of": snap["as_of"], "series": snap["series"]}
+
+
+@v1.get("/stats/cohorts")
+def get_cohorts(response: Response, tz: ZoneInfo = Depends(report_timezone)):
+    """Weekly signup cohorts (weeks in `tz`) with the share of each cohort active in every week since."""
+    response.headers["Cache-Control"] = "public, max-age=60"
+    snap = engagement.snapshot(get_engine(), tz)
+    return {"as_of": snap["as_of"], "cohorts": snap["cohorts"]}
+
+
+user_detail_cache = TTLCache(maxsize=1024, ttl=60)
+
+
+@v1.get("/stats/users/{user_id}")
+def get_user_detail(
+    user_id: str,
+    response: Response,
+    date_from: date = Query(alias="from", default=None),
+    date_to: date = Query(alias="to", default=None),
+    tz: ZoneInfo = Depends(report_timezone),
+    db: Session = Depends(get_fast_stats_db),
+):
+    """Daily activity, workspaces used and feedback given by one user, read from the hourly rollups."""
+    response.headers["Cache-Control"] = "public, max-age=60"
+    date_from, date_to = default_date_range(date_from, date_to, tz)
+    cache_key = ("user", user_id, tz.key, date_from, date_to, rollups.version())
+    cached = user_detail_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    info = db.execute(text("""
+        SELECT
+            u.id, u.name, u.email,
+            (SELECT (min(hour) AT TIME ZONE :tz)::date FROM stats_user_hourly WHERE user_id = u.id) as first_seen,
+            (SELECT (max(hour) AT TIME ZONE :tz)::date FROM stats_user_hourly WHERE user_id = u.id) as last_seen
+        FROM "user" u
+        WHERE u.id = :id
+    """), {"id": user_id, "tz": tz.key}).mappings().first()
+    if not info:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    params = {"id": user_id, **local_day_bounds(date_from, date_to, tz)}
+    activity = db.execute(text("""
+        SELECT (hour AT TIME ZONE :tz)::date as day, sum(chat_count) as chat_count, sum(message_count) as message_count
+        FROM stats_user_hourly
+        WHERE user_id = :id AND hour >= :start AND hour < :end
+        GROUP BY 1
+    """), params).mappings().all()
+    workspaces = db.execute(text("""
+        SELECT
+            d.model_id,
+            coalesce(m.name, d.model_id) as name,
+            sum(d.chat_count) as chat_count,
+            sum(d.message_count) as message_count,
+            (max(d.hour) AT TIME ZONE :tz)::date as last_used
+        FROM stats_model_user_hourly d
+        LEFT JOIN model m ON d.model_id = m.id
+        WHERE d.user_id = :id AND d.hour >= :start AND d.hour < :end
+        GROUP BY d.model_id, m.name
+        ORDER BY chat_count DESC, d.model_id
+    """), params).mappings().all()
+    feedback = db.execute(text("""
+        SELECT coalesce(sum(positive), 0) as positive, coalesce(sum(negative), 0) as negative
+        FROM stats_feedback_hourly
+        WHERE user_id = :id AND hour >= :start AND hour < :end
+    """), params).mappings().first()
+
+    result = {
+        "user_id": info["id"],
+        "user_name": info["name"] or "",
+        "email": info["email"] or "",
+        "first_seen": str(info["first_seen"]) if info["first_seen"] else None,
+        "last_seen": str(info["last_seen"]) if info["last_seen"] else None,
+        "from": str(date_from),
+        "to": str(date_to),
+        "daily": daily_series(date_from, date_to, activity, ["chat_count", "message_count"]),
+        "workspaces": [
+            {
+                "id": row["model_id"],
+                "name": row["name"],
+                "chat_count": int(row["chat_count"]),
+                "message_count": int(row["message_count"]),
+                "last_used": str(row["last_used"]),
+            }
+            for row in workspaces
+        ],
+        "feedback": {"positive": int(feedback["positive"]), "negative": int(feedback["negative"])},
+    }
+    user_detail_cache.set(cache_key, result)
+    return result
+
+
+@v1.get("/stats/group-ranking")
+def get_group_ranking(
+    response: Response,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    fmt: str = Query("items", alias="format", pattern="^(items|columns)$"),
+    db: Session = Depends(get_fast_stats_db),
+):
+    response.headers["Cache-Control"] = "public, max-age=60"
+    return leaderboard_page(response, "group", db, offset, limit, fmt) or cached_stats(
+        response, ("group-ranking", offset, limit, fmt), db, lambda db: rollup_ranking(db, "group", offset, limit, fmt),
+    )
+
+
 # ─── Tool & Function Registry ─────────────────────────────────────────
 
 @v1.get("/stats/tool-ranking")
@@ -556,7 +1148,8 @@ def get_tool_ranking(
     response: Response,
     offset: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    fmt: str = Query("items", alias="format", pattern="^(items|columns)$"),
+    db: Session = Depends(get_fast_stats_db),
 ):
     """List registered tools with creator info."""
     response.headers["Cache-Control"] = "public, max-age=60"
@@ -576,22 +1169,18 @@ def get_tool_ranking(
     """), {"limit": limit, "offset": offset}).mappings().all()
 
     total = rows[0]["_total"] if rows else 0
-    return {
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "items": [
-            {
-                "id": row["id"],
-                "name": row["name"],
-                "creator_name": row["creator_name"] or "",
-                "creator_email": row["creator_email"] or "",
-                "created_at": str(row["created_at"]),
-                "updated_at": str(row["updated_at"]),
-            }
-            for row in rows
-        ],
-    }
+    items = [
+        {
+            "id": row["id"],
+            "name": row["name"],
+            "creator_name": row["creator_name"] or "",
+            "creator_email": row["creator_email"] or "",
+            "created_at": str(row["created_at"]),
+            "updated_at": str(row["updated_at"]),
+        }
+        for row in rows
+    ]
+    return ranking_page(total, offset, limit, items, fmt)
 
 
 @v1.get("/stats/function-ranking")
@@ -599,7 +1188,8 @@ def get_function_ranking(
     response: Response,
     offset: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    fmt: str = Query("items", alias="format", pattern="^(items|columns)$"),
+    db: Session = Depends(get_fast_stats_db),
 ):
     """List registered functions (pipes, filters, actions) with creator info."""
     response.headers["Cache-Control"] = "public, max-age=60"
@@ -622,25 +1212,21 @@ def get_function_ranking(
     """), {"limit": limit, "offset": offset}).mappings().all()
 
     total = rows[0]["_total"] if rows else 0
-    return {
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "items": [
-            {
-                "id": row["id"],
-                "name": row["name"],
-                "type": row["type"],
-                "is_active": row["is_active"],
-                "is_global": row["is_global"],
-                "creator_name": row["creator_name"] or "",
-                "creator_email": row["creator_email"] or "",
-                "created_at": str(row["created_at"]),
-                "updated_at": str(row["updated_at"]),
-            }
-            for row in rows
-        ],
-    }
+    items = [
+        {
+            "id": row["id"],
+            "name": row["name"],
+            "type": row["type"],
+            "is_active": row["is_active"],
+            "is_global": row["is_global"],
+            "creator_name": row["creator_name"] or "",
+            "creator_email": row["creator_email"] or "",
+            "created_at": str(row["created_at"]),
+            "updated_at": str(row["updated_at"]),
+        }
+        for row in rows
+    ]
+    return ranking_page(total, offset, limit, items, fmt)
 
 
 @v1.get("/stats/skill-ranking")
@@ -648,7 +1234,8 @@ def get_skill_ranking(
     response: Response,
     offset: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
-    db: Session = Depends(get_db),
+    fmt: str = Query("items", alias="format", pattern="^(items|columns)$"),
+    db: Session = Depends(get_fast_stats_db),
 ):
     """List registered skills with creator info."""
     response.headers["Cache-Control"] = "public, max-age=60"
@@ -670,43 +1257,43 @@ def get_skill_ranking(
     """), {"limit": limit, "offset": offset}).mappings().all()
 
     total = rows[0]["_total"] if rows else 0
-    return {
-        "total": total,
-        "offset": offset,
-        "limit": limit,
-        "items": [
-            {
-                "id": row["id"],
-                "name": row["name"],
-                "description": (row["description"] or "")[:120],
-                "is_active": row["is_active"],
-                "creator_name": row["creator_name"] or "",
-                "creator_email": row["creator_email"] or "",
-                "created_at": str(row["created_at"]),
-                "updated_at": str(row["updated_at"]),
-            }
-            for row in rows
-        ],
-    }
+    items = [
+        {
+            "id": row["id"],
+            "name": row["name"],
+            "description": (row["description"] or "")[:120],
+            "is_active": row["is_active"],
+            "creator_name": row["creator_name"] or "",
+            "creator_email": row["creator_email"] or "",
+            "created_at": str(row["created_at"]),
+            "updated_at": str(row["updated_at"]),
+        }
+        for row in rows
+    ]
+    return ranking_page(total, offset, limit, items, fmt)
 
 
 # ─── Auth ──────────────────────────────────────────────────────────────
 
 @v1.get("/auth/me")
 def get_me(current_user: str = Depends(get_current_user)):
-    return {"user": current_user, "is_admin": current_user in ADMIN_USERS}
+    return {"user": current_user, "is_admin": is_admin(current_user)}
 
 
 # ─── Python Packages ──────────────────────────────────────────────────
 
 @v1.get("/packages")
 def list_packages(
+    request: Request,
     response: Response,
     offset: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db),
 ):
-    response.headers["Cache-Control"] = "no-cache"
+    return generation_cached(request, response, db, "packages", (offset, limit), lambda: _package_page(db, offset, limit))
+
+
+def _package_page(db: Session, offset: int, limit: int) -> dict:
     rows = db.execute(text("""
         SELECT id, package_name, added_by,
                added_at AT TIME ZONE 'Asia/Seoul' as added_at,
@@ -735,17 +1322,33 @@ def list_packages(
     }
 
 
-@v1.post("/packages", status_code=201)
+def normalize_package_spec(raw: str) -> str:
+    name = raw.strip().lower()
+    if not name:
+        raise HTTPException(status_code=400, detail="Package name cannot be empty")
+    if not re.match(r'^[a-zA-Z0-9._\-\[\]>=<!~, ]+$', name):
+        raise HTTPException(status_code=400, detail="Invalid package name format")
+    # Imported here to keep app startup light; only the package routes need it
+    from packaging.requirements import Requirement, InvalidRequirement
+    try:
+        Requirement(name)
+    except InvalidRequirement as e:
+        raise HTTPException(status_code=400, detail=f"Invalid version specifier: {e}")
+    return name
+
+
+@v1.post("/packages", status_code=201, dependencies=[Depends(rate_limit("add_package"))])
 def add_package(
     body: PackageCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user),
 ):
-    name = body.package_name.strip().lower()
-    if not name:
-        raise HTTPException(status_code=400, detail="Package name cannot be empty")
-    if not re.match(r'^[a-zA-Z0-9._\-\[\]>=<!, ]+$', name):
-        raise HTTPException(status_code=400, detail="Invalid package name format")
+    name = normalize_package_spec(body.package_name)
+    req_hash = idempotency.request_hash(body)
+    replayed = idempotency.replay(db, current_user, idempotency_key, "add_package", req_hash)
+    if replayed:
+        return replayed
     try:
         result = db.execute(
             text("""INSERT INTO python_packages (package_name, added_by)
@@ -757,8 +1360,7 @@ def add_package(
         )
         row = result.mappings().first()
         log_audit(db, row["id"], name, "added", current_user)
-        db.commit()
-        return {
+        item = {
             "id": row["id"],
             "package_name": row["package_name"],
             "added_by": row["added_by"],
@@ -766,15 +1368,65 @@ def add_package(
             "status": row["status"],
             "status_note": row["status_note"],
         }
+        idempotency.store(db, current_user, idempotency_key, "add_package", req_hash, 201, item)
+        db.commit()
+        invalidate_cache("packages")
+        return item
     except Exception as e:
         db.rollback()
+        # A concurrent retry with the same Idempotency-Key committed first
+        replayed = idempotency.replay(db, current_user, idempotency_key, "add_package", req_hash)
+        if replayed:
+            return replayed
         if "unique" in str(e).lower() or "duplicate" in str(e).lower():
             raise HTTPException(status_code=409, detail=f"Package '{name}' already exists")
         logger.exception("Failed to add package '%s'", name)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@v1.delete("/packages/{package_id}")
+@v1.post("/packages/resolve", dependencies=[Depends(rate_limit("resolve_package"))])
+def resolve_package(
+    body: PackageCreate,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user),
+):
+    """Dry-run resolve a proposed package against installed and pending requests.
+
+    Both resolves share one RESOLVE_TIMEOUT budget; when the first leaves too
+    little, the pending check is skipped and `pending_checked` is false.
+    """
+    deadline = monotonic() + RESOLVE_TIMEOUT
+    name = normalize_package_spec(body.package_name)
+    rows = db.execute(text("""
+        SELECT package_name, status FROM python_packages
+        WHERE status IN ('installed', 'pending') AND package_name != :name
+    """), {"name": name}).mappings().all()
+    installed = [r["package_name"] for r in rows if r["status"] == "installed"]
+    pending = [r["package_name"] for r in rows if r["status"] == "pending"]
+
+    result, cached = resolve_preview(installed + [name], deadline - monotonic())
+    pending_conflicts = []
+    pending_checked = not pending
+    if result["ok"] and pending and deadline - monotonic() >= 1:
+        with_pending, pending_cached = resolve_preview(installed + pending + [name], deadline - monotonic())
+        if not with_pending.get("timed_out"):
+            pending_conflicts = with_pending["conflicts"]
+            pending_checked = True
+        cached = cached and pending_cached
+    return {
+        "package_name": name,
+        "ok": result["ok"],
+        "conflicts": result["conflicts"],
+        "unavailable": result["unavailable"],
+        "offline": not RESOLVE_INDEX_URL,
+        "pending_conflicts": pending_conflicts,
+        "pending_checked": pending_checked,
+        "pins": result["pins"],
+        "cached": cached,
+    }
+
+
+@v1.delete("/packages/{package_id}", dependencies=[Depends(rate_limit("delete_package"))])
 def delete_package(
     package_id: int,
     db: Session = Depends(get_db),
@@ -786,22 +1438,23 @@ def delete_package(
     ).mappings().first()
     if not row:
         raise HTTPException(status_code=404, detail="Package not found")
-    if row["added_by"] != current_user and current_user not in ADMIN_USERS:
+    if row["added_by"] != current_user and not is_admin(current_user):
         raise HTTPException(status_code=403, detail="You can only delete packages you added")
     db.execute(text("DELETE FROM python_packages WHERE id = :id"), {"id": package_id})
     log_audit(db, package_id, row["package_name"], "deleted", current_user)
     db.commit()
+    invalidate_cache("packages")
     return {"ok": True}
 
 
-@v1.patch("/packages/{package_id}/status")
+@v1.patch("/packages/{package_id}/status", dependencies=[Depends(rate_limit("update_package_status"))])
 def update_package_status(
     package_id: int,
     body: PackageStatusUpdate,
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user),
 ):
-    if current_user not in ADMIN_USERS:
+    if not is_admin(current_user):
         raise HTTPException(status_code=403, detail="Only admins can change package status")
     if body.status not in ("pending", "installed", "rejected", "uninstalled"):
         raise HTTPException(status_code=400, detail="Status must be pending, installed, rejected, or uninstalled")
@@ -820,29 +1473,71 @@ def update_package_status(
     )
     log_audit(db, package_id, row["package_name"], f"status:{body.status}", current_user, body.status_note)
     db.commit()
+    invalidate_cache("packages")
     return {"ok": True}
 
 
 # ─── Package Audit Log ───────────────────────────────────────────────
 
+def audit_item(row) -> dict:
+    return {
+        "id": row["id"],
+        "package_id": row["package_id"],
+        "package_name": row["package_name"],
+        "action": row["action"],
+        "performed_by": row["performed_by"],
+        "detail": row["detail"],
+        "created_at": str(row["created_at"]),
+    }
+
+
 @v1.get("/packages/audit-log")
 def get_audit_log(
+    request: Request,
     response: Response,
     offset: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=200),
+    q: Optional[str] = Query(None, max_length=200),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user),
 ):
-    """Admin-only endpoint to query the package audit log."""
-    if current_user not in ADMIN_USERS:
+    """Admin-only endpoint to query the package audit log.
+
+    With `q`, matches package_name and detail by full-text search, ranked and
+    paged by `cursor` (the previous page's `next_cursor`) instead of `offset`.
+    """
+    if not is_admin(current_user):
         raise HTTPException(status_code=403, detail="Admin access required")
-    response.headers["Cache-Control"] = "no-cache"
+    return generation_cached(
+        request, response, db, "audit_log", (offset, limit, q, cursor),
+        lambda: _audit_log_page(db, offset, limit, q, cursor),
+    )
+
+
+def _audit_log_page(db: Session, offset: int, limit: int, q: Optional[str], cursor: Optional[str]) -> dict:
+    if q and q.strip():
+        page = search_page(db, """
+            SELECT id, package_id, package_name, action, performed_by, detail,
+                   created_at AT TIME ZONE 'Asia/Seoul' as created_at,
+                   ts_rank(search_vector, query)::float8 as rank
+            FROM package_audit_log, websearch_to_tsquery('simple', :q) query
+            WHERE search_vector @@ query
+        """, {"q": q.strip()}, cursor, limit)
+        return {
+            "q": q.strip(),
+            "total": page["total"],
+            "limit": limit,
+            "next_cursor": page["next_cursor"],
+            "items": [audit_item(row) for row in page["rows"]],
+        }
+
     rows = db.execute(text("""
         SELECT id, package_id, package_name, action, performed_by, detail,
                created_at AT TIME ZONE 'Asia/Seoul' as created_at,
                count(*) OVER() as _total
         FROM package_audit_log
-        ORDER BY created_at DESC
+        ORDER BY package_audit_log.created_at DESC
         LIMIT :limit OFFSET :offset
     """), {"limit": limit, "offset": offset}).mappings().all()
     total = rows[0]["_total"] if rows else 0
@@ -850,18 +1545,7 @@ def get_audit_log(
         "total": total,
         "offset": offset,
         "limit": limit,
-        "items": [
-            {
-                "id": row["id"],
-                "package_id": row["package_id"],
-                "package_name": row["package_name"],
-                "action": row["action"],
-                "performed_by": row["performed_by"],
-                "detail": row["detail"],
-                "created_at": str(row["created_at"]),
-            }
-            for row in rows
-        ],
+        "items": [audit_item(row) for row in rows],
     }
 
 
@@ -869,58 +1553,157 @@ def get_audit_log(
 
 VALID_REPORT_CATEGORIES = ("bug", "feature", "question", "other")
 VALID_REPORT_STATUSES = ("open", "in_progress", "resolved", "rejected", "wontfix")
+# Logs and screenshots belong in attachments, not in the description every list page carries
+REPORT_DESCRIPTION_MAX_LENGTH = 10000
+
+
+def attachment_item(row) -> dict:
+    return {
+        "id": row["id"],
+        "filename": row["filename"],
+        "content_type": row["content_type"],
+        "size_bytes": row["size_bytes"],
+        "created_at": str(row["created_at"]),
+    }
+
+
+def report_attachments_by_id(db: Session, report_ids: list[int]) -> dict[int, list[dict]]:
+    """Attachment metadata for a page of reports, in one query."""
+    rows = db.execute(text("""
+        SELECT id, report_id, filename, content_type, size_bytes,
+               created_at AT TIME ZONE 'Asia/Seoul' as created_at
+        FROM issue_report_attachments
+        WHERE report_id = ANY(:ids)
+        ORDER BY report_id, id
+    """), {"ids": report_ids}).mappings().all()
+    by_report: dict[int, list[dict]] = {}
+    for row in rows:
+        by_report.setdefault(row["report_id"], []).append(attachment_item(row))
+    return by_report
+
+
+def report_item(row, admin: bool, attachments: list[dict]) -> dict:
+    item = {
+        "id": row["id"],
+        "title": row["title"],
+        "description": row["description"],
+        "category": row["category"],
+        "reported_by": "Anonymous" if row["is_anonymous"] else (row["reported_by"] or "Unknown"),
+        "is_anonymous": row["is_anonymous"],
+        "status": row["status"],
+        "admin_note": row["admin_note"],
+        "created_at": str(row["created_at"]),
+        "updated_at": str(row["updated_at"]),
+        "attachments": attachments,
+    }
+    # Admin can see real author even for anonymous reports
+    if admin and row["is_anonymous"]:
+        item["actual_reported_by"] = row["reported_by"]
+    return item
 
 
 @v1.get("/reports")
 def list_reports(
+    request: Request,
     response: Response,
     offset: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=200),
+    q: Optional[str] = Query(None, max_length=200),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    reported_by: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user),
 ):
-    response.headers["Cache-Control"] = "no-cache"
-    is_admin = current_user in ADMIN_USERS
-    rows = db.execute(text("""
+    """List issue reports, newest first, or ranked by full-text match on `q`."""
+    admin = is_admin(current_user)
+    if status is not None and status not in VALID_REPORT_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Status must be one of: {', '.join(VALID_REPORT_STATUSES)}")
+    if category is not None and category not in VALID_REPORT_CATEGORIES:
+        raise HTTPException(status_code=400, detail=f"Category must be one of: {', '.join(VALID_REPORT_CATEGORIES)}")
+
+    filters = []
+    params = {}
+    if status:
+        filters.append("status = :status")
+        params["status"] = status
+    if category:
+        filters.append("category = :category")
+        params["category"] = category
+    if reported_by:
+        filters.append("reported_by = :reported_by")
+        params["reported_by"] = reported_by
+        # Filtering by author must not reveal who filed anonymous reports
+        if not admin and reported_by != current_user:
+            filters.append("NOT is_anonymous")
+    where = " AND ".join(filters) or "true"
+    return generation_cached(
+        request, response, db, "reports", (where, tuple(sorted(params.items())), offset, limit, q, cursor, admin),
+        lambda: _report_page(db, where, params, offset, limit, q, cursor, admin),
+    )
+
+
+def _report_page(
+    db: Session, where: str, params: dict, offset: int, limit: int,
+    q: Optional[str], cursor: Optional[str], admin: bool,
+) -> dict:
+    if q and q.strip():
+        page = search_page(db, """
+            SELECT id, title, description, category, reported_by, is_anonymous,
+                   status, admin_note,
+                   created_at AT TIME ZONE 'Asia/Seoul' as created_at,
+                   updated_at AT TIME ZONE 'Asia/Seoul' as updated_at,
+                   ts_rank(search_vector, query)::float8 as rank
+            FROM issue_reports, websearch_to_tsquery('simple', :q) query
+            WHERE search_vector @@ query AND {where}
+        """.format(where=where), {**params, "q": q.strip()}, cursor, limit)
+        attachments = report_attachments_by_id(db, [row["id"] for row in page["rows"]])
+        return {
+            "q": q.strip(),
+            "total": page["total"],
+            "limit": limit,
+            "next_cursor": page["next_cursor"],
+            "items": [report_item(row, admin, attachments.get(row["id"], [])) for row in page["rows"]],
+        }
+
+    rows = db.execute(text(f"""
         SELECT id, title, description, category, reported_by, is_anonymous,
                status, admin_note,
                created_at AT TIME ZONE 'Asia/Seoul' as created_at,
                updated_at AT TIME ZONE 'Asia/Seoul' as updated_at,
                count(*) OVER() as _total
         FROM issue_reports
-        ORDER BY created_at DESC
+        WHERE {where}
+        ORDER BY issue_reports.created_at DESC
         LIMIT :limit OFFSET :offset
-    """), {"limit": limit, "offset": offset}).mappings().all()
+    """), {**params, "limit": limit, "offset": offset}).mappings().all()
     total = rows[0]["_total"] if rows else 0
-    items = []
-    for row in rows:
-        item = {
-            "id": row["id"],
-            "title": row["title"],
-            "description": row["description"],
-            "category": row["category"],
-            "reported_by": "Anonymous" if row["is_anonymous"] else (row["reported_by"] or "Unknown"),
-            "is_anonymous": row["is_anonymous"],
-            "status": row["status"],
-            "admin_note": row["admin_note"],
-            "created_at": str(row["created_at"]),
-            "updated_at": str(row["updated_at"]),
-        }
-        # Admin can see real author even for anonymous reports
-        if is_admin and row["is_anonymous"]:
-            item["actual_reported_by"] = row["reported_by"]
-        items.append(item)
+    attachments = report_attachments_by_id(db, [row["id"] for row in rows])
     return {
         "total": total,
         "offset": offset,
         "limit": limit,
-        "items": items,
+        "items": [report_item(row, admin, attachments.get(row["id"], [])) for row in rows],
     }
 
 
-@v1.post("/reports", status_code=201)
+@v1.get("/reports/status-counts")
+def get_report_status_counts(
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user),
+):
+    """Report totals per status, read from the trigger-maintained counter table."""
+    rows = db.execute(text("SELECT status, count FROM issue_report_status_counts")).mappings().all()
+    counts = {s: 0 for s in VALID_REPORT_STATUSES}
+    counts.update({row["status"]: row["count"] for row in rows})
+    return counts
+
+
+@v1.post("/reports", status_code=201, dependencies=[Depends(rate_limit("create_report"))])
 def create_report(
     body: ReportCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=255),
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user),
 ):
@@ -928,8 +1711,17 @@ def create_report(
         raise HTTPException(status_code=400, detail="Title cannot be empty")
     if not body.description.strip():
         raise HTTPException(status_code=400, detail="Description cannot be empty")
+    if len(body.description) > REPORT_DESCRIPTION_MAX_LENGTH:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Description is limited to {REPORT_DESCRIPTION_MAX_LENGTH} characters; attach logs or screenshots as files",
+        )
     if body.category not in VALID_REPORT_CATEGORIES:
         raise HTTPException(status_code=400, detail=f"Category must be one of: {', '.join(VALID_REPORT_CATEGORIES)}")
+    req_hash = idempotency.request_hash(body)
+    replayed = idempotency.replay(db, current_user, idempotency_key, "create_report", req_hash)
+    if replayed:
+        return replayed
     try:
         result = db.execute(
             text("""INSERT INTO issue_reports (title, description, category, reported_by, is_anonymous)
@@ -947,8 +1739,7 @@ def create_report(
             },
         )
         row = result.mappings().first()
-        db.commit()
-        return {
+        item = {
             "id": row["id"],
             "title": row["title"],
             "description": row["description"],
@@ -959,21 +1750,29 @@ def create_report(
             "admin_note": row["admin_note"],
             "created_at": str(row["created_at"]),
             "updated_at": str(row["updated_at"]),
+            "attachments": [],
         }
+        idempotency.store(db, current_user, idempotency_key, "create_report", req_hash, 201, item)
+        db.commit()
+        invalidate_cache("reports")
+        return item
     except Exception as e:
         db.rollback()
+        replayed = idempotency.replay(db, current_user, idempotency_key, "create_report", req_hash)
+        if replayed:
+            return replayed
         logger.exception("Failed to create report")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@v1.patch("/reports/{report_id}/status")
+@v1.patch("/reports/{report_id}/status", dependencies=[Depends(rate_limit("update_report_status"))])
 def update_report_status(
     report_id: int,
     body: ReportStatusUpdate,
     db: Session = Depends(get_db),
     current_user: str = Depends(get_current_user),
 ):
-    if current_user not in ADMIN_USERS:
+    if not is_admin(current_user):
         raise HTTPException(status_code=403, detail="Only admins can change report status")
     if body.status not in VALID_REPORT_STATUSES:
         raise HTTPException(status_code=400, detail=f"Status must be one of: {', '.join(VALID_REPORT_STATUSES)}")
@@ -991,10 +1790,11 @@ def update_report_status(
         {"id": report_id, "status": body.status, "note": body.admin_note, "user": current_user},
     )
     db.commit()
+    invalidate_cache("reports")
     return {"ok": True}
 
 
-@v1.delete("/reports/{report_id}")
+@v1.delete("/reports/{report_id}", dependencies=[Depends(rate_limit("delete_report"))])
 def delete_report(
     report_id: int,
     db: Session = Depends(get_db),
@@ -1006,10 +1806,145 @@ def delete_report(
     ).mappings().first()
     if not row:
         raise HTTPException(status_code=404, detail="Report not found")
-    if row["reported_by"] != current_user and current_user not in ADMIN_USERS:
+    if row["reported_by"] != current_user and not is_admin(current_user):
         raise HTTPException(status_code=403, detail="You can only delete your own reports")
     db.execute(text("DELETE FROM issue_reports WHERE id = :id"), {"id": report_id})
     db.commit()
+    # Attachment rows went with the report (ON DELETE CASCADE); their files go now
+    report_attachments.remove_report(report_id)
+    invalidate_cache("reports")
+    return {"ok": True}
+
+
+def attachable_report(db: Session, report_id: int, current_user: str):
+    """404 unless the report exists, 403 unless the caller filed it or is an admin."""
+    row = db.execute(text("""
+        SELECT r.reported_by, (SELECT count(*) FROM issue_report_attachments a WHERE a.report_id = r.id) as attachments
+        FROM issue_reports r WHERE r.id = :id
+    """), {"id": report_id}).mappings().first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Report not found")
+    if row["reported_by"] != current_user and not is_admin(current_user):
+        raise HTTPException(status_code=403, detail="You can only change attachments of your own reports")
+    return row
+
+
+def check_attachable(report_id: int, current_user: str):
+    """attachable_report in a session of its own, closed before the upload is read."""
+    if report_attachments.storage_problem():
+        raise report_attachments.storage_unavailable()
+    with new_session() as db:
+        if attachable_report(db, report_id, current_user)["attachments"] >= report_attachments.REPORT_ATTACHMENTS_PER_REPORT:
+            raise report_attachments.too_many()
+
+
+def insert_attachment(report_id: int, params: dict):
+    """Record a stored file; None when the report is gone, 400 when it is already full.
+
+    The report row is locked first so concurrent uploads count each other's
+    rows, and the limit is checked by the INSERT itself.
+    """
+    with new_session() as db:
+        if db.execute(text("SELECT 1 FROM issue_reports WHERE id = :id FOR UPDATE"), {"id": report_id}).scalar() is None:
+            return None
+        row = db.execute(text("""
+            INSERT INTO issue_report_attachments
+                (report_id, filename, content_type, size_bytes, sha256, storage_key, uploaded_by)
+            SELECT :report_id, :filename, :content_type, :size_bytes, :sha256, :storage_key, :user
+            WHERE (SELECT count(*) FROM issue_report_attachments WHERE report_id = :report_id) < :max_attachments
+            RETURNING id, filename, content_type, size_bytes, created_at AT TIME ZONE 'Asia/Seoul' as created_at
+        """), {
+            **params, "report_id": report_id, "max_attachments": report_attachments.REPORT_ATTACHMENTS_PER_REPORT,
+        }).mappings().first()
+        if row is None:
+            raise report_attachments.too_many()
+        db.commit()
+        return row
+
+
+@v1.post(
+    "/reports/{report_id}/attachments", status_code=201,
+    dependencies=[Depends(rate_limit("upload_report_attachment"))],
+)
+async def upload_report_attachment(
+    report_id: int,
+    request: Request,
+    filename: str = Query(..., min_length=1, max_length=255),
+    current_user: str = Depends(get_current_user),
+):
+    """Attach a file to a report. The request body is the raw file (not multipart),
+    typed by Content-Type; it is streamed to the attachment store, never buffered whole.
+
+    No database connection is held while the body streams in: the checks and
+    the insert each use a short session of their own.
+    """
+    await run_in_threadpool(check_attachable, report_id, current_user)
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > report_attachments.REPORT_ATTACHMENT_MAX_BYTES:
+        raise report_attachments.too_large()
+    name = report_attachments.clean_filename(filename)
+    content_type = report_attachments.clean_content_type(request.headers.get("content-type", ""))
+
+    storage_key, size, sha256 = await report_attachments.store(report_id, request.stream())
+    try:
+        row = await run_in_threadpool(insert_attachment, report_id, {
+            "filename": name,
+            "content_type": content_type,
+            "size_bytes": size,
+            "sha256": sha256,
+            "storage_key": storage_key,
+            "user": current_user,
+        })
+    except Exception:
+        await run_in_threadpool(report_attachments.remove, [storage_key])
+        raise
+    if row is None:
+        # The report was deleted while the file was uploading
+        await run_in_threadpool(report_attachments.remove, [storage_key])
+        raise HTTPException(status_code=404, detail="Report not found")
+    invalidate_cache("reports")
+    return attachment_item(row)
+
+
+@v1.get("/reports/{report_id}/attachments/{attachment_id}")
+def download_report_attachment(
+    report_id: int,
+    attachment_id: int,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user),
+):
+    """The file itself; behind nginx the bytes are sent by nginx via X-Accel-Redirect."""
+    row = db.execute(text("""
+        SELECT filename, content_type, storage_key
+        FROM issue_report_attachments
+        WHERE id = :id AND report_id = :report_id
+    """), {"id": attachment_id, "report_id": report_id}).mappings().first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return report_attachments.download_response(row["storage_key"], row["filename"], row["content_type"])
+
+
+@v1.delete(
+    "/reports/{report_id}/attachments/{attachment_id}",
+    dependencies=[Depends(rate_limit("delete_report_attachment"))],
+)
+def delete_report_attachment(
+    report_id: int,
+    attachment_id: int,
+    db: Session = Depends(get_db),
+    current_user: str = Depends(get_current_user),
+):
+    attachable_report(db, report_id, current_user)
+    storage_key = db.execute(text("""
+        DELETE FROM issue_report_attachments
+        WHERE id = :id AND report_id = :report_id
+        RETURNING storage_key
+    """), {"id": attachment_id, "report_id": report_id}).scalar()
+    if storage_key is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    db.commit()
+    report_attachments.remove([storage_key])
+    invalidate_cache("reports")
     return {"ok": True}
 
 
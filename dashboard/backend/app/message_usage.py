@@ -0,0 +1,62 @@
+"""Per-message token usage and latency extracted from chat JSON.
+
+Open WebUI keeps `usage` on each assistant message (OpenAI-style
+prompt_tokens/completion_tokens, or Ollama's prompt_eval_count/eval_count and
+total_duration in ns).  Updated chats are re-extracted (see app.incremental)
+into chat_message_usage, a narrow typed table the token and latency endpoints
+aggregate over.  Each row keeps the message's epoch, so those endpoints can
+bucket by any zone's days.
+"""
+import os
+
+from app.background import MESSAGE_USAGE_LOCK_KEY, run_periodically
+from app.incremental import Extractor, run
+
+MESSAGE_USAGE_INTERVAL = int(os.getenv("MESSAGE_USAGE_INTERVAL", "300"))
+
+
+_EXTRACT = """
+    INSERT INTO chat_message_usage
+        (chat_id, message_id, model_id, user_id, created_at, prompt_tokens, completion_tokens, latency_ms)
+    SELECT chat_id, message_id, model_id, user_id, created_at, prompt_tokens, completion_tokens, latency_ms
+    FROM (
+        SELECT
+            c.id as chat_id,
+            coalesce(msg->>'id', ord::text) as message_id,
+            coalesce(msg->>'model', c.chat->'models'->>0) as model_id,
+            c.user_id,
+            coalesce((msg->>'timestamp')::numeric, c.created_at)::bigint as created_at,
+            coalesce(msg->'usage'->>'prompt_tokens', msg->'usage'->>'prompt_eval_count')::numeric::int as prompt_tokens,
+            coalesce(msg->'usage'->>'completion_tokens', msg->'usage'->>'eval_count')::numeric::int as completion_tokens,
+            coalesce(
+                (msg->'usage'->>'total_duration')::numeric / 1000000,
+                ((msg->>'timestamp')::numeric - (lag(msg) OVER w->>'timestamp')::numeric) * 1000
+            )::int as latency_ms,
+            msg->>'role' as role,
+            msg->'usage' as usage
+        FROM chat c, json_array_elements(c.chat->'messages') WITH ORDINALITY AS m(msg, ord)
+        WHERE c.id = ANY(:ids)
+        WINDOW w AS (PARTITION BY c.id ORDER BY ord)
+    ) x
+    WHERE role = 'assistant' AND usage IS NOT NULL AND model_id IS NOT NULL
+    ON CONFLICT (chat_id, message_id) DO NOTHING
+"""
+
+
+EXTRACTOR = Extractor(
+    name="message_usage",
+    lock_key=MESSAGE_USAGE_LOCK_KEY,
+    source="chat",
+    target="chat_message_usage",
+    source_id="chat_id",
+    extract=_EXTRACT,
+)
+
+
+def extract_message_usage(engine) -> int:
+    """Re-extract chats updated since the watermark. Returns the number of chats processed."""
+    return run(engine, EXTRACTOR)
+
+
+def start_message_usage_extractor(engine):
+    run_periodically("message-usage", MESSAGE_USAGE_INTERVAL, lambda: extract_message_usage(engine))
@@ -0,0 +1,448 @@
+"""Versioned schema migrations for the dashboard's own tables.
+
+Applied versions are recorded in schema_migrations.  On startup each worker
+reads the current version and returns immediately if nothing is pending;
+otherwise it takes MIGRATION_LOCK_KEY, re-checks, and applies what is left, so
+workers starting together migrate once.  A migration runs in one transaction
+unless `transactional=False`, which runs each statement in autocommit (needed
+for CREATE INDEX CONCURRENTLY).  A failed concurrent build leaves an INVALID
+index behind; drop it before restarting or IF NOT EXISTS will skip it.
+
+The early migrations use IF NOT EXISTS so databases created by the old
+create_tables hook are adopted as-is.  Append new migrations; never edit one
+that has shipped.
+"""
+import logging
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import text
+
+from app.background import MIGRATION_LOCK_KEY
+
+logger = logging.getLogger("dashboard.migrations")
+
+MIGRATION_LOCK_POLL = 0.5
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    statements: tuple[str, ...]
+    transactional: bool = True
+
+
+MIGRATIONS = [
+    Migration(1, "packages, audit log and issue reports", (
+        """
+        CREATE TABLE IF NOT EXISTS python_packages (
+            id SERIAL PRIMARY KEY,
+            package_name VARCHAR(255) NOT NULL UNIQUE,
+            added_by VARCHAR(255) NOT NULL,
+            added_at TIMESTAMPTZ DEFAULT NOW(),
+            status VARCHAR(20) DEFAULT 'pending',
+            status_note TEXT,
+            status_updated_by VARCHAR(255),
+            status_updated_at TIMESTAMPTZ
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS package_audit_log (
+            id SERIAL PRIMARY KEY,
+            package_id INTEGER,
+            package_name VARCHAR(255) NOT NULL,
+            action VARCHAR(50) NOT NULL,
+            performed_by VARCHAR(255) NOT NULL,
+            detail TEXT,
+            created_at TIMESTAMPTZ DEFAULT NOW()
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS issue_reports (
+            id SERIAL PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            description TEXT NOT NULL,
+            category VARCHAR(50) DEFAULT 'bug',
+            reported_by VARCHAR(255),
+            is_anonymous BOOLEAN DEFAULT false,
+            status VARCHAR(20) DEFAULT 'open',
+            admin_note TEXT,
+            status_updated_by VARCHAR(255),
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        )
+        """,
+    )),
+    Migration(2, "package install tracking", (
+        "ALTER TABLE python_packages ADD COLUMN IF NOT EXISTS install_attempted_at TIMESTAMPTZ",
+    )),
+    Migration(3, "full-text search columns", (
+        """
+        ALTER TABLE package_audit_log ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce(package_name, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(detail, '')), 'B')
+            ) STORED
+        """,
+        """
+        ALTER TABLE issue_reports ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('simple', coalesce(description, '')), 'B') ||
+                setweight(to_tsvector('simple', coalesce(admin_note, '')), 'C')
+            ) STORED
+        """,
+    )),
+    Migration(4, "audit log and report indexes", (
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_package_audit_log_created ON package_audit_log (created_at DESC)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_package_audit_log_search ON package_audit_log USING GIN (search_vector)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_issue_reports_search ON issue_reports USING GIN (search_vector)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_issue_reports_status_created ON issue_reports (status, created_at DESC)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_issue_reports_category_created ON issue_reports (category, created_at DESC)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_issue_reports_reported_by_created ON issue_reports (reported_by, created_at DESC)",
+    ), transactional=False),
+    # Per-status report counts, kept current by trigger so the admin
+    # summary never scans issue_reports.
+    Migration(5, "report status counters", (
+        """
+        CREATE TABLE IF NOT EXISTS issue_report_status_counts (
+            status VARCHAR(20) PRIMARY KEY,
+            count INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        CREATE OR REPLACE FUNCTION issue_reports_count_status() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND OLD.status IS NOT DISTINCT FROM NEW.status THEN
+                RETURN NULL;
+            END IF;
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE issue_report_status_counts SET count = count - 1 WHERE status = OLD.status;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO issue_report_status_counts (status, count) VALUES (NEW.status, 1)
+                ON CONFLICT (status) DO UPDATE SET count = issue_report_status_counts.count + 1;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE TRIGGER trg_issue_reports_count_status
+            AFTER INSERT OR DELETE OR UPDATE OF status ON issue_reports
+            FOR EACH ROW EXECUTE FUNCTION issue_reports_count_status()
+        """,
+    )),
+    Migration(6, "rate limit buckets and idempotency keys", (
+        """
+        CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+            key VARCHAR(255) PRIMARY KEY,
+            tokens DOUBLE PRECISION NOT NULL,
+            updated_at TIMESTAMPTZ NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            username VARCHAR(255) NOT NULL,
+            key VARCHAR(255) NOT NULL,
+            route VARCHAR(100) NOT NULL,
+            request_hash CHAR(64) NOT NULL,
+            status_code INTEGER NOT NULL,
+            response JSONB NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            PRIMARY KEY (username, key)
+        )
+        """,
+    )),
+    Migration(7, "daily stats rollups", (
+        """
+        CREATE TABLE IF NOT EXISTS stats_model_user_daily (
+            model_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            day DATE NOT NULL,
+            chat_count INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            PRIMARY KEY (model_id, day, user_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_stats_model_user_daily_user ON stats_model_user_daily (user_id, day)",
+        """
+        CREATE TABLE IF NOT EXISTS stats_user_daily (
+            user_id TEXT NOT NULL,
+            day DATE NOT NULL,
+            chat_count INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_stats_user_daily_day ON stats_user_daily (day)",
+        """
+        CREATE TABLE IF NOT EXISTS stats_feedback_daily (
+            model_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            day DATE NOT NULL,
+            positive INTEGER NOT NULL,
+            negative INTEGER NOT NULL,
+            PRIMARY KEY (model_id, day, user_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_stats_feedback_daily_user ON stats_feedback_daily (user_id, day)",
+        """
+        CREATE TABLE IF NOT EXISTS stats_rollup_state (
+            name VARCHAR(50) PRIMARY KEY,
+            watermark BIGINT NOT NULL,
+            rebuilt_at TIMESTAMPTZ NOT NULL
+        )
+        """,
+    )),
+    Migration(8, "chat message usage", (
+        """
+        CREATE TABLE IF NOT EXISTS chat_message_usage (
+            chat_id TEXT NOT NULL,
+            message_id TEXT NOT NULL,
+            model_id TEXT NOT NULL,
+            user_id TEXT,
+            day DATE NOT NULL,
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            latency_ms INTEGER,
+            PRIMARY KEY (chat_id, message_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_chat_message_usage_day_model ON chat_message_usage (day, model_id)",
+    )),
+    Migration(9, "feedback ratings", (
+        """
+        CREATE TABLE IF NOT EXISTS feedback_ratings (
+            id TEXT PRIMARY KEY,
+            model_id TEXT NOT NULL,
+            user_id TEXT,
+            chat_id TEXT,
+            rating SMALLINT NOT NULL,
+            reason TEXT,
+            comment TEXT,
+            day DATE NOT NULL,
+            created_at BIGINT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_feedback_ratings_day_model ON feedback_ratings (day, model_id)",
+        """
+        CREATE INDEX IF NOT EXISTS idx_feedback_ratings_negative_comments
+            ON feedback_ratings (created_at DESC, id DESC)
+            WHERE rating < 0 AND comment IS NOT NULL
+        """,
+    )),
+    Migration(10, "chat model junction", (
+        """
+        CREATE TABLE IF NOT EXISTS chat_model (
+            chat_id TEXT NOT NULL,
+            model_id TEXT NOT NULL,
+            created_at BIGINT NOT NULL,
+            day DATE NOT NULL,
+            PRIMARY KEY (chat_id, model_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_chat_model_day_model ON chat_model (day, model_id)",
+        "CREATE INDEX IF NOT EXISTS idx_chat_model_model ON chat_model (model_id)",
+    )),
+    # Per-resource write generations, bumped by trigger so list caches and
+    # ETags change with every write, whoever makes it.
+    Migration(11, "cache generations", (
+        """
+        CREATE TABLE IF NOT EXISTS cache_generations (
+            resource VARCHAR(50) PRIMARY KEY,
+            generation BIGINT NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        INSERT INTO cache_generations (resource) VALUES ('packages'), ('audit_log'), ('reports')
+        ON CONFLICT (resource) DO NOTHING
+        """,
+        """
+        CREATE OR REPLACE FUNCTION bump_cache_generation() RETURNS trigger AS $$
+        BEGIN
+            UPDATE cache_generations SET generation = generation + 1 WHERE resource = TG_ARGV[0];
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        """
+        CREATE OR REPLACE TRIGGER trg_python_packages_generation
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON python_packages
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_cache_generation('packages')
+        """,
+        """
+        CREATE OR REPLACE TRIGGER trg_package_audit_log_generation
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON package_audit_log
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_cache_generation('audit_log')
+        """,
+        """
+        CREATE OR REPLACE TRIGGER trg_issue_reports_generation
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON issue_reports
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_cache_generation('reports')
+        """,
+    )),
+    Migration(12, "ranking leaderboards", (
+        """
+        CREATE TABLE IF NOT EXISTS stats_leaderboards (
+            ranking VARCHAR(50) PRIMARY KEY,
+            total INTEGER NOT NULL,
+            items JSON NOT NULL,
+            built_at TIMESTAMPTZ NOT NULL
+        )
+        """,
+    )),
+    Migration(13, "hourly stats rollups", (
+        """
+        CREATE TABLE IF NOT EXISTS stats_model_user_hourly (
+            model_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            hour TIMESTAMPTZ NOT NULL,
+            chat_count INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            PRIMARY KEY (model_id, hour, user_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_stats_model_user_hourly_hour ON stats_model_user_hourly (hour)",
+        "CREATE INDEX IF NOT EXISTS idx_stats_model_user_hourly_user ON stats_model_user_hourly (user_id, hour)",
+        """
+        CREATE TABLE IF NOT EXISTS stats_user_hourly (
+            user_id TEXT NOT NULL,
+            hour TIMESTAMPTZ NOT NULL,
+            chat_count INTEGER NOT NULL,
+            message_count INTEGER NOT NULL,
+            PRIMARY KEY (user_id, hour)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_stats_user_hourly_hour ON stats_user_hourly (hour)",
+        """
+        CREATE TABLE IF NOT EXISTS stats_feedback_hourly (
+            model_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            hour TIMESTAMPTZ NOT NULL,
+            positive INTEGER NOT NULL,
+            negative INTEGER NOT NULL,
+            PRIMARY KEY (model_id, hour, user_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_stats_feedback_hourly_hour ON stats_feedback_hourly (hour)",
+        "CREATE INDEX IF NOT EXISTS idx_stats_feedback_hourly_user ON stats_feedback_hourly (user_id, hour)",
+    )),
+    Migration(14, "report attachments", (
+        """
+        CREATE TABLE IF NOT EXISTS issue_report_attachments (
+            id SERIAL PRIMARY KEY,
+            report_id INTEGER NOT NULL REFERENCES issue_reports(id) ON DELETE CASCADE,
+            filename VARCHAR(255) NOT NULL,
+            content_type VARCHAR(255) NOT NULL,
+            size_bytes BIGINT NOT NULL,
+            sha256 CHAR(64) NOT NULL,
+            storage_key VARCHAR(100) NOT NULL UNIQUE,
+            uploaded_by VARCHAR(255),
+            created_at TIMESTAMPTZ DEFAULT NOW()
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_issue_report_attachments_report ON issue_report_attachments (report_id, id)",
+        # Attachment metadata is part of every report page
+        """
+        CREATE OR REPLACE TRIGGER trg_issue_report_attachments_generation
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON issue_report_attachments
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_cache_generation('reports')
+        """,
+    )),
+    # Backfill the counters for reports that predate their trigger. Runs
+    # once; afterwards the trigger keeps them exact.
+    Migration(15, "resync report status counters", (
+        "LOCK TABLE issue_reports IN SHARE MODE",
+        """
+        INSERT INTO issue_report_status_counts (status, count)
+        SELECT s.status, count(r.id)
+        FROM (SELECT status FROM issue_reports UNION SELECT status FROM issue_report_status_counts) s
+        LEFT JOIN issue_reports r ON r.status = s.status
+        WHERE s.status IS NOT NULL
+        GROUP BY s.status
+        ON CONFLICT (status) DO UPDATE SET count = EXCLUDED.count
+        """,
+    )),
+    # Daily feedback and the KST day columns were superseded by the hourly
+    # rollups the tz-aware endpoints read.
+    Migration(16, "drop unread daily feedback rollup and day columns", (
+        "DROP TABLE IF EXISTS stats_feedback_daily",
+        "DELETE FROM stats_rollup_state WHERE name = 'feedback_daily'",
+        "DROP INDEX IF EXISTS idx_chat_model_day_model",
+        "ALTER TABLE chat_model DROP COLUMN IF EXISTS day",
+        "DROP INDEX IF EXISTS idx_feedback_ratings_day_model",
+        "ALTER TABLE feedback_ratings DROP COLUMN IF EXISTS day",
+    )),
+    # Message usage keeps the message's epoch instead of its KST day, so token
+    # and latency endpoints take a `tz`.  The table is refilled by the
+    # extractor's next passes; engagement reads the hourly user rollup.
+    Migration(17, "message usage timestamps, drop daily user rollup", (
+        "TRUNCATE chat_message_usage",
+        "DELETE FROM stats_rollup_state WHERE name IN ('message_usage', 'user_daily')",
+        "DROP INDEX IF EXISTS idx_chat_message_usage_day_model",
+        "ALTER TABLE chat_message_usage DROP COLUMN IF EXISTS day",
+        "ALTER TABLE chat_message_usage ADD COLUMN created_at BIGINT NOT NULL",
+        "CREATE INDEX IF NOT EXISTS idx_chat_message_usage_created ON chat_message_usage (created_at, model_id)",
+        "DROP TABLE IF EXISTS stats_user_daily",
+    )),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def _has_migrations_table(conn) -> bool:
+    return conn.execute(text("SELECT to_regclass('schema_migrations') IS NOT NULL")).scalar()
+
+
+def _version(conn) -> int:
+    return conn.execute(text("SELECT coalesce(max(version), 0) FROM schema_migrations")).scalar()
+
+
+def _apply(engine, migration: Migration):
+    started = time.monotonic()
+    if migration.transactional:
+        with engine.begin() as conn:
+            for statement in migration.statements:
+                conn.execute(text(statement))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+                {"v": migration.version, "n": migration.name},
+            )
+    else:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for statement in migration.statements:
+                conn.execute(text(statement))
+            conn.execute(
+                text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"),
+                {"v": migration.version, "n": migration.name},
+            )
+    logger.info("Applied migration %d (%s) in %.2fs", migration.version, migration.name, time.monotonic() - started)
+
+
+def run_migrations(engine) -> int:
+    """Apply pending migrations. Returns the number applied (0 if the schema was current)."""
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if _has_migrations_table(conn) and _version(conn) >= LATEST_VERSION:
+            return 0
+
+        # Poll rather than block in pg_advisory_lock: a waiting backend holds a
+        # snapshot, and CREATE INDEX CONCURRENTLY would wait on it forever.
+        while not conn.execute(text("SELECT pg_try_advisory_lock(:k)"), {"k": MIGRATION_LOCK_KEY}).scalar():
+            time.sleep(MIGRATION_LOCK_POLL)
+        try:
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ DEFAULT NOW()
+                )
+            """))
+            current = _version(conn)
+            pending = [m for m in MIGRATIONS if m.version > current]
+            for migration in pending:
+                _apply(engine, migration)
+            return len(pending)
+        finally:
+            conn.execute(text("SELECT pg_advisory_unlock(:k)"), {"k": MIGRATION_LOCK_KEY})
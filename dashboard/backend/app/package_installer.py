@@ -0,0 +1,340 @@
+"""Background worker that installs approved python_packages rows.
+
+Rows an admin marks ``installed`` are resolved together with every other
+approved row, built into a local wheelhouse (offline first; the index is only
+contacted when wheels are missing), and installed with ``--no-index`` into a
+fresh ``--target`` directory.
+INSTALL_TARGET is then switched to it with an atomic symlink swap, so
+Open WebUI, which appends INSTALL_TARGET to its sys.path via a .pth file in
+its image, never sees a half-built set.  Rows marked ``uninstalled`` simply
+drop out of the next build.
+
+The backend image must run the same Python minor version and C library as
+Open WebUI's, since compiled wheels are built here and imported there.
+Timing and outcome are written back to ``status_note``; a row whose install
+fails keeps its status and is left out of later builds until an admin
+changes it again.  A failed rebuild of an unchanged set (e.g. one that only
+drops removed rows) is noted on the rows waiting for removal and retried with
+exponential backoff up to MAX_REBUILD_BACKOFF.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import suppress
+
+from sqlalchemy import text
+
+from app.background import INSTALL_LOCK_KEY, advisory_lock, run_periodically
+from app.cache import invalidate
+
+logger = logging.getLogger("dashboard.installer")
+
+INSTALL_ENABLED = os.getenv("PACKAGE_INSTALL", "false").lower() == "true"
+INSTALL_ROOT = os.getenv("PACKAGE_INSTALL_ROOT", "/opt/dashboard-packages")
+# Symlink to the current build under BUILDS_DIR; Open WebUI's .pth file points here
+INSTALL_TARGET = os.path.join(INSTALL_ROOT, "site-packages")
+BUILDS_DIR = os.path.join(INSTALL_ROOT, "builds")
+WHEELHOUSE_DIR = os.path.join(INSTALL_ROOT, "wheelhouse")
+INSTALL_INTERVAL = int(os.getenv("PACKAGE_INSTALL_INTERVAL", "60"))
+INSTALL_TIMEOUT = int(os.getenv("PACKAGE_INSTALL_TIMEOUT", "900"))
+# Optional offline mirror (devpi, simple index on disk) used by the resolve preview
+RESOLVE_INDEX_URL = os.getenv("PACKAGE_INDEX_URL", "")
+# Budget for all resolves of one preview request; stays under the dashboard
+# nginx's 60s proxy_read_timeout so the client gets an answer, not a 504
+RESOLVE_TIMEOUT = int(os.getenv("PACKAGE_RESOLVE_TIMEOUT", "45"))
+# New releases on the index don't touch the wheelhouse, so results also expire
+RESOLVE_CACHE_TTL = 600
+
+WORKER_USER = "install-worker"
+SET_MARKER = ".dashboard-requirements.sha256"
+# status_note prefix of rows whose last install failed; they stay out of the set
+FAILED_NOTE = "Install failed"
+MAX_REBUILD_BACKOFF = 3600
+
+# Set hash of the last failed rebuild with nothing new in it, and when to retry it
+_rebuild_backoff = {"set": "", "delay": 0, "retry_at": 0.0}
+
+
+def _run(cmd: list[str]) -> tuple[bool, str]:
+    try:
+        proc = subprocess.run(cmd, capture_output=True, text=True, timeout=INSTALL_TIMEOUT)
+    except subprocess.TimeoutExpired:
+        return False, f"timed out after {INSTALL_TIMEOUT}s"
+    output = (proc.stderr or proc.stdout or "").strip()
+    return proc.returncode == 0, output[-500:]
+
+
+def _set_hash(specs: list[str]) -> str:
+    return hashlib.sha256("\n".join(sorted(specs)).encode()).hexdigest()
+
+
+def _read_marker() -> str:
+    try:
+        with open(os.path.join(INSTALL_TARGET, SET_MARKER)) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _activate(build_dir: str):
+    """Point INSTALL_TARGET at `build_dir` atomically and delete the builds it replaces."""
+    link = INSTALL_TARGET + ".new"
+    with suppress(FileNotFoundError):
+        os.unlink(link)
+    os.symlink(build_dir, link)
+    os.replace(link, INSTALL_TARGET)
+    for name in os.listdir(BUILDS_DIR):
+        path = os.path.join(BUILDS_DIR, name)
+        if path != build_dir:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def install_set(specs: list[str]) -> tuple[bool, str, float]:
+    """Resolve, cache and install ``specs`` as one set, then make it the active
+    build. Returns (ok, detail, seconds); on failure the active build is untouched."""
+    started = time.monotonic()
+    os.makedirs(WHEELHOUSE_DIR, exist_ok=True)
+    os.makedirs(BUILDS_DIR, exist_ok=True)
+    build_dir = tempfile.mkdtemp(prefix="set-", dir=BUILDS_DIR)
+    wheel_secs = 0.0
+    if specs:
+        wheel = [
+            sys.executable, "-m", "pip", "wheel", "--quiet",
+            "--wheel-dir", WHEELHOUSE_DIR, "--find-links", WHEELHOUSE_DIR,
+        ]
+        ok, out = _run([*wheel, "--no-index", *specs])
+        if not ok:
+            # Some wheels are missing: only those are downloaded or built
+            ok, out = _run([*wheel, *specs])
+        wheel_secs = time.monotonic() - started
+        if ok:
+            ok, out = _run([
+                sys.executable, "-m", "pip", "install", "--quiet", "--disable-pip-version-check",
+                "--no-index", "--find-links", WHEELHOUSE_DIR, "--target", build_dir, *specs,
+            ])
+            out = out if ok else f"install failed: {out}"
+        else:
+            out = f"resolve failed: {out}"
+        if not ok:
+            shutil.rmtree(build_dir, ignore_errors=True)
+            return False, out, time.monotonic() - started
+    with open(os.path.join(build_dir, SET_MARKER), "w") as f:
+        f.write(_set_hash(specs))
+    os.chmod(build_dir, 0o755)
+    _activate(build_dir)
+    total = time.monotonic() - started
+    return True, f"resolve {wheel_secs:.1f}s, install {total - wheel_secs:.1f}s", total
+
+
+def _wheelhouse_fingerprint() -> str:
+    """Changes whenever wheels are added to or removed from the wheelhouse."""
+    try:
+        return str(os.stat(WHEELHOUSE_DIR).st_mtime_ns)
+    except OSError:
+        return ""
+
+
+_RESOLVE_CACHE_SIZE = 256
+# (specs, wheelhouse fingerprint, index URL) -> (monotonic expiry, result)
+_resolve_cache: "OrderedDict[tuple, tuple[float, dict]]" = OrderedDict()
+_resolve_cache_lock = threading.Lock()
+
+
+def _resolve(specs: tuple[str, ...], timeout: float) -> dict:
+    index_args = ["--index-url", RESOLVE_INDEX_URL] if RESOLVE_INDEX_URL else ["--no-index"]
+    python = sys.executable
+    with tempfile.NamedTemporaryFile(suffix=".json") as report:
+        cmd = [
+            python, "-m", "pip", "install", "--dry-run", "--ignore-installed",
+            "--disable-pip-version-check", "--report", report.name,
+            *index_args, "--find-links", WHEELHOUSE_DIR, *specs,
+        ]
+        try:
+            proc = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return {
+                "ok": False, "pins": {}, "conflicts": [f"Resolver timed out after {timeout:.0f}s"], "unavailable": [],
+                "timed_out": True,
+            }
+        if proc.returncode != 0:
+            output = proc.stdout + "\n" + proc.stderr
+            return {"ok": False, "pins": {}, "conflicts": _conflict_lines(output), "unavailable": _unavailable(output)}
+        data = json.load(report)
+    pins = {i["metadata"]["name"].lower(): i["metadata"]["version"] for i in data.get("install", [])}
+    return {"ok": True, "pins": dict(sorted(pins.items())), "conflicts": [], "unavailable": []}
+
+
+def _resolve_cached(specs: tuple[str, ...], fingerprint: str, timeout: float) -> tuple[dict, bool]:
+    """LRU-cached _resolve; returns (result, cache_hit) for this call. Timeouts are not cached."""
+    key = (specs, fingerprint, RESOLVE_INDEX_URL)
+    with _resolve_cache_lock:
+        entry = _resolve_cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            _resolve_cache.move_to_end(key)
+            return entry[1], True
+    result = _resolve(specs, timeout)
+    if result.get("timed_out"):
+        return result, False
+    with _resolve_cache_lock:
+        _resolve_cache[key] = (time.monotonic() + RESOLVE_CACHE_TTL, result)
+        _resolve_cache.move_to_end(key)
+        while len(_resolve_cache) > _RESOLVE_CACHE_SIZE:
+            _resolve_cache.popitem(last=False)
+    return result, False
+
+
+_NO_DISTRIBUTION = "ERROR: No matching distribution found for "
+
+
+def _unavailable(output: str) -> list[str]:
+    """Requirements pip found no distribution for (not in the wheelhouse/mirror), as opposed to conflicts."""
+    return [line[len(_NO_DISTRIBUTION):].strip() for line in output.splitlines() if line.startswith(_NO_DISTRIBUTION)]
+
+
+def _conflict_lines(output: str) -> list[str]:
+    lines = []
+    in_cause = False
+    for line in output.splitlines():
+        if line.startswith(_NO_DISTRIBUTION) or line.startswith("ERROR: Could not find a version that satisfies"):
+            continue
+        if line.startswith("ERROR:") and "ResolutionImpossible" not in line:
+            lines.append(line[len("ERROR:"):].strip())
+        elif line.startswith("The conflict is caused by:"):
+            in_cause = True
+        elif in_cause and line.startswith("    "):
+            lines.append(line.strip())
+        else:
+            in_cause = False
+    return lines
+
+
+def resolve_preview(specs: list[str], timeout: float = RESOLVE_TIMEOUT) -> tuple[dict, bool]:
+    """Resolve ``specs`` as one set without installing, giving pip at most
+    ``timeout`` seconds. Returns (result, cache_hit).
+
+    ``result["unavailable"]`` lists requirements with no distribution in the
+    wheelhouse or mirror; pip stops at the first one, so it holds at most one.
+    ``result["timed_out"]`` is set when pip was stopped at the deadline.
+    """
+    return _resolve_cached(tuple(sorted(set(specs))), _wheelhouse_fingerprint(), timeout)
+
+
+def _mark_installed(conn, row, note: str, log_audit):
+    conn.execute(
+        text("""UPDATE python_packages
+                SET status_note = :note, install_attempted_at = NOW()
+                WHERE id = :id"""),
+        {"id": row["id"], "note": note},
+    )
+    log_audit(conn, row["id"], row["package_name"], "installed", WORKER_USER, note)
+
+
+def _mark_failed(conn, row, note: str, log_audit):
+    # The status stays as the admin set it; only the outcome is recorded
+    conn.execute(
+        text("""UPDATE python_packages
+                SET status_note = :note, install_attempted_at = NOW()
+                WHERE id = :id"""),
+        {"id": row["id"], "note": note},
+    )
+    log_audit(conn, row["id"], row["package_name"], "install_failed", WORKER_USER, note)
+
+
+def run_install_cycle(engine, log_audit):
+    """Process every approved or uninstalled row that changed since its last attempt."""
+    with advisory_lock(engine, INSTALL_LOCK_KEY) as conn:
+        if conn is not None:
+            _install_cycle(conn, log_audit)
+
+
+def _install_cycle(conn, log_audit):
+    rows = conn.execute(text("""
+        SELECT id, package_name, status,
+               install_attempted_at IS NULL OR install_attempted_at < status_updated_at AS changed,
+               coalesce(status_note, '') LIKE :failed AS failed
+        FROM python_packages
+        WHERE status IN ('installed', 'uninstalled')
+        ORDER BY id
+    """), {"failed": FAILED_NOTE + "%"}).mappings().all()
+    conn.commit()
+
+    removed = [r for r in rows if r["status"] == "uninstalled" and r["changed"]]
+    approved = [r for r in rows if r["status"] == "installed" and (r["changed"] or not r["failed"])]
+    new = [r for r in approved if r["changed"]]
+    specs = [r["package_name"] for r in approved]
+    if not new and not removed and _read_marker() == _set_hash(specs):
+        return
+    if not new and _rebuild_backoff["set"] == _set_hash(specs) and time.monotonic() < _rebuild_backoff["retry_at"]:
+        return
+
+    logger.info("Installing %d approved packages (%d new, %d removed)", len(specs), len(new), len(removed))
+    ok, detail, secs = install_set(specs)
+    if not ok and not new:
+        _rebuild_failed(conn, specs, removed, detail)
+        return
+    if ok:
+        for row in new:
+            _mark_installed(conn, row, f"Installed in {secs:.1f}s with {len(specs)} packages ({detail})", log_audit)
+    else:
+        # The combined set failed: add new rows one at a time on top of the
+        # previously installed set so only the offending requests are rejected.
+        baseline = [r["package_name"] for r in approved if not r["changed"]]
+        built = False
+        for row in new:
+            ok, detail, secs = install_set(baseline + [row["package_name"]])
+            if ok:
+                built = True
+                baseline.append(row["package_name"])
+                _mark_installed(conn, row, f"Installed in {secs:.1f}s with {len(baseline)} packages ({detail})", log_audit)
+            else:
+                _mark_failed(conn, row, f"{FAILED_NOTE} after {secs:.1f}s: {detail}", log_audit)
+            conn.commit()
+        if not built and removed:
+            ok, detail, _ = install_set(baseline)
+            if not ok:
+                _rebuild_failed(conn, baseline, removed, detail)
+                return
+    _rebuild_backoff.update(set="", delay=0, retry_at=0.0)
+    for row in removed:
+        conn.execute(
+            text("UPDATE python_packages SET status_note = :note, install_attempted_at = NOW() WHERE id = :id"),
+            {"id": row["id"], "note": "Removed from shared packages"},
+        )
+        log_audit(conn, row["id"], row["package_name"], "uninstalled", WORKER_USER, "Removed from shared packages")
+    conn.commit()
+    invalidate("packages")
+
+
+def _rebuild_failed(conn, specs: list[str], removed, detail: str):
+    """Note a failed rebuild on the rows waiting for removal and back off before
+    retrying the same set. Their install_attempted_at is left alone, so they are
+    still removed by the next build that succeeds."""
+    set_hash = _set_hash(specs)
+    if _rebuild_backoff["set"] == set_hash:
+        delay = min(_rebuild_backoff["delay"] * 2, MAX_REBUILD_BACKOFF)
+    else:
+        delay = INSTALL_INTERVAL
+    _rebuild_backoff.update(set=set_hash, delay=delay, retry_at=time.monotonic() + delay)
+    logger.error("Rebuild of approved package set failed, retrying in %ds: %s", delay, detail)
+    for row in removed:
+        conn.execute(
+            text("UPDATE python_packages SET status_note = :note WHERE id = :id"),
+            {"id": row["id"], "note": f"Removal pending: rebuild failed, retrying in {delay}s: {detail}"},
+        )
+    conn.commit()
+    invalidate("packages")
+
+
+def start_install_worker(engine, log_audit):
+    """Start the polling install thread if PACKAGE_INSTALL is set."""
+    if not INSTALL_ENABLED:
+        return
+    run_periodically("package-installer", INSTALL_INTERVAL, lambda: run_install_cycle(engine, log_audit))
@@ -0,0 +1,98 @@
+"""Token-bucket rate limiting for write endpoints, keyed by user and route.
+
+RATE_LIMIT_BACKEND=memory keeps buckets per process; =postgres shares them
+across workers and replicas through the rate_limit_buckets table.
+RATE_LIMIT_PER_MINUTE=0 turns limiting off.
+"""
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "30"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "10"))
+
+if RATE_LIMIT_PER_MINUTE < 0:
+    raise ValueError(f"RATE_LIMIT_PER_MINUTE must be >= 0 (0 disables limiting), got {RATE_LIMIT_PER_MINUTE}")
+if RATE_LIMIT_PER_MINUTE > 0 and RATE_LIMIT_BURST < 1:
+    raise ValueError(f"RATE_LIMIT_BURST must be >= 1, got {RATE_LIMIT_BURST}")
+
+_RATE = RATE_LIMIT_PER_MINUTE / 60.0
+
+
+def _take(tokens: float, elapsed: float) -> tuple[float, bool, float]:
+    """Refill by `elapsed` seconds and try to take one token.
+
+    Returns (remaining tokens, allowed, seconds until a token is available).
+    """
+    tokens = min(RATE_LIMIT_BURST, tokens + elapsed * _RATE)
+    if tokens >= 1:
+        return tokens - 1, True, 0.0
+    return tokens, False, (1 - tokens) / _RATE
+
+
+class MemoryRateLimiter:
+    def __init__(self):
+        self._buckets: dict[str, tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key: str, engine=None) -> tuple[bool, float]:
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (RATE_LIMIT_BURST, now))
+            tokens, allowed, retry_after = _take(tokens, now - last)
+            self._buckets[key] = (tokens, now)
+        return allowed, retry_after
+
+    def prune(self, engine=None):
+        # A bucket idle long enough to refill completely is equivalent to no bucket
+        full_after = RATE_LIMIT_BURST / _RATE
+        now = time.monotonic()
+        with self._lock:
+            for key in [k for k, (_, last) in self._buckets.items() if now - last > full_after]:
+                del self._buckets[key]
+
+
+class PostgresRateLimiter:
+    def hit(self, key: str, engine=None) -> tuple[bool, float]:
+        with engine.begin() as conn:
+            conn.execute(text("""
+                INSERT INTO rate_limit_buckets (key, tokens, updated_at)
+                VALUES (:key, :burst, clock_timestamp())
+                ON CONFLICT (key) DO NOTHING
+            """), {"key": key, "burst": RATE_LIMIT_BURST})
+            row = conn.execute(text("""
+                SELECT tokens, extract(epoch FROM clock_timestamp() - updated_at) AS elapsed
+                FROM rate_limit_buckets WHERE key = :key FOR UPDATE
+            """), {"key": key}).mappings().first()
+            tokens, allowed, retry_after = _take(row["tokens"], float(row["elapsed"]))
+            conn.execute(
+                text("UPDATE rate_limit_buckets SET tokens = :tokens, updated_at = clock_timestamp() WHERE key = :key"),
+                {"key": key, "tokens": tokens},
+            )
+        return allowed, retry_after
+
+    def prune(self, engine=None):
+        with engine.begin() as conn:
+            conn.execute(
+                text("DELETE FROM rate_limit_buckets WHERE updated_at < NOW() - make_interval(secs => :secs)"),
+                {"secs": RATE_LIMIT_BURST / _RATE},
+            )
+
+
+class DisabledRateLimiter:
+    def hit(self, key: str, engine=None) -> tuple[bool, float]:
+        return True, 0.0
+
+    def prune(self, engine=None):
+        pass
+
+
+if RATE_LIMIT_PER_MINUTE == 0:
+    limiter = DisabledRateLimiter()
+elif RATE_LIMIT_BACKEND == "postgres":
+    limiter = PostgresRateLimiter()
+else:
+    limiter = MemoryRateLimiter()
@@ -0,0 +1,156 @@
+"""Files attached to issue reports (logs, stack traces, screenshots).
+
+The bytes live under REPORT_ATTACHMENT_DIR, never in Postgres:
+issue_report_attachments only holds metadata, so report pages stay small
+however much gets attached.  Uploads are the raw request body, streamed in
+chunks to a temp file that is size-checked and hashed on the way and renamed
+into place once complete.  Downloads are handed to nginx with
+X-Accel-Redirect when REPORT_ATTACHMENT_ACCEL_PREFIX names an internal
+location aliased to the same directory; otherwise (local development) the API
+streams the file itself.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import uuid
+from contextlib import suppress
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+
+import anyio
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response
+
+logger = logging.getLogger("dashboard.report_attachments")
+
+REPORT_ATTACHMENT_DIR = os.getenv("REPORT_ATTACHMENT_DIR", "/data/report-attachments")
+# Matches client_max_body_size on the dashboard's nginx server
+REPORT_ATTACHMENT_MAX_BYTES = int(os.getenv("REPORT_ATTACHMENT_MAX_BYTES", str(10 * 1024 * 1024)))
+REPORT_ATTACHMENT_ACCEL_PREFIX = os.getenv("REPORT_ATTACHMENT_ACCEL_PREFIX", "/internal/report-attachments").rstrip("/")
+REPORT_ATTACHMENTS_PER_REPORT = 10
+
+_CONTENT_TYPE = re.compile(r"^[\w.+-]+/[\w.+-]+$")
+
+
+def too_large() -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Attachments are limited to {REPORT_ATTACHMENT_MAX_BYTES} bytes")
+
+
+def too_many() -> HTTPException:
+    return HTTPException(
+        status_code=400, detail=f"A report can have at most {REPORT_ATTACHMENTS_PER_REPORT} attachments",
+    )
+
+
+def storage_problem() -> Optional[str]:
+    """Why files can't be stored under REPORT_ATTACHMENT_DIR, or None when they can.
+
+    In compose it is a bind mount: a host directory Docker had to create is
+    owned by root, and every upload would fail on it.
+    """
+    try:
+        os.makedirs(REPORT_ATTACHMENT_DIR, exist_ok=True)
+    except OSError as exc:
+        return f"REPORT_ATTACHMENT_DIR {REPORT_ATTACHMENT_DIR} cannot be created: {exc}"
+    if not os.access(REPORT_ATTACHMENT_DIR, os.W_OK | os.X_OK):
+        return (
+            f"REPORT_ATTACHMENT_DIR {REPORT_ATTACHMENT_DIR} is not writable by uid {os.getuid()}; "
+            f"create the host directory with: sudo install -d -o {os.getuid()} -g {os.getgid()} <dir>"
+        )
+    return None
+
+
+def storage_unavailable() -> HTTPException:
+    return HTTPException(status_code=503, detail="Attachment storage is unavailable; see /ready")
+
+
+def _path(storage_key: str) -> str:
+    return os.path.join(REPORT_ATTACHMENT_DIR, storage_key)
+
+
+def clean_filename(raw: str) -> str:
+    """Base name only, without control characters; used for display and Content-Disposition."""
+    name = os.path.basename(raw.replace("\\", "/"))
+    name = "".join(ch for ch in name if ch.isprintable()).strip()
+    if not name or name in (".", ".."):
+        raise HTTPException(status_code=400, detail="Invalid file name")
+    return name[:255]
+
+
+def clean_content_type(raw: str) -> str:
+    content_type = raw.split(";")[0].strip().lower()
+    return content_type if _CONTENT_TYPE.match(content_type) else "application/octet-stream"
+
+
+async def store(report_id: int, chunks: AsyncIterator[bytes]) -> tuple[str, int, str]:
+    """Write `chunks` to a new file; returns (storage_key, size in bytes, sha256 hex).
+
+    Raises 413 as soon as the stream passes REPORT_ATTACHMENT_MAX_BYTES and
+    leaves nothing behind on any failure.
+    """
+    storage_key = f"{report_id}/{uuid.uuid4().hex}"
+    path = _path(storage_key)
+    tmp = path + ".part"
+    await run_in_threadpool(os.makedirs, os.path.dirname(path), exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    f = await run_in_threadpool(open, tmp, "wb")
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > REPORT_ATTACHMENT_MAX_BYTES:
+                raise too_large()
+            digest.update(chunk)
+            await run_in_threadpool(f.write, chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Attachment is empty")
+        await run_in_threadpool(f.flush)
+        await run_in_threadpool(os.fsync, f.fileno())
+        await run_in_threadpool(f.close)
+        await run_in_threadpool(os.replace, tmp, path)
+    except BaseException:
+        # Shielded so a cancelled upload still cleans up after itself
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(_discard, f, tmp)
+        raise
+    return storage_key, size, digest.hexdigest()
+
+
+def _discard(f, tmp: str):
+    f.close()
+    with suppress(FileNotFoundError):
+        os.unlink(tmp)
+
+
+def remove(storage_keys: list[str]):
+    """Delete stored files (after their rows are gone); missing files are ignored."""
+    for key in storage_keys:
+        try:
+            with suppress(FileNotFoundError):
+                os.unlink(_path(key))
+        except OSError as exc:
+            logger.warning("Could not remove attachment %s: %s", key, exc)
+
+
+def remove_report(report_id: int):
+    shutil.rmtree(_path(str(report_id)), ignore_errors=True)
+
+
+def download_response(storage_key: str, filename: str, content_type: str) -> Response:
+    headers = {
+        # Never rendered inline: an uploaded HTML/SVG file must not run on the dashboard origin
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+        "X-Content-Type-Options": "nosniff",
+        # Stored files are immutable; a new upload gets a new id
+        "Cache-Control": "private, max-age=86400",
+    }
+    if REPORT_ATTACHMENT_ACCEL_PREFIX:
+        headers["X-Accel-Redirect"] = f"{REPORT_ATTACHMENT_ACCEL_PREFIX}/{storage_key}"
+        return Response(media_type=content_type, headers=headers)
+    path = _path(storage_key)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Attachment file is missing")
+    return FileResponse(path, media_type=content_type, headers=headers)
@@ -0,0 +1,148 @@
+"""Usage rollups that drill-down endpoints read instead of scanning `chat`.
+
+stats_model_user_daily holds one row per (workspace, user, KST day) with chat
+and message counts, attributed to the day the chat was created; the rankings
+(through app.leaderboards) read it.
+
+The *_hourly tables hold aggregates per UTC hour: stats_model_user_hourly the
+same counts, stats_user_hourly the same per user without the workspace split
+(a chat using two models counts once), and stats_feedback_hourly feedback
+ratings, which the rankings also sum.  Endpoints that take a `tz`, and
+engagement, re-bucket them into that zone's days with `hour AT TIME ZONE`,
+which touches at most 24 rows per user and day instead of every chat.
+
+Refreshes are incremental: days (or hours) touched by chats/feedback whose
+updated_at is past the stored watermark are re-aggregated in full.  Deleted
+chats don't bump updated_at, so everything is rebuilt once every
+ROLLUP_REBUILD_INTERVAL.
+"""
+import logging
+import os
+import time
+
+from sqlalchemy import text
+
+from app import leaderboards
+from app.background import ROLLUP_LOCK_KEY, advisory_lock, run_periodically
+
+logger = logging.getLogger("dashboard.rollups")
+
+ROLLUP_INTERVAL = int(os.getenv("ROLLUP_INTERVAL", "300"))
+ROLLUP_REBUILD_INTERVAL = 86400
+
+KST_DAY = "(to_timestamp({col}) AT TIME ZONE 'Asia/Seoul')::date"
+# Start of the UTC hour; plain integer arithmetic on the epoch, no zone lookup per row
+UTC_HOUR = "to_timestamp({col} - {col} % 3600)"
+
+# Bumped in this process after each refresh that changed rows; cache keys include it
+_version = 0
+
+
+def version() -> int:
+    return _version
+
+
+# Per source: table alias, the grains it is kept at and the aggregate, with
+# {bucket} and {where} slots
+_SOURCES = {
+    "model_user": ("chat", "c", ("daily", "hourly"), """
+        SELECT m.value, c.user_id, {bucket},
+               count(*), coalesce(sum(json_array_length(c.chat->'messages')), 0)
+        FROM chat c, json_array_elements_text(c.chat->'models') AS m(value)
+        WHERE c.user_id IS NOT NULL {where}
+        GROUP BY 1, 2, 3
+    """),
+    "user": ("chat", "c", ("hourly",), """
+        SELECT c.user_id, {bucket},
+               count(*), coalesce(sum(json_array_length(c.chat->'messages')), 0)
+        FROM chat c
+        WHERE c.user_id IS NOT NULL {where}
+        GROUP BY 1, 2
+    """),
+    "feedback": ("feedback", "f", ("hourly",), """
+        SELECT f.data->>'model_id', f.user_id, {bucket},
+               count(*) FILTER (WHERE (f.data->>'rating')::numeric > 0),
+               count(*) FILTER (WHERE (f.data->>'rating')::numeric < 0)
+        FROM feedback f
+        WHERE f.user_id IS NOT NULL AND f.data->>'model_id' IS NOT NULL
+          -- Same guard as feedback_ratings: one malformed rating must not fail the refresh
+          AND f.data->>'rating' ~ '^-?[0-9]+(\\.[0-9]+)?$' {where}
+        GROUP BY 1, 2, 3
+    """),
+}
+
+# Granularity: bucket column and the expression mapping an epoch column onto it
+_BUCKETS = {
+    "daily": ("day", KST_DAY),
+    "hourly": ("hour", UTC_HOUR),
+}
+
+_ROLLUPS = {
+    f"{kind}_{grain}": {
+        "table": f"stats_{kind}_{grain}",
+        "source": source,
+        "column": column,
+        "bucket": bucket,
+        "aggregate": aggregate.replace("{bucket}", bucket.format(col=f"{alias}.created_at")),
+        "bucket_filter": f"{bucket.format(col=f'{alias}.created_at')} = ANY(:buckets)",
+    }
+    for grain, (column, bucket) in _BUCKETS.items()
+    for kind, (source, alias, grains, aggregate) in _SOURCES.items()
+    if grain in grains
+}
+
+
+def _refresh_one(conn, name: str, spec: dict) -> bool:
+    table, source, column = spec["table"], spec["source"], spec["column"]
+    state = conn.execute(
+        text("SELECT watermark, extract(epoch FROM NOW() - rebuilt_at) AS age FROM stats_rollup_state WHERE name = :n"),
+        {"n": name},
+    ).mappings().first()
+    new_watermark = conn.execute(text(f"SELECT coalesce(max(updated_at), 0) FROM {source}")).scalar()
+
+    if state is None or state["age"] >= ROLLUP_REBUILD_INTERVAL:
+        conn.execute(text(f"DELETE FROM {table}"))
+        result = conn.execute(text(f"INSERT INTO {table} " + spec["aggregate"].format(where="")))
+        conn.execute(text("""
+            INSERT INTO stats_rollup_state (name, watermark, rebuilt_at) VALUES (:n, :wm, NOW())
+            ON CONFLICT (name) DO UPDATE SET watermark = :wm, rebuilt_at = NOW()
+        """), {"n": name, "wm": new_watermark})
+        logger.info("Rebuilt %s (%d rows)", table, result.rowcount)
+        return True
+
+    buckets = conn.execute(text(f"""
+        SELECT DISTINCT {spec["bucket"].format(col='created_at')}
+        FROM {source} WHERE updated_at > :wm AND updated_at <= :new_wm
+    """), {"wm": state["watermark"], "new_wm": new_watermark}).scalars().all()
+    if buckets:
+        started = time.monotonic()
+        conn.execute(text(f"DELETE FROM {table} WHERE {column} = ANY(:buckets)"), {"buckets": buckets})
+        conn.execute(
+            text(f"INSERT INTO {table} " + spec["aggregate"].format(where="AND " + spec["bucket_filter"])),
+            {"buckets": buckets},
+        )
+        logger.info("Refreshed %d %s(s) of %s in %.2fs", len(buckets), column, table, time.monotonic() - started)
+    conn.execute(text("UPDATE stats_rollup_state SET watermark = :wm WHERE name = :n"), {"n": name, "wm": new_watermark})
+    return bool(buckets)
+
+
+def refresh_rollups(engine) -> bool:
+    """Bring all rollups up to date. Returns True if any rows changed."""
+    global _version
+    changed = False
+    with advisory_lock(engine, ROLLUP_LOCK_KEY) as conn:
+        if conn is None:
+            return False
+        for name, spec in _ROLLUPS.items():
+            changed = _refresh_one(conn, name, spec) or changed
+            conn.commit()
+        if changed or leaderboards.stale(conn):
+            leaderboards.rebuild(conn)
+            conn.commit()
+    if changed:
+        _version += 1
+    return changed
+
+
+def start_rollup_refresh(engine):
+    run_periodically("rollup-refresh", ROLLUP_INTERVAL, lambda: refresh_rollups(engine))
@@ -0,0 +1,102 @@
+"""Database health report for admins: table and TOAST sizes, dead tuples,
+index usage and, when the extension is installed, the costliest statements
+from pg_stat_statements.  Everything comes from the statistics catalogs, so
+collecting it never scans the tables themselves.
+"""
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+# Open WebUI tables the stats endpoints read, then the dashboard's own
+WATCHED_TABLES = (
+    "chat", "feedback", "model", "user", "group", "group_member",
+    "python_packages", "package_audit_log", "issue_reports", "issue_report_status_counts",
+    "issue_report_attachments",
+    "rate_limit_buckets", "idempotency_keys", "cache_generations", "schema_migrations",
+    "stats_model_user_daily", "stats_rollup_state",
+    "stats_model_user_hourly", "stats_user_hourly", "stats_feedback_hourly",
+    "stats_leaderboards", "chat_message_usage", "feedback_ratings", "chat_model",
+)
+
+TOP_STATEMENTS = 10
+
+
+def _tables(conn) -> list[dict]:
+    rows = conn.execute(text("""
+        SELECT
+            s.relname as name,
+            s.n_live_tup as live_tuples,
+            s.n_dead_tup as dead_tuples,
+            pg_relation_size(s.relid) as heap_bytes,
+            coalesce(pg_total_relation_size(NULLIF(c.reltoastrelid, 0)), 0) as toast_bytes,
+            pg_indexes_size(s.relid) as index_bytes,
+            pg_total_relation_size(s.relid) as total_bytes,
+            s.seq_scan,
+            coalesce(s.idx_scan, 0) as idx_scan,
+            greatest(s.last_vacuum, s.last_autovacuum) as last_vacuum,
+            greatest(s.last_analyze, s.last_autoanalyze) as last_analyze
+        FROM pg_stat_user_tables s
+        JOIN pg_class c ON c.oid = s.relid
+        WHERE s.relname = ANY(:tables) AND s.schemaname = current_schema()
+        ORDER BY pg_total_relation_size(s.relid) DESC
+    """), {"tables": list(WATCHED_TABLES)}).mappings().all()
+    return [
+        {
+            **{k: row[k] for k in (
+                "name", "live_tuples", "dead_tuples", "heap_bytes", "toast_bytes",
+                "index_bytes", "total_bytes", "seq_scan", "idx_scan",
+            )},
+            "dead_ratio": round(row["dead_tuples"] / (row["live_tuples"] + row["dead_tuples"]), 3)
+            if row["live_tuples"] + row["dead_tuples"] else 0.0,
+            "last_vacuum": str(row["last_vacuum"]) if row["last_vacuum"] else None,
+            "last_analyze": str(row["last_analyze"]) if row["last_analyze"] else None,
+        }
+        for row in rows
+    ]
+
+
+def _indexes(conn) -> list[dict]:
+    rows = conn.execute(text("""
+        SELECT
+            s.relname as table_name,
+            s.indexrelname as name,
+            s.idx_scan as scans,
+            s.idx_tup_read as tuples_read,
+            pg_relation_size(s.indexrelid) as bytes
+        FROM pg_stat_user_indexes s
+        WHERE s.relname = ANY(:tables) AND s.schemaname = current_schema()
+        ORDER BY s.relname, s.idx_scan
+    """), {"tables": list(WATCHED_TABLES)}).mappings().all()
+    return [{**row, "unused": row["scans"] == 0} for row in rows]
+
+
+def _top_statements(conn) -> dict:
+    # The view only exists once the extension is created, and reading it fails
+    # unless the library is also preloaded; either way report it as unavailable.
+    if not conn.execute(text("SELECT to_regclass('pg_stat_statements') IS NOT NULL")).scalar():
+        return {"available": False, "statements": []}
+    try:
+        with conn.begin_nested():
+            rows = conn.execute(text("""
+                SELECT
+                    left(query, 500) as query,
+                    calls,
+                    round(total_exec_time::numeric, 1)::float8 as total_ms,
+                    round(mean_exec_time::numeric, 2)::float8 as mean_ms,
+                    rows
+                FROM pg_stat_statements
+                WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                ORDER BY total_exec_time DESC
+                LIMIT :limit
+            """), {"limit": TOP_STATEMENTS}).mappings().all()
+    except DBAPIError:
+        return {"available": False, "statements": []}
+    return {"available": True, "statements": [dict(row) for row in rows]}
+
+
+def collect(conn) -> dict:
+    return {
+        "database_bytes": conn.execute(text("SELECT pg_database_size(current_database())")).scalar(),
+        "tables": _tables(conn),
+        "indexes": _indexes(conn),
+        "pg_stat_statements": _top_statements(conn),
+    }
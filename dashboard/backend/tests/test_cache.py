@@ -0,0 +1,87 @@
+"""Stats caches against a fakeredis stand-in for the shared (Redis) tier."""
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+import fakeredis
+import pytest
+
+from app import cache
+
+
+@pytest.fixture
+def shared(monkeypatch):
+    server = fakeredis.FakeServer()
+    backend = cache.RedisBackend(fakeredis.FakeRedis(server=server))
+    monkeypatch.setattr(cache, "CACHE_BACKEND", "redis")
+    monkeypatch.setattr(cache, "_backend", backend)
+    monkeypatch.setattr(cache, "_registry", {})
+    return server
+
+
+def test_replicas_share_results(shared):
+    replica_a = cache.TTLCache(ttl=60)
+    replica_b = cache.TTLCache(ttl=60)
+    replica_a.set(("workspace", "ws-1"), {"chats": 3, "daily": [{"date": "2026-10-01", "chats": 3}]})
+    assert replica_b.get(("workspace", "ws-1")) == {"chats": 3, "daily": [{"date": "2026-10-01", "chats": 3}]}
+    assert replica_b.get(("workspace", "ws-2")) is None
+
+
+def test_invalidate_clears_shared_and_broadcasts(shared):
+    packages = cache.TTLCache(namespace="packages")
+    stats = cache.TTLCache(namespace="stats")
+    packages.set(("list",), [1, 2])
+    stats.set(("overview",), {"total_chats": 1})
+
+    received = []
+    listener = threading.Thread(target=cache._backend.listen, args=(received.append,), daemon=True)
+    listener.start()
+    time.sleep(0.2)
+    cache.invalidate("packages")
+    deadline = time.monotonic() + 2
+    while not received and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert received == ["packages"]
+    assert packages.get(("list",)) is None
+    assert stats.get(("overview",)) == {"total_chats": 1}
+    assert fakeredis.FakeRedis(server=shared).keys("dashboard:cache:packages:*") == []
+
+
+def test_stale_value_refreshed_once_across_replicas(shared):
+    replica_a = cache.StaleWhileRevalidateCache(ttl=0.5)
+    replica_b = cache.StaleWhileRevalidateCache(ttl=0.5)
+    calls = []
+
+    def refresh():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"total_chats": 2}
+
+    assert replica_a.get(("overview",), lambda: {"total_chats": 1}, refresh)[2] == "miss"
+    time.sleep(0.6)
+    for replica in (replica_a, replica_b, replica_a, replica_b):
+        value, age, status = replica.get(("overview",), pytest.fail, refresh)
+        assert (value, status) == ({"total_chats": 1}, "stale")
+    time.sleep(0.4)
+
+    assert len(calls) == 1
+    assert replica_b.get(("overview",), pytest.fail, refresh)[:3:2] == ({"total_chats": 2}, "hit")
+
+
+def test_undecodable_shared_entry_is_a_miss(shared):
+    stats = cache.TTLCache(ttl=60)
+    fakeredis.FakeRedis(server=shared).set("dashboard:cache:stats:overview", b"not json")
+    assert stats.get(("overview",)) is None
+
+
+def test_local_and_shared_hits_have_the_same_types(shared):
+    value = {"range": (date(2026, 10, 1), date(2026, 10, 7)), "avg": Decimal("1.5")}
+    expected = {"range": ["2026-10-01", "2026-10-07"], "avg": 1.5}
+    replica_a = cache.StaleWhileRevalidateCache(ttl=60)
+    replica_b = cache.StaleWhileRevalidateCache(ttl=60)
+
+    assert replica_a.get(("daily",), lambda: value, pytest.fail)[::2] == (expected, "miss")
+    assert replica_a.get(("daily",), pytest.fail, pytest.fail)[::2] == (expected, "hit")
+    assert replica_b.get(("daily",), pytest.fail, pytest.fail)[::2] == (expected, "hit")
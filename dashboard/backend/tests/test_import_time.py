@@ -0,0 +1,75 @@
+"""Import-time budget for the backend.
+
+Importing app.main must not connect to Postgres, load the DB driver or PyJWT,
+and must add little on top of FastAPI + SQLAlchemy themselves, so restarts
+(including `--reload`) answer /health right away even with the DB down.
+"""
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds app.main may add on top of importing the frameworks it builds on
+IMPORT_BUDGET = 0.5
+
+# Nothing listens on port 1, so any DB connection attempt fails immediately
+UNREACHABLE_DB = {"POSTGRES_HOST": "127.0.0.1", "POSTGRES_PORT": "1"}
+
+
+def _run(code: str, **extra_env: str) -> str:
+    env = {**os.environ, **UNREACHABLE_DB, "PYTHONPATH": BACKEND_DIR, **extra_env}
+    result = subprocess.run(
+        [sys.executable, "-c", code], env=env, cwd=BACKEND_DIR,
+        capture_output=True, text=True, timeout=60, check=True,
+    )
+    return result.stdout.strip()
+
+
+def _import_seconds(modules: str) -> float:
+    # Best of three to keep a busy CI runner from failing the test
+    return min(
+        float(_run(f"import time; t = time.perf_counter(); import {modules}; print(time.perf_counter() - t)"))
+        for _ in range(3)
+    )
+
+
+def test_import_overhead_within_budget():
+    baseline = _import_seconds("fastapi, fastapi.responses, sqlalchemy.orm")
+    app_main = _import_seconds("app.main")
+    assert app_main - baseline < IMPORT_BUDGET, f"app.main adds {app_main - baseline:.3f}s over the frameworks"
+
+
+def test_import_is_lazy():
+    loaded = _run(
+        "import sys, app.main, app.db; "
+        "print(app.db._engine is None, *[m in sys.modules for m in ('psycopg2', 'jwt')])"
+    )
+    assert loaded == "True False False"
+
+
+HEALTH_CHECK = (
+    "import time\n"
+    "from fastapi.testclient import TestClient\n"
+    "from app.main import app\n"
+    "t = time.perf_counter()\n"
+    "with TestClient(app) as client:\n"
+    "    health = client.get('/health')\n"
+    "    ready = client.get('/ready')\n"
+    "    print(round(time.perf_counter() - t, 3), health.status_code, ready.status_code)\n"
+)
+
+
+def test_health_answers_without_database(tmp_path):
+    out = _run(HEALTH_CHECK, REPORT_ATTACHMENT_DIR=str(tmp_path))
+    elapsed, health, ready = out.split()
+    assert (health, ready) == ("200", "503")
+    assert float(elapsed) < 1.0
+
+
+def test_health_answers_without_attachment_storage(tmp_path):
+    # A directory that can't be created, whoever runs the test
+    (tmp_path / "file").write_text("")
+    out = _run(HEALTH_CHECK, REPORT_ATTACHMENT_DIR=str(tmp_path / "file" / "attachments"))
+    assert out.split()[1:] == ["200", "503"]
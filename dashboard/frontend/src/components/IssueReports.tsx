@@ -1,9 +1,12 @@
 import { useState, useEffect } from "react";
 import {
   X, Plus, Loader2, Bug, Lightbulb, HelpCircle, MoreHorizontal,
-  CheckCircle2, Clock, XCircle, ChevronDown, ChevronUp, EyeOff,
+  CheckCircle2, Clock, XCircle, ChevronDown, ChevronUp, EyeOff, Paperclip,
 } from "lucide-react";
-import { fetchReports, fetchAuthMe, createReport, deleteReport, updateReportStatus, type IssueReport } from "@/lib/api";
+import {
+  fetchReports, fetchAuthMe, createReport, deleteReport, updateReportStatus,
+  uploadReportAttachment, downloadReportAttachment, type IssueReport, type ReportAttachment,
+} from "@/lib/api";
 import { useToast } from "./Toast";
 
 interface IssueReportsProps {
@@ -25,6 +28,12 @@ const STATUS_CONFIG = {
   wontfix:     { icon: XCircle,      color: "text-zinc-400",    bg: "bg-zinc-400/10",    label: "Won't Fix" },
 } as const;
 
+function formatSize(bytes: number) {
+  if (bytes < 1024) return `${bytes} B`;
+  if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+  return `${(bytes / (1024 * 1024)).toFixed(1)} MB`;
+}
+
 const ADMIN_ACTIONS: { status: string; label: string; hoverBg: string; hoverText: string }[] = [
   { status: "in_progress", label: "In Progress", hoverBg: "hover:bg-blue-400/20", hoverText: "hover:text-blue-400" },
   { status: "resolved",    label: "Resolve",     hoverBg: "hover:bg-emerald-400/20", hoverText: "hover:text-emerald-400" },
@@ -46,6 +55,7 @@ export default function IssueReports({ currentUser }: IssueReportsProps) {
   const [description, setDescription] = useState("");
   const [category, setCategory] = useState("bug");
   const [isAnonymous, setIsAnonymous] = useState(false);
+  const [files, setFiles] = useState<File[]>([]);
   const [submitting, setSubmitting] = useState(false);
 
   useEffect(() => {
@@ -70,11 +80,21 @@ export default function IssueReports({ currentUser }: IssueReportsProps) {
         { title: title.trim(), description: description.trim(), category, is_anonymous: isAnonymous },
         currentUser,
       );
-      setReports((prev) => [report, ...prev]);
+      // Uploaded one by one after the report exists; a failed file doesn't lose the report
+      const attachments: ReportAttachment[] = [];
+      for (const file of files) {
+        try {
+          attachments.push(await uploadReportAttachment(report.id, file, currentUser));
+        } catch (e: any) {
+          toast(`${file.name}: ${e.response?.data?.detail || "upload failed"}`, "error");
+        }
+      }
+      setReports((prev) => [{ ...report, attachments }, ...prev]);
       setTitle("");
       setDescription("");
       setCategory("bug");
       setIsAnonymous(false);
+      setFiles([]);
       setShowForm(false);
       toast("Report submitted", "success");
     } catch (e: any) {
@@ -108,6 +128,14 @@ export default function IssueReports({ currentUser }: IssueReportsProps) {
     }
   };
 
+  const handleDownload = async (reportId: number, attachment: ReportAttachment) => {
+    try {
+      await downloadReportAttachment(reportId, attachment, currentUser);
+    } catch {
+      toast("Failed to download attachment", "error");
+    }
+  };
+
   const openCount = reports.filter((r) => r.status === "open" || r.status === "in_progress").length;
 
   return (
@@ -151,8 +179,19 @@ export default function IssueReports({ currentUser }: IssueReportsProps) {
             onChange={(e) => setDescription(e.target.value)}
             placeholder="Describe the issue..."
             rows={3}
+            maxLength={10000}
             className="w-full rounded-md border border-input bg-background px-3 py-2 text-sm placeholder:text-muted-foreground focus:outline-none focus:ring-1 focus:ring-ring resize-none"
           />
+          <label className="flex items-center gap-2 text-sm text-muted-foreground cursor-pointer">
+            <Paperclip className="h-3.5 w-3.5" />
+            <span>{files.length ? files.map((f) => f.name).join(", ") : "Attach logs or screenshots"}</span>
+            <input
+              type="file"
+              multiple
+              onChange={(e) => setFiles(Array.from(e.target.files || []))}
+              className="hidden"
+            />
+          </label>
           <div className="flex items-center gap-4">
             <select
               value={category}
@@ -247,6 +286,22 @@ export default function IssueReports({ currentUser }: IssueReportsProps) {
                   {expanded && (
                     <div className="px-4 pb-3 space-y-2">
                       <p className="text-sm text-muted-foreground whitespace-pre-wrap">{report.description}</p>
+                      {report.attachments.length > 0 && (
+                        <div className="flex flex-wrap gap-2">
+                          {report.attachments.map((a) => (
+                            <button
+                              key={a.id}
+                              onClick={(e) => { e.stopPropagation(); handleDownload(report.id, a); }}
+                              className="inline-flex items-center gap-1 rounded border border-border px-2 py-0.5 text-xs text-muted-foreground hover:bg-muted/50 hover:text-foreground"
+                              title={`Download ${a.filename}`}
+                            >
+                              <Paperclip className="h-3 w-3" />
+                              {a.filename}
+                              <span className="text-muted-foreground/70">({formatSize(a.size_bytes)})</span>
+                            </button>
+                          ))}
+                        </div>
+                      )}
                       {report.admin_note && (
                         <p className="text-xs text-muted-foreground border-l-2 border-border pl-3">
                           Admin note: {report.admin_note}
@@ -1,4 +1,5 @@
 import axios from "axios";
+import { AUTH_MODE, accessToken } from "@/lib/auth";
 
 // Production: frontend and backend share the same nginx origin (empty baseURL).
 // Development: set VITE_API_BASE_URL=http://localhost:8005 in .env.local
@@ -6,6 +7,17 @@ const baseURL = import.meta.env.VITE_API_BASE_URL || "";
 
 const api = axios.create({ baseURL });
 
+// sso: every request carries the Keycloak access token; mock: the caller's X-Auth-User
+if (AUTH_MODE === "sso") {
+  api.interceptors.request.use(async (config) => {
+    config.headers.Authorization = `Bearer ${await accessToken()}`;
+    return config;
+  });
+}
+
+const authHeaders = (authUser: string): Record<string, string> =>
+  AUTH_MODE === "mock" ? { "X-Auth-User": authUser } : {};
+
 export interface OverviewStats {
   total_chats: number;
   total_messages: number;
@@ -115,50 +127,76 @@ export interface PaginatedResponse<T> {
   items: T[];
 }
 
-export const fetchOverview = () =>
-  api.get<OverviewStats>("/api/v1/stats/overview").then((r) => r.data);
+// Ranking endpoints with format=columns: keys sent once, one value array per row
+interface ColumnarResponse {
+  total: number;
+  offset: number;
+  limit: number;
+  columns: string[];
+  rows: unknown[][];
+}
+
+const fetchRanking = <T>(path: string, offset: number, limit: number) =>
+  api
+    .get<ColumnarResponse>(`${path}?offset=${offset}&limit=${limit}&format=columns`)
+    .then(({ data }): PaginatedResponse<T> => ({
+      total: data.total,
+      offset: data.offset,
+      limit: data.limit,
+      items: data.rows.map((row) => Object.fromEntries(data.columns.map((key, i) => [key, row[i]])) as T),
+    }));
+
+// Each overview card is served and cached separately so cheap counts don't wait on the chat scan
+export const OVERVIEW_PARTS = ["chats", "models", "feedbacks", "tools", "functions", "skills"] as const;
+
+export const fetchOverviewPart = (part: (typeof OVERVIEW_PARTS)[number]) =>
+  api.get<Partial<OverviewStats>>(`/api/v1/stats/overview/${part}`).then((r) => r.data);
+
+// Stats days are bucketed in the viewer's zone (IANA name, e.g. "Europe/Berlin")
+export const BROWSER_TIME_ZONE = Intl.DateTimeFormat().resolvedOptions().timeZone;
 
 export const fetchDailyStats = (from?: string, to?: string) => {
   const params = new URLSearchParams();
   if (from) params.set("from", from);
   if (to) params.set("to", to);
+  params.set("tz", BROWSER_TIME_ZONE);
   return api
     .get<DailyStat[]>(`/api/v1/stats/daily?${params.toString()}`)
     .then((r) => r.data);
 };
 
 export const fetchWorkspaceRanking = (offset = 0, limit = 20) =>
-  api.get<PaginatedResponse<WorkspaceRanking>>(`/api/v1/stats/workspace-ranking?offset=${offset}&limit=${limit}`).then((r) => r.data);
+  fetchRanking<WorkspaceRanking>("/api/v1/stats/workspace-ranking", offset, limit);
 
 export const fetchDeveloperRanking = (offset = 0, limit = 20) =>
-  api.get<PaginatedResponse<DeveloperRanking>>(`/api/v1/stats/developer-ranking?offset=${offset}&limit=${limit}`).then((r) => r.data);
+  fetchRanking<DeveloperRanking>("/api/v1/stats/developer-ranking", offset, limit);
 
 export const fetchUserRanking = (offset = 0, limit = 20) =>
-  api.get<PaginatedResponse<UserRanking>>(`/api/v1/stats/user-ranking?offset=${offset}&limit=${limit}`).then((r) => r.data);
+  fetchRanking<UserRanking>("/api/v1/stats/user-ranking", offset, limit);
 
 export const fetchGroupRanking = (offset = 0, limit = 20) =>
-  api.get<PaginatedResponse<GroupRanking>>(`/api/v1/stats/group-ranking?offset=${offset}&limit=${limit}`).then((r) => r.data);
+  fetchRanking<GroupRanking>("/api/v1/stats/group-ranking", offset, limit);
 
 export const fetchToolRanking = (offset = 0, limit = 20) =>
-  api.get<PaginatedResponse<ToolRanking>>(`/api/v1/stats/tool-ranking?offset=${offset}&limit=${limit}`).then((r) => r.data);
+  fetchRanking<ToolRanking>("/api/v1/stats/tool-ranking", offset, limit);
 
 export const fetchFunctionRanking = (offset = 0, limit = 20) =>
-  api.get<PaginatedResponse<FunctionRanking>>(`/api/v1/stats/function-ranking?offset=${offset}&limit=${limit}`).then((r) => r.data);
+  fetchRanking<FunctionRanking>("/api/v1/stats/function-ranking", offset, limit);
 
 export const fetchSkillRanking = (offset = 0, limit = 20) =>
-  api.get<PaginatedResponse<SkillRanking>>(`/api/v1/stats/skill-ranking?offset=${offset}&limit=${limit}`).then((r) => r.data);
+  fetchRanking<SkillRanking>("/api/v1/stats/skill-ranking", offset, limit);
 
 export const fetchPackages = () =>
   api.get<PaginatedResponse<PythonPackage>>("/api/v1/packages?limit=200").then((r) => r.data.items);
 
 export const addPackage = (packageName: string, authUser: string) =>
-  api.post<PythonPackage>("/api/v1/packages", { package_name: packageName }, { headers: { "X-Auth-User": authUser } }).then((r) => r.data);
+  api.post<PythonPackage>("/api/v1/packages", { package_name: packageName }, { headers: authHeaders(authUser) }).then((r) => r.data);
 
 export const deletePackage = (id: number, authUser: string) =>
-  api.delete(`/api/v1/packages/${id}`, { headers: { "X-Auth-User": authUser } }).then((r) => r.data);
+  api.delete(`/api/v1/packages/${id}`, { headers: authHeaders(authUser) }).then((r) => r.data);
 
 export const updatePackageStatus = (id: number, status: string, authUser: string, note?: string) =>
-  api.patch(`/api/v1/packages/${id}/status`, { status, status_note: note }, { headers: { "X-Auth-User": authUser } }).then((r) => r.data);
+  api.patch(`/api/v1/packages/${id}/status`, { status, status_note: note }, { headers: authHeaders(authUser) }).then((r) => r.data);
 
 export interface IssueReport {
   id: number;
@@ -172,19 +210,50 @@ export interface IssueReport {
   admin_note: string | null;
   created_at: string;
   updated_at: string;
+  attachments: ReportAttachment[]; // metadata only; download each file separately
+}
+
+export interface ReportAttachment {
+  id: number;
+  filename: string;
+  content_type: string;
+  size_bytes: number;
+  created_at: string;
 }
 
 export const fetchReports = () =>
   api.get<PaginatedResponse<IssueReport>>("/api/v1/reports?limit=200").then((r) => r.data.items);
 
 export const createReport = (data: { title: string; description: string; category: string; is_anonymous: boolean }, authUser: string) =>
-  api.post<IssueReport>("/api/v1/reports", data, { headers: { "X-Auth-User": authUser } }).then((r) => r.data);
+  api.post<IssueReport>("/api/v1/reports", data, { headers: authHeaders(authUser) }).then((r) => r.data);
 
 export const updateReportStatus = (id: number, status: string, authUser: string, adminNote?: string) =>
-  api.patch(`/api/v1/reports/${id}/status`, { status, admin_note: adminNote }, { headers: { "X-Auth-User": authUser } }).then((r) => r.data);
+  api.patch(`/api/v1/reports/${id}/status`, { status, admin_note: adminNote }, { headers: authHeaders(authUser) }).then((r) => r.data);
 
 export const deleteReport = (id: number, authUser: string) =>
-  api.delete(`/api/v1/reports/${id}`, { headers: { "X-Auth-User": authUser } }).then((r) => r.data);
+  api.delete(`/api/v1/reports/${id}`, { headers: authHeaders(authUser) }).then((r) => r.data);
+
+// The file is sent as the raw request body, which the backend streams to disk
+export const uploadReportAttachment = (reportId: number, file: File, authUser: string) =>
+  api
+    .post<ReportAttachment>(`/api/v1/reports/${reportId}/attachments`, file, {
+      params: { filename: file.name },
+      headers: { ...authHeaders(authUser), "Content-Type": file.type || "application/octet-stream" },
+    })
+    .then((r) => r.data);
+
+export const downloadReportAttachment = async (reportId: number, attachment: ReportAttachment, authUser: string) => {
+  const r = await api.get<Blob>(`/api/v1/reports/${reportId}/attachments/${attachment.id}`, {
+    headers: authHeaders(authUser),
+    responseType: "blob",
+  });
+  const url = URL.createObjectURL(r.data);
+  const link = document.createElement("a");
+  link.href = url;
+  link.download = attachment.filename;
+  link.click();
+  URL.revokeObjectURL(url);
+};
 
 export interface AuthMe {
   user: string;
@@ -192,4 +261,4 @@ export interface AuthMe {
 }
 
 export const fetchAuthMe = (authUser: string) =>
-  api.get<AuthMe>("/api/v1/auth/me", { headers: { "X-Auth-User": authUser } }).then((r) => r.data);
+  api.get<AuthMe>("/api/v1/auth/me", { headers: authHeaders(authUser) }).then((r) => r.data);
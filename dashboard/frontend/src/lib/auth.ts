@@ -0,0 +1,107 @@
+// VITE_AUTH_MODE=sso: sign in with Keycloak (authorization code + PKCE, public
+// client) and send the access token as a Bearer header. Tokens are kept in
+// sessionStorage, so each browser tab signs in once and refreshes silently.
+export const AUTH_MODE: "mock" | "sso" = import.meta.env.VITE_AUTH_MODE === "sso" ? "sso" : "mock";
+
+const KEYCLOAK_URL = (import.meta.env.VITE_KEYCLOAK_URL || "").replace(/\/$/, "");
+const OIDC_BASE = `${KEYCLOAK_URL}/realms/${import.meta.env.VITE_KEYCLOAK_REALM}/protocol/openid-connect`;
+const CLIENT_ID = import.meta.env.VITE_KEYCLOAK_CLIENT_ID || "";
+const REDIRECT_URI = `${window.location.origin}/`;
+const TOKENS_KEY = "dashboardTokens";
+const PKCE_KEY = "dashboardPkce";
+// Refresh this long before the access token expires
+const REFRESH_MARGIN_MS = 30_000;
+
+interface Tokens {
+  access_token: string;
+  refresh_token?: string;
+  expires_at: number;
+}
+
+const base64url = (bytes: Uint8Array) =>
+  btoa(String.fromCharCode(...bytes)).replace(/\+/g, "-").replace(/\//g, "_").replace(/=+$/, "");
+
+const randomString = () => base64url(crypto.getRandomValues(new Uint8Array(32)));
+
+const storedTokens = (): Tokens | null => JSON.parse(sessionStorage.getItem(TOKENS_KEY) || "null");
+
+async function login(): Promise<never> {
+  const verifier = randomString();
+  const state = randomString();
+  const challenge = base64url(new Uint8Array(await crypto.subtle.digest("SHA-256", new TextEncoder().encode(verifier))));
+  sessionStorage.setItem(PKCE_KEY, JSON.stringify({ verifier, state, returnTo: window.location.pathname + window.location.search }));
+  const params = new URLSearchParams({
+    client_id: CLIENT_ID,
+    redirect_uri: REDIRECT_URI,
+    response_type: "code",
+    scope: "openid email",
+    code_challenge: challenge,
+    code_challenge_method: "S256",
+    state,
+  });
+  window.location.assign(`${OIDC_BASE}/auth?${params.toString()}`);
+  // The page is navigating away; nothing after this should run
+  return new Promise<never>(() => {});
+}
+
+async function tokenRequest(params: Record<string, string>): Promise<Tokens> {
+  const r = await fetch(`${OIDC_BASE}/token`, {
+    method: "POST",
+    headers: { "Content-Type": "application/x-www-form-urlencoded" },
+    body: new URLSearchParams({ client_id: CLIENT_ID, ...params }),
+  });
+  if (!r.ok) throw new Error(`Token request failed (${r.status})`);
+  const data = await r.json();
+  const tokens: Tokens = {
+    access_token: data.access_token,
+    refresh_token: data.refresh_token,
+    expires_at: Date.now() + data.expires_in * 1000,
+  };
+  sessionStorage.setItem(TOKENS_KEY, JSON.stringify(tokens));
+  return tokens;
+}
+
+// Run before the first render: finishes a login redirect or starts one
+export async function initAuth(): Promise<void> {
+  if (AUTH_MODE !== "sso") return;
+  const url = new URL(window.location.href);
+  const code = url.searchParams.get("code");
+  if (code) {
+    const pkce = JSON.parse(sessionStorage.getItem(PKCE_KEY) || "null");
+    sessionStorage.removeItem(PKCE_KEY);
+    if (!pkce || url.searchParams.get("state") !== pkce.state) return login();
+    await tokenRequest({ grant_type: "authorization_code", code, redirect_uri: REDIRECT_URI, code_verifier: pkce.verifier });
+    window.history.replaceState(null, "", pkce.returnTo);
+    return;
+  }
+  if (!storedTokens()) return login();
+}
+
+let refreshing: Promise<Tokens> | null = null;
+
+// A valid access token, refreshed (once, for concurrent callers) when close to expiry
+export async function accessToken(): Promise<string> {
+  let tokens = storedTokens();
+  if (!tokens) return login();
+  if (tokens.expires_at - Date.now() < REFRESH_MARGIN_MS) {
+    if (!tokens.refresh_token) return login();
+    refreshing ??= tokenRequest({ grant_type: "refresh_token", refresh_token: tokens.refresh_token }).finally(() => {
+      refreshing = null;
+    });
+    try {
+      tokens = await refreshing;
+    } catch {
+      sessionStorage.removeItem(TOKENS_KEY);
+      return login();
+    }
+  }
+  return tokens.access_token;
+}
+
+// Username the backend derives from the token: the email's local part
+export function tokenUser(): string {
+  const token = storedTokens()?.access_token;
+  if (!token) return "";
+  const payload = JSON.parse(atob(token.split(".")[1].replace(/-/g, "+").replace(/_/g, "/")));
+  return (payload.email || "").split("@")[0];
+}
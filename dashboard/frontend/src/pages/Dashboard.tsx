@@ -14,8 +14,9 @@ import SkillRankingTable from "@/components/SkillRankingTable";
 import RequirePackages from "@/components/RequirePackages";
 import IssueReports from "@/components/IssueReports";
 import MockAuthBanner from "@/components/MockAuthBanner";
+import { AUTH_MODE, tokenUser } from "@/lib/auth";
 import {
-  fetchOverview, fetchDailyStats, fetchWorkspaceRanking,
+  OVERVIEW_PARTS, fetchOverviewPart, fetchDailyStats, fetchWorkspaceRanking,
   fetchDeveloperRanking, fetchUserRanking, fetchGroupRanking,
   fetchToolRanking, fetchFunctionRanking, fetchSkillRanking,
   type OverviewStats, type DailyStat,
@@ -31,14 +32,15 @@ const TABS = [
   { id: "requests", label: "Requests & Reports" },
 ];
 
-function kstDate(offsetDays: number): string {
-  const d = new Date(new Date().toLocaleString("en-US", { timeZone: "Asia/Seoul" }));
+// YYYY-MM-DD in the browser's zone, matching the `tz` sent with the daily stats
+function localDate(offsetDays: number): string {
+  const d = new Date();
   d.setDate(d.getDate() + offsetDays);
-  return d.toISOString().slice(0, 10);
+  return d.toLocaleDateString("en-CA");
 }
 
 export default function Dashboard() {
-  const [overview, setOverview] = useState<OverviewStats | null>(null);
+  const [overview, setOverview] = useState<Partial<OverviewStats>>({});
   const [daily, setDaily] = useState<DailyStat[]>([]);
   const [workspaces, setWorkspaces] = useState<WorkspaceRanking[]>([]);
   const [developers, setDevelopers] = useState<DeveloperRanking[]>([]);
@@ -48,9 +50,10 @@ export default function Dashboard() {
   const [functions, setFunctions] = useState<FunctionRanking[]>([]);
   const [skills, setSkills] = useState<SkillRanking[]>([]);
   const [mockUser, setMockUser] = useState(() => localStorage.getItem("mockUser") || "jisung.jang");
+  const currentUser = AUTH_MODE === "sso" ? tokenUser() : mockUser;
   const [searchParams, setSearchParams] = useSearchParams();
-  const dateFrom = searchParams.get("from") || kstDate(-7);
-  const dateTo = searchParams.get("to") || kstDate(-1);
+  const dateFrom = searchParams.get("from") || localDate(-7);
+  const dateTo = searchParams.get("to") || localDate(-1);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [activeTab, setActiveTab] = useState("usage");
@@ -71,8 +74,14 @@ export default function Dashboard() {
   const [skillTotal, setSkillTotal] = useState(0);
 
   useEffect(() => {
+    // Cards fill in as their part arrives; a failed card keeps its placeholder
+    // instead of taking the whole page down
+    for (const part of OVERVIEW_PARTS) {
+      fetchOverviewPart(part)
+        .then((fields) => setOverview((prev) => ({ ...prev, ...fields })))
+        .catch(() => {});
+    }
     Promise.all([
-      fetchOverview().then(setOverview),
       fetchDailyStats(dateFrom, dateTo).then(setDaily),
       fetchWorkspaceRanking(0, PAGE_SIZE).then((res) => { setWorkspaces(res.items); setWsTotal(res.total); }),
       fetchDeveloperRanking(0, PAGE_SIZE).then((res) => { setDevelopers(res.items); setDevTotal(res.total); }),
@@ -148,13 +157,13 @@ export default function Dashboard() {
     <div className="space-y-6">
       {/* Stats + Chart (always visible) */}
       <div className="grid gap-4 sm:grid-cols-2 lg:grid-cols-3">
-        <StatCard title="Total Chats" value={overview?.total_chats ?? 0} icon={MessagesSquare} />
-        <StatCard title="Total Messages" value={overview?.total_messages ?? 0} icon={MessageSquare} />
-        <StatCard title="Workspaces" value={overview?.total_models ?? 0} icon={Bot} />
-        <StatCard title="Feedbacks" value={overview?.total_feedbacks ?? 0} icon={ThumbsUp} />
-        <StatCard title="Tools" value={overview?.total_tools ?? 0} icon={Wrench} />
-        <StatCard title="Functions" value={overview?.total_functions ?? 0} icon={Puzzle} />
-        <StatCard title="Skills" value={overview?.total_skills ?? 0} icon={Sparkles} />
+        <StatCard title="Total Chats" value={overview.total_chats ?? "…"} icon={MessagesSquare} />
+        <StatCard title="Total Messages" value={overview.total_messages ?? "…"} icon={MessageSquare} />
+        <StatCard title="Workspaces" value={overview.total_models ?? "…"} icon={Bot} />
+        <StatCard title="Feedbacks" value={overview.total_feedbacks ?? "…"} icon={ThumbsUp} />
+        <StatCard title="Tools" value={overview.total_tools ?? "…"} icon={Wrench} />
+        <StatCard title="Functions" value={overview.total_functions ?? "…"} icon={Puzzle} />
+        <StatCard title="Skills" value={overview.total_skills ?? "…"} icon={Sparkles} />
       </div>
       <DailyChart data={daily} dateFrom={dateFrom} dateTo={dateTo} onDateChange={handleDateChange} />
 
@@ -183,12 +192,14 @@ export default function Dashboard() {
       {/* Tab: Requests & Reports */}
       {activeTab === "requests" && (
         <div className="space-y-6">
-          <RequirePackages currentUser={mockUser} />
-          <IssueReports currentUser={mockUser} />
+          <RequirePackages currentUser={currentUser} />
+          <IssueReports currentUser={currentUser} />
         </div>
       )}
 
-      <MockAuthBanner user={mockUser} onChangeUser={(u) => { setMockUser(u); localStorage.setItem("mockUser", u); }} />
+      {AUTH_MODE === "mock" && (
+        <MockAuthBanner user={mockUser} onChangeUser={(u) => { setMockUser(u); localStorage.setItem("mockUser", u); }} />
+      )}
     </div>
   );
 }